@@ -1,9 +1,12 @@
+import importlib
+import logging
+import sys
+import time
+
 import streamlit as st
 
-from src.config import BASE_DIR
+from src.config import BASE_DIR, PAGE_INIT_BUDGET_SECONDS
 from src.utils.ui_components import UIComponents
-from src.pages import gioi_thieu, du_doan_gia, phat_hien_bat_thuong
-from src.pages import phan_tich_thi_truong, tim_kiem_so_sanh, quan_ly_tin_dang
 
 
 st.set_page_config(
@@ -17,6 +20,56 @@ st.set_page_config(
 # Config layout
 UIComponents.set_page_width_centered(width=960)
 
+@st.cache_resource
+def init_inference_threads():
+    # 1 lần / process: giới hạn thread BLAS / OpenMP theo INFERENCE_MAX_THREADS / WEB_CONCURRENCY
+    from src.utils.inference_policy import limit_native_threads
+    limit_native_threads()
+    return True
+
+def start_model_warmup():
+    # Bắt đầu load model trên thread nền ngay lần chạy đầu tiên của app
+    # (import data_processor ở đây, không import ở đầu file)
+    from src.utils.data_processor import model_handle
+    return model_handle()
+
+init_inference_threads()
+warmup = start_model_warmup()
+
+# ============================================================
+# PAGE REGISTRY - chỉ import trang (và load data/model) khi được chọn lần đầu
+# ============================================================
+PAGE_MODULES = {
+    "ℹ️ Giới thiệu": "src.pages.gioi_thieu",
+    "💰 Dự đoán giá xe": "src.pages.du_doan_gia",
+    "🚨 Phát hiện giá bất thường": "src.pages.phat_hien_bat_thuong",
+    "🔍 Tìm kiếm & So sánh": "src.pages.tim_kiem_so_sanh",
+    "📊 Thống kê & Phân tích": "src.pages.phan_tich_thi_truong",
+    "📝 Quản lý tin đăng": "src.pages.quan_ly_tin_dang",
+}
+
+logger = logging.getLogger(__name__)
+
+@st.cache_resource
+def page_init_times():
+    # Dùng chung cho mọi session trong process: {tên trang: số giây lần mở đầu (import + show())}
+    return {}
+
+def is_page_loaded(page_name):
+    return PAGE_MODULES[page_name] in sys.modules
+
+def get_page(page_name):
+    # Đã import rồi -> không load lại data/model
+    return importlib.import_module(PAGE_MODULES[page_name])
+
+def record_page_init(page_name, elapsed):
+    # Data / model của trang được load trong show() -> đo cả import lẫn lần hiển thị đầu tiên
+    page_init_times()[page_name] = elapsed
+    if elapsed > PAGE_INIT_BUDGET_SECONDS:
+        logger.warning("Trang '%s' mở lần đầu mất %.2fs (vượt ngân sách %.2fs)", page_name, elapsed, PAGE_INIT_BUDGET_SECONDS)
+    else:
+        logger.info("Trang '%s' mở lần đầu mất %.2fs", page_name, elapsed)
+
 def main():    
     menu_sidebar()
 
@@ -31,14 +84,7 @@ def menu_sidebar():
         
         selected_page = st.radio(
             "📍 Chọn chức năng:",
-            [
-                "ℹ️ Giới thiệu",
-                "💰 Dự đoán giá xe",
-                "🚨 Phát hiện giá bất thường", 
-                "🔍 Tìm kiếm & So sánh",
-                "📊 Thống kê & Phân tích",
-                "📝 Quản lý tin đăng"
-            ]
+            list(PAGE_MODULES.keys())
         )
 
         # Menu con cho "Tìm kiếm & So sánh"
@@ -109,20 +155,24 @@ def menu_sidebar():
     st.session_state.current_page = selected_page
 
     # Xử lý routing
+    first_open = not is_page_loaded(selected_page)
+    start = time.perf_counter()
+    page = get_page(selected_page)
+
     if selected_page == "ℹ️ Giới thiệu":        
-        gioi_thieu.show()
+        page.show()
         # st.title("🏠 Giới thiệu")
         # st.write("Chào mừng đến với hệ thống dự đoán giá xe máy!")
         # Nội dung trang chủ
         
     elif selected_page == "💰 Dự đoán giá xe":
         st.sidebar.image("./assets/logo_s.jpg", width=256)
-        du_doan_gia.show()
+        page.show()
         # Nội dung dự đoán giá
         
     elif selected_page == "🚨 Phát hiện giá bất thường":
         st.sidebar.image("./assets/logo_s.jpg", width=256)
-        phat_hien_bat_thuong.show()
+        page.show()
         # Nội dung phát hiện bất thường
 
     elif selected_page == "🔍 Tìm kiếm & So sánh":        
@@ -130,38 +180,94 @@ def menu_sidebar():
          
         if sub_menu == "🗄️ Tìm trên dữ liệu mặc định":
             st.write("### 🗄️ Tin đăng mặc định")
-            tim_kiem_so_sanh.show()
+            page.show()
         elif sub_menu == "🔥 Tìm trên dữ liệu mới nhất":
             st.write("### 🔥 Tin đăng mới nhất")
-            tim_kiem_so_sanh.show()
+            page.show()
         elif sub_menu == "➕ Tìm trên tất cả dữ liệu":
             st.write("### ➕ Tất cả các tin đăng")
-            tim_kiem_so_sanh.show()
+            page.show()
         
     elif selected_page == "📊 Thống kê & Phân tích":
         st.sidebar.image("./assets/logo_s.jpg", width=256)
         
         if sub_menu == "🗄️ Tin đăng mặc định":
             st.write("### 🗄️ Tin đăng mặc định")
-            phan_tich_thi_truong.show()
+            page.show()
         elif sub_menu == "🔥 Tin đăng mới nhất":
             st.write("### 🔥 Tin đăng mới nhất")
-            phan_tich_thi_truong.show()
+            page.show()
         elif sub_menu == "➕ Tất cả các tin đăng":
             st.write("### ➕ Tất cả các tin đăng")
-            phan_tich_thi_truong.show()
+            page.show()
         # Nội dung phân tích
         
     elif selected_page == "📝 Quản lý tin đăng":        
         st.sidebar.image("./assets/logo_s.jpg", width=256)
 
         if sub_menu == "➕ Tin Đăng mới":            
-            quan_ly_tin_dang.show(0)
+            page.show(0)
         
         elif sub_menu == "📋 Tin Đăng mặc định":            
-            quan_ly_tin_dang.show(1)        
+            page.show(1)        
         # Nội dung quản lý
 
+    if first_open:
+        record_page_init(selected_page, time.perf_counter() - start)
+
+    show_perf_stats()
+
+def show_perf_stats():
+    # Thời gian mở lần đầu (import + hiển thị) các trang đã mở trong process
+    init_times = page_init_times()
+    if init_times:
+        # Các module thống kê chỉ import khi hiển thị khung hiệu năng
+        from src.utils.data_processor import loaded_dataset_catalog
+        from src.utils.prediction_cache import prediction_cache_stats, coalescer_stats
+        from src.utils.cascade import cascade_stats
+
+        with st.sidebar.expander("⏱️ Hiệu năng"):
+            for page_name, elapsed in init_times.items():
+                icon = "🔴" if elapsed > PAGE_INIT_BUDGET_SECONDS else "🟢"
+                st.write(f"{icon} {page_name}: **{elapsed:.2f}s**")
+            st.caption(f"Mở lần đầu (import + hiển thị). Ngân sách: {PAGE_INIT_BUDGET_SECONDS:.1f}s / trang")
+
+            # Khởi động model nền
+            version = f" ({warmup.version})" if warmup.version else ""
+            if warmup.seconds is not None:
+                st.write(f"🧠 Model{version}: **{warmup.state}** sau {warmup.seconds:.2f}s")
+            else:
+                st.write(f"🧠 Model{version}: **{warmup.state}**")
+
+            # Cache dự đoán
+            cache = prediction_cache_stats()
+            st.write(
+                f"🗃️ Cache dự đoán: **{cache['size']}/{cache['maxsize']}** - "
+                f"hit {cache['hits']}, miss {cache['misses']}, evict {cache['evictions']} "
+                f"({cache['hit_rate']:.0%})"
+            )
+
+            # Gom request giữa các session
+            batching = coalescer_stats()
+            if batching['batches']:
+                st.write(f"📦 Gom request: **{batching['items']}** dự đoán / {batching['batches']} lô "
+                         f"(TB {batching['avg_batch']:.1f} / lô)")
+
+            # Cascade: tỉ lệ phải gọi model đầy đủ
+            cascade = cascade_stats(warmup.lattice)
+            if cascade and cascade['answered'] + cascade['escalated']:
+                st.write(f"🪜 Cascade: model nhỏ trả lời **{cascade['answered']}**, "
+                         f"chuyển lên model đầy đủ {cascade['escalated']} ({cascade['escalation_rate']:.0%})")
+
+            # Dữ liệu dùng chung: mỗi file load 1 lần / process, sau đó chỉ đọc phần ghi thêm
+            # (chỉ khi catalog đã được tạo bởi trang khác)
+            catalog = loaded_dataset_catalog()
+            if catalog is not None:
+                for name, info in catalog.stats().items():
+                    appended = f", đọc thêm {info['tail_rows']} dòng mới" if info['tail_reads'] else ""
+                    st.write(f"🗂️ {name}: **{info['rows']:,}** dòng, {info['memory_mb']:.1f} MB, "
+                             f"load {info['load_ms']:.0f} ms ({info['loads']} lần){appended}, dùng lại {info['hits']}")
+
 # Run if module executed
 if __name__=="__main__":
     main()
@@ -3,7 +3,7 @@ from pathlib import Path
 # Paths
 BASE_DIR = Path(__file__).parent.parent
 DATA_DIR = BASE_DIR / "data"
-MODEL_DIR = BASE_DIR / "models" / "saved_models"
+MODEL_DIR = BASE_DIR / "models"
 ASSETS_DIR = BASE_DIR / "assets"
 
 # Data paths
@@ -15,9 +15,105 @@ RESULTS_DATA = DATA_DIR / "results"
 REGRESSION_MODEL = MODEL_DIR / "model_regression_best.pkl"
 TFIDF_VECTORIZER = MODEL_DIR / "tfidf_vectorizer.pkl"
 
+# Registry các version model (python -m src.utils.model_registry); chưa có -> dùng REGRESSION_MODEL
+MODEL_REGISTRY = MODEL_DIR / "registry"
+REGISTRY_CHECK_SECONDS = 2.0  # tần suất kiểm tra version mới được promote
+
 # Constants
 PRICE_COLUMN = "Giá TB"
 CONDITION_COLUMN = "Tình Trạng"
 
 # Results paths
-NEW_POST_FILE = RESULTS_DATA / "results_post_new_pending.csv"
\ No newline at end of file
+NEW_POST_FILE = RESULTS_DATA / "results_post_new_pending.csv"
+ANOMALY_RESULTS_FILE = RESULTS_DATA / "results_with_anomalies.csv"
+LISTINGS_FILE = PROCESSED_DATA / "data_motobikes_cleaned.csv"
+
+# Tin đăng lưu trong SQLite (src.utils.listing_store): đăng / duyệt tin = 1 transaction thay cho ghi CSV.
+# Lần chạy đầu tự nạp từ các file CSV; `python -m src.utils.listing_store export` ghi lại CSV
+USE_LISTING_STORE = True
+LISTING_DB = DATA_DIR / "listings.db"
+LISTING_TABLES = {
+    "new_posts": NEW_POST_FILE,
+    "anomalies": ANOMALY_RESULTS_FILE,
+}
+
+# Log kiểm duyệt (src.utils.moderation_log, cần listing store): duyệt / sửa / từ chối = ghi thêm 24 byte,
+# log từ MODERATION_COMPACT_RECORDS bản ghi được gộp vào SQLite trong thread nền
+USE_MODERATION_LOG = True
+MODERATION_LOG_DIR = DATA_DIR / "moderation"
+MODERATION_COMPACT_RECORDS = 1024
+
+# Các file dữ liệu của app (src.utils.dataset_catalog): mỗi file load 1 lần / process, dùng chung mọi trang
+DATASETS = {
+    "listings": LISTINGS_FILE,
+    "anomalies": ANOMALY_RESULTS_FILE,
+    "new_posts": NEW_POST_FILE,
+}
+
+# Cache dạng cột của các file CSV (python -m src.utils.dataset_cache): load_data đọc cache
+# nếu còn mới hơn CSV, ngược lại đọc CSV như cũ
+USE_DATASET_CACHE = True
+DATASET_CACHE_DIR = DATA_DIR / "cache"
+
+# Performance
+PAGE_INIT_BUDGET_SECONDS = 3.0  # thời gian tối đa cho phép khi mở một trang lần đầu (import + hiển thị)
+
+# Dùng bản export mảng numpy (models/<tên>_arrays) thay cho file .pkl nếu có
+PREFER_COMPACT_MODEL = True
+
+# Memory-map các mảng model (chỉ đọc) khi export với --layout npy.
+# Nhiều process `streamlit run` trên cùng máy sẽ dùng chung page cache của OS.
+MODEL_MMAP = False
+
+# Cache dự đoán (LRU, dùng chung mọi session trong process)
+PREDICTION_CACHE_SIZE = 4096
+PREDICTION_CACHE_KM_BUCKET = 0  # > 0: làm tròn so_km_da_di theo mốc này (vd 1000) trước khi dự đoán
+
+# Bảng giá dựng sẵn (python -m src.utils.price_lattice) cho các cấu hình phổ biến
+USE_PRICE_LATTICE = True
+PRICE_LATTICE = BASE_DIR / "models" / "price_lattice.npz"
+PRICE_LATTICE_MAX_GAP = 0.05  # 2 điểm lưới kề nhau lệch hơn mức này (log giá) -> dùng model
+
+# Cascade (python -m src.utils.cascade): hồi quy nhỏ theo dòng xe trả lời trước,
+# độ không chắc chắn (~ sai số tương đối) > CASCADE_MAX_UNCERTAINTY -> dùng model đầy đủ
+USE_CASCADE = True
+CASCADE_TABLE = BASE_DIR / "models" / "cascade.npz"
+CASCADE_MAX_UNCERTAINTY = 0.08
+
+# Bảng giải thích giá (python -m src.utils.explanations): "Vì sao có mức giá này?" không cần gọi model
+EXPLANATIONS_TABLE = BASE_DIR / "models" / "explanations.npz"
+
+# Khoảng giá gợi ý hiệu chỉnh theo phân khúc (python -m src.utils.conformal), thay cho hệ số cố định ±5/10%
+PRICE_INTERVALS = BASE_DIR / "models" / "price_intervals.npz"
+
+# Phân vị giá P10 / P50 / P90 từ các lá của random forest (python -m src.utils.quantile_forest)
+QUANTILE_INDEX = BASE_DIR / "models" / "quantile_index.npz"
+
+# Inference server (python -m src.inference_server) và micro-batching
+INFERENCE_HOST = "127.0.0.1"
+INFERENCE_PORT = 8600
+BATCH_MAX_SIZE = 256
+BATCH_MAX_WAIT_MS = 2.0  # thời gian chờ tối đa để gom thêm request vào 1 lô
+
+# Gom các lần dự đoán 1 dòng từ nhiều session Streamlit thành 1 lần predict theo lô
+COALESCE_PREDICTIONS = True
+COALESCE_MAX_WAIT_MS = 2.0
+
+# Encoder biên dịch từ pipeline đã fit: dict xe -> ma trận, bỏ bước tạo DataFrame khi dự đoán
+USE_COMPILED_ENCODER = True
+
+# Engine dự đoán (xem `python -m src.utils.prediction --engines`):
+#   levelwise nhanh hơn sklearn nhiều lần với 1-100 dòng, sklearn nhanh hơn từ ~10k dòng.
+#   sklearn Pipeline được làm phẳng trong bộ nhớ khi dùng levelwise / per_tree.
+INTERACTIVE_ENGINE = "levelwise"
+BATCH_ENGINE = "sklearn"
+SMALL_BATCH_ROWS = 1000
+
+# Model chia theo hãng (python -m src.utils.brand_shards): chỉ load shard của các hãng đang được hỏi
+USE_BRAND_SHARDS = True
+SHARD_CACHE_MAX_MB = 256
+
+# Thread khi dự đoán: lô < PARALLEL_MIN_ROWS dòng chạy tuần tự, lô lớn hơn chia cho nhiều thread.
+# INFERENCE_MAX_THREADS = 0: tự tính = số CPU / WEB_CONCURRENCY (số worker Streamlit trên máy)
+INFERENCE_MAX_THREADS = 0
+PARALLEL_MIN_ROWS = 20_000
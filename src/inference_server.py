@@ -0,0 +1,150 @@
+import argparse
+import json
+import logging
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from src.config import INFERENCE_HOST, INFERENCE_PORT, BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS # type: ignore
+from src.utils.inference_policy import limit_native_threads # type: ignore
+from src.utils.micro_batch import MicroBatcher # type: ignore
+from src.utils.model_arrays import read_model # type: ignore
+from src.utils.prediction import predict_price_batch, anomaly_result # type: ignore
+
+# ============================================================
+# INFERENCE SERVER (không cần Streamlit)
+# ============================================================
+#
+#   python -m src.inference_server --port 8600
+#
+#   POST /predict  {xe} hoặc [{xe}, ...]            -> {"gia_du_doan": ...} / [...]
+#   POST /anomaly  {xe, "gia": ...} hoặc [...]       -> kết quả detect_anomaly / [...]
+#   GET  /health                                    -> trạng thái + thống kê micro-batch
+#
+# Mọi request đồng thời được gom qua MicroBatcher thành 1 lần model.predict.
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY_BYTES = 5 * 1024 * 1024
+
+
+class InferenceService:
+    def __init__(self, model, max_batch=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS):
+        self.model = model
+        self.batcher = MicroBatcher(self._predict_raw, max_batch, max_wait_ms, name="inference-batcher")
+
+    def _predict_raw(self, records):
+        # Output gốc của model cho cả lô (chưa expm1)
+        return predict_price_batch(records, self.model, inverse_log=False)
+
+    def predict(self, records):
+        raws = self.batcher.predict_many(records)
+        return [{'gia_du_doan': float(np.expm1(raw))} for raw in raws]
+
+    def anomaly(self, records):
+        for r in records:
+            if 'gia' not in r:
+                raise ValueError("Thiếu trường 'gia' (giá người bán)")
+        raws = self.batcher.predict_many(records)
+        results = []
+        for record, raw in zip(records, raws):
+            result = anomaly_result(record, raw)
+            results.append({k: (bool(v) if isinstance(v, (bool, np.bool_)) else v) for k, v in result.items()})
+        return results
+
+    def close(self):
+        self.batcher.close()
+
+
+class InferenceHTTPServer(ThreadingHTTPServer):
+    # Backlog mặc định (5) làm rớt kết nối khi nhiều client gửi cùng lúc
+    request_queue_size = 256
+
+
+def make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        routes = {'/predict': service.predict, '/anomaly': service.anomaly}
+
+        def _send_json(self, status, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == '/health':
+                self._send_json(200, {'status': 'ok', 'batcher': service.batcher.stats()})
+            else:
+                self._send_json(404, {'error': f"Không có endpoint {self.path}"})
+
+        def do_POST(self):
+            handler = self.routes.get(self.path)
+            if handler is None:
+                self._send_json(404, {'error': f"Không có endpoint {self.path}"})
+                return
+
+            length = int(self.headers.get("Content-Length") or 0)
+            if length > MAX_BODY_BYTES:
+                self._send_json(413, {'error': "Request quá lớn"})
+                return
+
+            try:
+                payload = json.loads(self.rfile.read(length) or b"null")
+            except ValueError as e:
+                self._send_json(400, {'error': f"JSON không hợp lệ: {e}"})
+                return
+
+            # Chấp nhận 1 object hoặc 1 mảng object
+            single = isinstance(payload, dict)
+            records = [payload] if single else payload
+            if not isinstance(records, list) or not all(isinstance(r, dict) for r in records):
+                self._send_json(400, {'error': "Body phải là 1 object hoặc mảng object"})
+                return
+
+            try:
+                results = handler(records)
+            except ValueError as e:
+                self._send_json(400, {'error': str(e)})
+                return
+            except Exception as e:
+                logger.exception("Predict lỗi")
+                self._send_json(500, {'error': str(e)})
+                return
+
+            self._send_json(200, results[0] if single else results)
+
+        def log_message(self, format, *args):
+            logger.debug("%s - %s", self.address_string(), format % args)
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP inference server cho model dự đoán giá")
+    parser.add_argument("--model", default="./models/model_regression_best.pkl")
+    parser.add_argument("--host", default=INFERENCE_HOST)
+    parser.add_argument("--port", type=int, default=INFERENCE_PORT)
+    parser.add_argument("--max-batch", type=int, default=BATCH_MAX_SIZE)
+    parser.add_argument("--max-wait-ms", type=float, default=BATCH_MAX_WAIT_MS)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    limit_native_threads()
+
+    service = InferenceService(read_model(args.model), args.max_batch, args.max_wait_ms)
+    server = InferenceHTTPServer((args.host, args.port), make_handler(service))
+    logger.info("Inference server chạy tại http://%s:%d", args.host, args.port)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
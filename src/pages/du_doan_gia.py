@@ -4,9 +4,11 @@ import numpy as np
 
 from src.config import * # type: ignore
 from src.utils.ui_components import UIComponents # type: ignore
-from src.utils.charts import bieu_do_gia_xe, price_range_chart, show_price_suggestion # type: ignore
-from src.utils.data_processor import load_data, load_model, append_to_csv # type: ignore
+from src.utils.charts import bieu_do_gia_xe, price_range_chart, price_sweep_chart, show_price_explanation, show_price_suggestion # type: ignore
+from src.utils.data_processor import load_dataset, model_handle, append_to_csv, load_model_table # type: ignore
 from src.utils.price_functions import format_vnd, format_trieu_vnd, suggest_price # type: ignore
+from src.utils.prediction import prepare_input, predict_price, predict_price_sweep, sweep_grid # type: ignore
+from src.utils.prediction_cache import cached_predict_price # type: ignore
 
 # Set page config
 st.set_page_config(
@@ -21,9 +23,9 @@ ui = UIComponents()
 # khai báo path
 new_post_file = "./data/results/results_post_new_pending.csv"
 
-# Load ngay khi import module
-data = load_data("./data/processed/data_motobikes_cleaned.csv")
-model = load_model("./models/model_regression_best.pkl")
+# Model (và bảng giá) load trên thread nền, tự đổi sang version mới khi được promote
+# trong registry; dữ liệu lấy từ catalog dùng chung (load_dataset) khi hiển thị trang
+warmup = model_handle()
 
 # ============================================================
 # HÀM MAIN SHOW & INIT
@@ -31,6 +33,7 @@ model = load_model("./models/model_regression_best.pkl")
 def show():
     # Set page layout
     ui.set_page_layout_wide(width=1200, hide_branding=False)
+    data = load_dataset("listings")
     
     st.markdown("## 💰 Công Cụ Dự Đoán Giá Xe Máy")
     st.markdown("*Nhập thông tin xe của bạn để nhận được đề xuất giá hợp lý từ hệ thống*")
@@ -39,7 +42,7 @@ def show():
     tab1, tab2 = st.tabs(["🎯 Dự Đoán Giá", "📊 Thị Trường Giá"])
     
     with tab1:
-        du_doan_gia_xe(data, model)
+        du_doan_gia_xe(data, warmup)
     
     with tab2:
         phan_tich_thi_truong(data)
@@ -47,46 +50,8 @@ def show():
 # ============================================================
 # HÀM XỬ LÝ DỰ ĐOÁN GIÁ XE 
 # ============================================================
-def prepare_input(input_dict, features):
-    df = pd.DataFrame([{f: input_dict.get(f, np.nan) for f in features}])
 
-    # numeric auto convert
-    numeric_cols = ['so_km_da_di','nam_dang_ky']
-    for c in numeric_cols:
-        if c in df:
-            df[c] = pd.to_numeric(df[c], errors='coerce')
-
-    # categorical auto fill
-    cat_cols = ['thuong_hieu','dong_xe','tinh_trang','loai_xe','dung_tich_xe', 'xuat_xu']
-    for c in cat_cols:
-        df[c] = df[c].fillna('unknown').astype(str)
-
-
-    # Filll any all-NaN numeric → 0
-    for c in df.columns:
-        if df[c].dtype.kind in 'fiu' and df[c].isna().all():
-            df[c] = df[c].fillna(0)
-    
-    return df
-st
-def predict_price(info, model, features=None, inverse_log=True):
-    
-    if features is None:
-        features = [
-            'thuong_hieu','dong_xe', 'nam_dang_ky','so_km_da_di',
-            'tinh_trang','loai_xe','dung_tich_xe','xuat_xu'
-        ]        
-
-    df = prepare_input(info, features)
-
-    try:
-        pred = model.predict(df)[0]
-    except Exception as e:
-        raise RuntimeError(f"Predict failed: {e}\nInput:\n{df}")
-
-    return float(np.expm1(pred) if inverse_log else pred)
-
-def du_doan_gia_xe(df, model_regression_best):    
+def du_doan_gia_xe(df, handle):    
     
     st.markdown("### 📋 Thông tin xe cần dự đoán giá")
 
@@ -125,10 +90,13 @@ def du_doan_gia_xe(df, model_regression_best):
         
         ui.divider_thin(style="dashed", color="#d6d6d9")
 
+        # Model còn đang khởi động -> form vẫn hiển thị, chỉ khóa nút dự đoán
+        model_ready = ui.model_warmup_notice(handle)
+
         col_a, col_b, col_c = st.columns(3)
         with col_b:
             # Nút Dự đoán và gợi ý giá 
-            du_doan_gia_button = st.button(f"💰 **Dự đoán & Gợi ý giá**", type="primary" , width="stretch")
+            du_doan_gia_button = st.button(f"💰 **Dự đoán & Gợi ý giá**", type="primary" , width="stretch", disabled=not model_ready)
         
     # Xử lý khi nhấn nút dự đoán
     if du_doan_gia_button:
@@ -145,19 +113,41 @@ def du_doan_gia_xe(df, model_regression_best):
         }
         # Dự đoán giá
         try:
-            gia_du_doan = predict_price(input_vehicle, model_regression_best)            
+            # Giữ version model trong suốt lần dự đoán (không bị giải phóng khi đổi version)
+            with handle.acquire() as (model_regression_best, lattice):
+                gia_du_doan = cached_predict_price(input_vehicle, model_regression_best, lattice=lattice)
+
+                # What-if: cả lưới km x năm đăng ký chấm trong 1 lần predict;
+                # ô km / năm hiện tại khớp giá đã dự đoán (có thể từ bảng giá / cascade)
+                km_values, year_values = sweep_grid(input_vehicle, year_range=(nam_dk_min, nam_dk_max))
+                bang_gia_km_nam = predict_price_sweep(input_vehicle, model_regression_best, km_values, year_values,
+                                                      current_price=gia_du_doan)
+
+                # Giải thích giá: tra bảng dựng sẵn, không gọi model
+                bang_giai_thich = load_model_table("explanations", str(EXPLANATIONS_TABLE), handle.version, model_regression_best)
+                giai_thich = bang_giai_thich.explain(input_vehicle, np.log1p(gia_du_doan)) if bang_giai_thich else None
+
+                # Khoảng giá hiệu chỉnh theo phân khúc (None -> hệ số cố định)
+                bang_khoang_gia = load_model_table("intervals", str(PRICE_INTERVALS), handle.version, model_regression_best)
+
+                # P10 / P50 / P90 từ các lá của random forest (None nếu chưa build index)
+                bang_phan_vi = load_model_table("quantiles", str(QUANTILE_INDEX), handle.version, model_regression_best)
+                phan_vi_gia = bang_phan_vi.predict_quantiles(input_vehicle, model_regression_best)[0] if bang_phan_vi else None
         except Exception as e:            
             st.error(f"Lỗi trong quá trình dự đoán: {e}")
             return
         
         # Giá gợi ý
-        gia_goi_y = suggest_price(gia_du_doan)
+        gia_goi_y = suggest_price(gia_du_doan, input_vehicle, bang_khoang_gia)
         
         # Lưu kết quả với session_state
         st.session_state.ket_qua_du_doan = {
             'gia_du_doan': gia_du_doan,
             'gia_goi_y': gia_goi_y,
-            'input_vehicle': input_vehicle
+            'input_vehicle': input_vehicle,
+            'bang_gia_km_nam': bang_gia_km_nam,
+            'giai_thich': giai_thich,
+            'phan_vi_gia': phan_vi_gia
         }
     
     # HIỂN THỊ KẾT QUẢ NẾU CÓ (dù click button nào cũng vẫn hiển thị)
@@ -180,6 +170,12 @@ def du_doan_gia_xe(df, model_regression_best):
             st.markdown(f"- Giá bán tối đa lợi nhuận: **{format_vnd(gia_goi_y['max_profit'])}**")
             st.markdown(f"- Khoảng giá hợp lý: **{format_vnd(gia_goi_y['fair_low'])} - {format_vnd(gia_goi_y['fair_high'])}**")
 
+            phan_vi_gia = ket_qua.get('phan_vi_gia')
+            if phan_vi_gia is not None:
+                st.write("##### **📊 Giá thị trường của các xe tương tự**")
+                st.markdown(f"- P10 / P50 / P90: **{format_vnd(phan_vi_gia[0])}** / **{format_vnd(phan_vi_gia[1])}** / "
+                            f"**{format_vnd(phan_vi_gia[2])}**")
+
         with col2_kq:            
             ui.styled_table_small(
                 headers=["Đặc Trưng", "Giá Trị"],
@@ -200,7 +196,26 @@ def du_doan_gia_xe(df, model_regression_best):
         # Biểu đồ khoảng giá
         fig_price_range = price_range_chart(gia_goi_y['fast_sell'], gia_du_doan, gia_goi_y['max_profit'], gia_goi_y['fair_low'], gia_goi_y['fair_high'])        
         st.plotly_chart(fig_price_range, use_container_width=True)
-        
+
+        # Giá nếu bán sau khi đi thêm km / nếu xe đời khác
+        bang_gia_km_nam = ket_qua.get('bang_gia_km_nam')
+        if bang_gia_km_nam is not None:
+            km_now, year_now = int(input_data['so_km_da_di']), int(input_data['nam_dang_ky'])
+            fig_sweep = price_sweep_chart(bang_gia_km_nam, km_now, year_now)
+            st.plotly_chart(fig_sweep, use_container_width=True)
+
+            gia_hien_tai = bang_gia_km_nam.loc[year_now, km_now]
+            if km_now + 10_000 in bang_gia_km_nam.columns:
+                chenh_lech = bang_gia_km_nam.loc[year_now, km_now + 10_000] - gia_hien_tai
+                st.markdown(f"- Đi thêm 10.000 km rồi mới bán: **{'+' if chenh_lech >= 0 else ''}{format_vnd(chenh_lech)}**")
+            if year_now + 1 in bang_gia_km_nam.index:
+                chenh_lech = bang_gia_km_nam.loc[year_now + 1, km_now] - gia_hien_tai
+                st.markdown(f"- Xe đời {year_now + 1} (mới hơn 1 năm): **{'+' if chenh_lech >= 0 else ''}{format_vnd(chenh_lech)}**")
+
+        # Vì sao có mức giá này?
+        if ket_qua.get('giai_thich') is not None:
+            show_price_explanation(ket_qua['giai_thich'])
+
         # Hiển thị toàn bộ phần gợi ý giá bán
         show_price_suggestion(gia_goi_y['fast_sell'], gia_du_doan, gia_goi_y['max_profit'])
       
@@ -7,7 +7,7 @@ import plotly.express as px
 
 from src.utils.ui_components import UIComponents # type: ignore
 from src.utils.charts import bieu_do_gia_xe, price_range_chart, show_price_suggestion, price_comparison_gauge, price_comparison_bar # type: ignore
-from src.utils.data_processor import load_data, load_model, append_to_csv, append_to_csv_with_str # type: ignore
+from src.utils.data_processor import load_dataset, load_model, append_to_csv, append_to_csv_with_str # type: ignore
 from src.utils.price_functions import format_vnd, format_trieu_vnd, suggest_price # type: ignore
 
 # Set page config
@@ -20,10 +20,7 @@ st.set_page_config(
 # Khởi tạo class
 ui = UIComponents()
 
-# Load ngay khi import module
-data_post_new = load_data("./data/results/results_post_new_pending.csv")
-data_result_anomaly = load_data("./data/results/results_with_anomalies.csv")
-df_result = pd.concat([data_result_anomaly, data_post_new], join='inner', ignore_index=True)
+# Dữ liệu lấy từ catalog dùng chung (load_dataset), load 1 lần / process
 # model = load_model("./models/model_regression_best.pkl")
 
 # khai báo path
@@ -36,7 +33,7 @@ def show():
     # Set page layout
     ui.set_page_layout_wide(width=1200, hide_branding=False)
     
-    phan_tich_thi_truong(data_result_anomaly, data_post_new)
+    phan_tich_thi_truong(load_dataset("anomalies"), load_dataset("new_posts"))
 
 # ============================================================
 # HÀM XỬ LÝ TÌM KIẾM & SO SÁNH
@@ -5,10 +5,13 @@ import numpy as np
 import plotly.graph_objects as go
 import plotly.express as px
 
+from src.config import EXPLANATIONS_TABLE, QUANTILE_INDEX # type: ignore
 from src.utils.ui_components import UIComponents # type: ignore
-from src.utils.charts import bieu_do_gia_xe, price_range_chart, show_price_suggestion, price_comparison_gauge, price_comparison_bar # type: ignore
-from src.utils.data_processor import load_data, load_model, append_to_csv, append_to_csv_with_str # type: ignore
+from src.utils.charts import bieu_do_gia_xe, price_range_chart, show_price_suggestion, price_comparison_gauge, price_comparison_bar, show_price_explanation # type: ignore
+from src.utils.data_processor import load_dataset, model_handle, append_to_csv, append_to_csv_with_str, load_model_table # type: ignore
 from src.utils.price_functions import format_vnd, format_trieu_vnd, suggest_price # type: ignore
+from src.utils.prediction import prepare_input, predict_price, detect_anomaly # type: ignore
+from src.utils.prediction_cache import cached_detect_anomaly # type: ignore
 
 # Set page config
 st.set_page_config(
@@ -23,9 +26,9 @@ ui = UIComponents()
 # khai báo path
 new_post_file = "./data/results/results_post_new_pending.csv"
 
-# Load ngay khi import module
-data = load_data("./data/processed/data_motobikes_cleaned.csv")
-model = load_model("./models/model_regression_best.pkl")
+# Model (và bảng giá) load trên thread nền, tự đổi sang version mới khi được promote
+# trong registry; dữ liệu lấy từ catalog dùng chung (load_dataset) khi hiển thị trang
+warmup = model_handle()
 
 # ============================================================
 # HÀM MAIN SHOW & INIT
@@ -33,34 +36,14 @@ model = load_model("./models/model_regression_best.pkl")
 def show():
     # Set page layout
     ui.set_page_layout_wide(width=1200, hide_branding=False)
+    data = load_dataset("listings")
     
-    phat_hien_xe_bat_thuong(data, model)
+    phat_hien_xe_bat_thuong(data, warmup)
 
 # ============================================================
 # HÀM XỬ LÝ PHÁT HIỆN BẤT THƯỜNG
 # ============================================================
-def detect_anomaly(model, info):
-    df = pd.DataFrame([info])
-    pred = model.predict(df)[0]
-    pred = pred*1_000_000
-
-    residual = info['gia'] - pred
-
-    # Z-score với sigma giả định
-    sigma = 0.15 * pred
-    z = residual / sigma
-
-    is_anomaly = abs(z) > 2.5
-
-    return {
-        'gia_du_doan': pred,
-        'residual': residual,
-        'z_score': z,
-        'is_anomaly': is_anomaly,
-        'ket_luan': '🔴 Giá Bất thường' if is_anomaly else '🟡 Giá Bình thường'
-    }
-
-def phat_hien_xe_bat_thuong(df, models):
+def phat_hien_xe_bat_thuong(df, handle):
     
     # ===== HEADER =====    
     col_header1, col_header2 = st.columns([7, 1])
@@ -137,13 +120,17 @@ def phat_hien_xe_bat_thuong(df, models):
         
         st.write("")
         
+        # Model còn đang khởi động -> form vẫn hiển thị, chỉ khóa nút kiểm tra
+        model_ready = ui.model_warmup_notice(handle)
+
         # Nút kiểm tra
         col_btn1, col_btn2, col_btn3 = st.columns([1, 1, 1])
         with col_btn2:
             kiem_tra_bat_thuong_button = st.button(
                 "🔍 Kiểm tra bất thường",
                 type="primary",
-                use_container_width=True
+                use_container_width=True,
+                disabled=not model_ready
             )
 
     # ===== XỬ LÝ KHI CLICK BUTTON =====
@@ -161,8 +148,16 @@ def phat_hien_xe_bat_thuong(df, models):
             'gia': gia_ban,
         }
         
-        # Dò tìm bất thường (giả sử hàm này đã có)
-        ketqua = detect_anomaly(models, input_xe)
+        # Dò tìm bất thường (cache dùng chung giữa các session)
+        with handle.acquire() as (models, lattice):
+            ketqua = cached_detect_anomaly(models, input_xe, lattice=lattice)
+            # Vì sao model dự đoán mức giá này? (gia_du_doan = output gốc x 1 triệu)
+            bang_giai_thich = load_model_table("explanations", str(EXPLANATIONS_TABLE), handle.version, models)
+            giai_thich = bang_giai_thich.explain(input_xe, ketqua['gia_du_doan'] / 1_000_000) if bang_giai_thich else None
+
+            # P10 / P50 / P90 (output gốc x 1 triệu, cùng quy ước với gia_du_doan của anomaly_result)
+            bang_phan_vi = load_model_table("quantiles", str(QUANTILE_INDEX), handle.version, models)
+            phan_vi_gia = bang_phan_vi.predict_quantiles(input_xe, models, inverse_log=False)[0] * 1_000_000 if bang_phan_vi else None
         
         
         # Lưu vào session state để có lịch sử
@@ -188,7 +183,9 @@ def phat_hien_xe_bat_thuong(df, models):
             'dung_tich_xi_lanh': dung_tich_xi_lanh,
             'so_km_da_di': so_km_da_di,
             'nam_dang_ky': nam_dang_ky,
-            'xuat_xu': xuat_xu
+            'xuat_xu': xuat_xu,
+            'phan_vi_gia': phan_vi_gia,
+            'giai_thich': giai_thich
         }
     
     # ===== HIỂN THỊ KẾT QUẢ (NẾU ĐÃ CÓ) =====
@@ -205,6 +202,8 @@ def phat_hien_xe_bat_thuong(df, models):
         so_km_da_di = saved_data['so_km_da_di']
         nam_dang_ky = saved_data['nam_dang_ky']
         xuat_xu = saved_data['xuat_xu']
+        phan_vi_gia = saved_data.get('phan_vi_gia')
+        giai_thich = saved_data.get('giai_thich')
         
         st.write("---")             
         
@@ -246,6 +245,17 @@ def phat_hien_xe_bat_thuong(df, models):
                 else:
                     st.warning("### 🤔 GIÁ THẤP BẤT THƯỜNG")
                     st.caption(f"Thấp hơn {lech_gia_abs:.1f}% so với thị trường")
+
+        # Giá người bán nằm ở đâu trong phân phối giá của các xe tương tự
+        if phan_vi_gia is not None:
+            if gia_ban < phan_vi_gia[0]:
+                vi_tri = "thấp hơn 90% xe tương tự"
+            elif gia_ban > phan_vi_gia[2]:
+                vi_tri = "cao hơn 90% xe tương tự"
+            else:
+                vi_tri = "nằm trong khoảng P10 - P90"
+            st.markdown(f"📊 Giá xe tương tự P10 / P50 / P90: **{phan_vi_gia[0]:,.0f}** / **{phan_vi_gia[1]:,.0f}** / "
+                        f"**{phan_vi_gia[2]:,.0f} VND** - giá người bán {vi_tri}")
         
         st.divider()
         
@@ -277,6 +287,10 @@ def phat_hien_xe_bat_thuong(df, models):
             )
             st.plotly_chart(fig_gauge, use_container_width=True)            
 
+        # Vì sao model dự đoán mức giá này?
+        if giai_thich is not None:
+            show_price_explanation(giai_thich)
+
         st.divider()
         
         # ===== PHÂN TÍCH & GỢI Ý CẢI THIỆN =====
@@ -460,74 +474,3 @@ def phat_hien_xe_bat_thuong(df, models):
             if st.button("🗑️ Xóa lịch sử"):
                 st.session_state.anomaly_history = []
                 st.rerun()
-        
-
-        
-
-# Hàm giả lập detect_anomaly (bạn thay bằng hàm thật)
-def detect_anomaly(model, info):
-    df = pd.DataFrame([info])
-    pred = model.predict(df)[0]
-    pred = pred*1_000_000    
-
-    residual = info['gia'] - pred
-
-    # Z-score với sigma giả định
-    sigma = 0.15 * pred
-    z = residual / sigma
-
-    is_anomaly = abs(z) > 2.5
-
-    if not is_anomaly:
-        ket_luan = "🟡 Giá hợp lý"
-    elif info['gia'] > pred:
-        ket_luan = "🔴 Giá cao bất thường"
-    else:
-        ket_luan = "🟢 Giá thấp bất thường"
-
-    return {
-        'gia_du_doan': pred,
-        'residual': residual,
-        'is_anomaly': is_anomaly,
-        'z_score': z,
-        'ket_luan': ket_luan
-    }
-
-def prepare_input(input_dict, features):
-    df = pd.DataFrame([{f: input_dict.get(f, np.nan) for f in features}])
-
-    # numeric auto convert
-    numeric_cols = ['so_km_da_di','nam_dang_ky']
-    for c in numeric_cols:
-        if c in df:
-            df[c] = pd.to_numeric(df[c], errors='coerce')
-
-    # categorical auto fill
-    cat_cols = ['thuong_hieu','dong_xe','tinh_trang','loai_xe','dung_tich_xe', 'xuat_xu']
-    for c in cat_cols:
-        df[c] = df[c].fillna('unknown').astype(str)
-
-
-    # Filll any all-NaN numeric → 0
-    for c in df.columns:
-        if df[c].dtype.kind in 'fiu' and df[c].isna().all():
-            df[c] = df[c].fillna(0)
-    
-    return df
-st
-def predict_price(info, model, features=None, inverse_log=True):
-    
-    if features is None:
-        features = [
-            'thuong_hieu','dong_xe', 'nam_dang_ky','so_km_da_di',
-            'tinh_trang','loai_xe','dung_tich_xe','xuat_xu'
-        ]        
-
-    df = prepare_input(info, features)
-
-    try:
-        pred = model.predict(df)[0]
-    except Exception as e:
-        raise RuntimeError(f"Predict failed: {e}\nInput:\n{df}")
-
-    return float(np.expm1(pred) if inverse_log else pred)
\ No newline at end of file
@@ -7,7 +7,7 @@ import plotly.express as px
 
 from src.utils.ui_components import UIComponents # type: ignore
 from src.utils.charts import bieu_do_gia_xe, price_range_chart, show_price_suggestion, price_comparison_gauge, price_comparison_bar # type: ignore
-from src.utils.data_processor import load_data, load_model, append_to_csv, append_to_csv_with_str, save_data # type: ignore
+from src.utils.data_processor import load_dataset, load_model, append_to_csv, append_to_csv_with_str, save_data, moderate_listing # type: ignore
 from src.utils.price_functions import format_vnd, format_trieu_vnd, suggest_price # type: ignore
 
 # Set page config
@@ -21,9 +21,7 @@ st.set_page_config(
 ui = UIComponents()
 
 
-# Load ngay khi import module
-data_post_new = load_data("./data/results/results_post_new_pending.csv")
-data_result_anomaly = load_data("./data/results/results_with_anomalies.csv")
+# Dữ liệu lấy từ catalog dùng chung (load_dataset), load 1 lần / process
 # df_result = pd.concat([data_result_anomaly, data_post_new], join='inner', ignore_index=True)
 # model = load_model("./models/model_regression_best.pkl")
 
@@ -38,9 +36,9 @@ def show(type=0):
     ui.set_page_layout_wide(width=1200, hide_branding=False)
     
     if type == 0:
-        quan_ly_tin_dang(data_result_anomaly, type)
+        quan_ly_tin_dang(load_dataset("anomalies"), type)
     else:
-        quan_ly_tin_dang(data_post_new, type)
+        quan_ly_tin_dang(load_dataset("new_posts"), type)
 
 # ============================================================
 # HÀM XỬ LÝ TÌM KIẾM & SO SÁNH
@@ -170,22 +168,23 @@ def quan_ly_tin_dang(df_results, type=0):
                 with col3:
                     btn_tu_choi = st.button("❌ Từ chối", key=f"btn_tu_choi_{index}", use_container_width=True)  
                                 
-                output_path = "./data/results/data_motobikes_cleaned.csv"
+                # Ghi 1 sự kiện kiểm duyệt cho đúng tin này (index = id trong SQLite)
+                dataset = "anomalies" if type == 0 else "new_posts"
                 if btn_duyet_tin:
                     df_filtered.loc[index, "anomaly_flag"] = 0
                     df_filtered.loc[index, "trang_thai"] = 0                    
                     st.success(" Tin đã được duyệt đăng", icon="✅")                    
-                    save_data(df_filtered, output_path)                    
+                    moderate_listing(dataset, "approve", index)
                 elif btn_sua_tin:                    
                     df_filtered.loc[index, "trang_thai"] = 4
                     st.success(" Yêu cầu sữa lại thông tin đăng, để được duyệt", icon="🔄")
-                    save_data(df_filtered, output_path)
+                    moderate_listing(dataset, "request_edit", index)
                 elif btn_tu_choi:
                     df_filtered.loc[index, "trang_thai"] = 3
                     # Xóa tin có index
                     df_filtered = df_filtered.drop(index)
                     st.error(" Tin đã bị từ chối, Bài đăng sẽ bị xóa", icon="❌")
-                    save_data(df_filtered, output_path)
+                    moderate_listing(dataset, "reject", index)
 
     
                 
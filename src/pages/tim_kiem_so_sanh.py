@@ -7,7 +7,7 @@ import streamlit as st
 
 from src.utils.ui_components import UIComponents # type: ignore
 # from src.utils.charts import bieu_do_gia_xe, price_range_chart, show_price_suggestion, price_comparison_gauge, price_comparison_bar # type: ignore
-from src.utils.data_processor import load_data, load_model, append_to_csv, append_to_csv_with_str # type: ignore
+from src.utils.data_processor import load_dataset, load_model, append_to_csv, append_to_csv_with_str # type: ignore
 # from src.utils.price_functions import format_vnd, format_trieu_vnd, suggest_price # type: ignore
 
 # Set page config
@@ -20,9 +20,7 @@ st.set_page_config(
 # Khởi tạo class
 ui = UIComponents()
 
-# Load ngay khi import module
-# data = load_data("./data/processed/data_motobikes_cleaned.csv")
-data_result_anomaly = load_data("./data/results/results_with_anomalies.csv")
+# Dữ liệu lấy từ catalog dùng chung (load_dataset), load 1 lần / process
 # model = load_model("./models/model_regression_best.pkl")
 
 # khai báo path
@@ -35,7 +33,7 @@ def show():
     # Set page layout
     ui.set_page_layout_wide(width=1200, hide_branding=False)
     
-    tim_kiem_va_so_sanh(data_result_anomaly)
+    tim_kiem_va_so_sanh(load_dataset("anomalies"))
 
 # ============================================================
 # HÀM XỬ LÝ TÌM KIẾM & SO SÁNH
@@ -147,7 +145,7 @@ def tim_kiem_va_so_sanh(df):
     if cb_tin_bat_thuong:
         df_result = df_result[df_result['anomaly_flag'] == 1]
 
-    df_result_new_post = load_data("./data/results/results_post_new_pending.csv")
+    df_result_new_post = load_dataset("new_posts")
     
     with st.expander("Xem tìm kiếm", expanded=False):
         st.dataframe(df_result, height=200)
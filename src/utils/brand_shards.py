@@ -0,0 +1,256 @@
+import argparse
+import json
+import os
+import pickle
+import shutil
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from src.utils.compiled_encoder import compile_model # type: ignore
+from src.utils.model_arrays import (  # type: ignore
+    META_FILE, PREPROCESSOR_FILE, ArrayForestModel, flatten_trees, load_arrays,
+    prune_arrays, save_arrays, split_pipeline,
+)
+from src.utils.prediction import FEATURES, CAT_COLS, NUMERIC_COLS # type: ignore
+
+# ============================================================
+# MODEL CHIA THEO HÃNG XE (BRAND SHARDS)
+# ============================================================
+#
+# Mỗi hãng đủ nhiều tin đăng có 1 shard riêng: các cây của model gốc với
+# cột one-hot thuong_hieu cố định theo hãng đó, bỏ hết nhánh dành cho hãng
+# khác (prune_arrays) -> dự đoán giống hệt model gốc nhưng nhỏ hơn.
+#
+#   <ten_model>_shards/
+#       meta.json          -> artifact = "brand_shards", hãng -> thư mục shard
+#       preprocessor.pkl   -> ColumnTransformer dùng chung
+#       brand_000/ ...     -> shard của từng hãng (layout npy, mmap được)
+#       _other/            -> hãng không có trong lúc train (one-hot toàn 0)
+#       _global/           -> model đầy đủ cho các hãng hiếm
+#
+# Khi dự đoán, shard được load lúc cần và giữ trong LRU giới hạn theo MB.
+
+SHARDS_SUFFIX = "_shards"
+BRAND_COL = "thuong_hieu"
+OTHER_SHARD = "_other"
+GLOBAL_SHARD = "_global"
+
+# Hãng có ít tin đăng hơn -> dùng model đầy đủ
+DEFAULT_MIN_ROWS = 30
+
+
+def sharded_model_path(model_path):
+    # models/model_regression_best.pkl -> models/model_regression_best_shards
+    root, _ = os.path.splitext(str(model_path))
+    return root + SHARDS_SUFFIX
+
+
+def brand_columns(model):
+    """(danh sách hãng, chỉ số cột one-hot tương ứng) sau preprocessor của model"""
+    compiled = compile_model(model, FEATURES, CAT_COLS, NUMERIC_COLS)
+    if compiled is None:
+        raise ValueError("Không đọc được preprocessor của model")
+    for block in compiled.encoder.blocks:
+        if block.kind == "onehot" and BRAND_COL in block.columns:
+            lookup = block.lookups[block.columns.index(BRAND_COL)]
+            brands = list(lookup.keys())
+            return brands, [lookup[b] for b in brands]
+    raise ValueError(f"Model không one-hot cột {BRAND_COL}, không chia shard được")
+
+
+def export_brand_shards(model, out_dir, brand_counts=None, min_rows=DEFAULT_MIN_ROWS):
+    """Export model thành thư mục shard theo hãng; brand_counts: số tin đăng mỗi hãng"""
+    preprocessor, estimator = split_pipeline(model)
+    arrays, meta = flatten_trees(estimator)
+    brands, columns = brand_columns(model)
+
+    if os.path.isdir(out_dir):
+        shutil.rmtree(out_dir)
+    os.makedirs(out_dir)
+
+    shard_meta = {}
+
+    def write_shard(name, fixed):
+        shard_arrays, meta_shard = prune_arrays(arrays, meta, fixed) if fixed is not None else (arrays, dict(meta))
+        meta_shard["artifact"] = "tree_ensemble"
+        meta_shard["has_preprocessor"] = False
+        save_arrays(os.path.join(out_dir, name), shard_arrays, meta_shard, layout="npy")
+        shard_meta[name] = {'n_nodes': meta_shard["n_nodes"],
+                            'nbytes': int(sum(a.nbytes for a in shard_arrays.values()))}
+
+    shard_of_brand = {}
+    for i, (brand, column) in enumerate(zip(brands, columns)):
+        if brand_counts is not None and brand_counts.get(brand, 0) < min_rows:
+            shard_of_brand[brand] = GLOBAL_SHARD
+            continue
+        name = f"brand_{i:03d}"
+        write_shard(name, {c: float(c == column) for c in columns})
+        shard_of_brand[brand] = name
+
+    write_shard(OTHER_SHARD, {c: 0.0 for c in columns})
+    write_shard(GLOBAL_SHARD, None)
+
+    if preprocessor is not None:
+        with open(os.path.join(out_dir, PREPROCESSOR_FILE), "wb") as file:
+            pickle.dump(preprocessor, file)
+
+    with open(os.path.join(out_dir, META_FILE), "w", encoding="utf-8") as file:
+        json.dump({
+            'artifact': "brand_shards",
+            'brand_columns': columns,
+            'brands': brands,
+            'shard_of_brand': shard_of_brand,
+            'shards': shard_meta,
+        }, file, ensure_ascii=False, indent=2)
+    return out_dir
+
+
+def load_sharded_model(path, mmap=False, max_mb=None, engine="levelwise"):
+    with open(os.path.join(path, META_FILE), encoding="utf-8") as file:
+        meta = json.load(file)
+
+    preprocessor = None
+    if os.path.exists(os.path.join(path, PREPROCESSOR_FILE)):
+        with open(os.path.join(path, PREPROCESSOR_FILE), "rb") as file:
+            preprocessor = pickle.load(file)
+
+    return ShardedModel(path, meta, preprocessor, mmap=mmap, max_mb=max_mb, engine=engine)
+
+
+class ShardedModel:
+    """Predictor tương thích model.predict(df): định tuyến từng dòng về shard của hãng"""
+
+    def __init__(self, path, meta, preprocessor=None, mmap=False, max_mb=None, engine="levelwise"):
+        self.path = path
+        self.meta = meta
+        self.preprocessor = preprocessor
+        self.mmap = mmap
+        self.max_bytes = None if max_mb is None else int(max_mb * 1024 * 1024)
+        self.engine = engine
+
+        # Cột one-hot của hãng i -> chỉ số shard; không bật cột nào -> _other
+        self.shard_names = sorted(set(meta['shard_of_brand'].values()) | {OTHER_SHARD})
+        position = {name: i for i, name in enumerate(self.shard_names)}
+        self.brand_columns = np.asarray(meta['brand_columns'], dtype=np.int64)
+        self.shard_of_column = np.array([position[meta['shard_of_brand'][b]] for b in meta['brands']], dtype=np.int64)
+        self.other_shard = position[OTHER_SHARD]
+
+        self._shards = OrderedDict()
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.evictions = 0
+
+    # ---------- LRU các shard ----------
+    def shard(self, name):
+        with self._lock:
+            model = self._shards.get(name)
+            if model is not None:
+                self._shards.move_to_end(name)
+                return model
+
+        # Load ngoài lock: các hãng khác không phải chờ
+        arrays, meta = load_arrays(os.path.join(self.path, name), self.mmap)
+        model = ArrayForestModel(arrays, meta, engine=self.engine)
+
+        with self._lock:
+            model = self._shards.setdefault(name, model)
+            self._shards.move_to_end(name)
+            self.loads += 1
+            self._evict(keep=name)
+        return model
+
+    def _evict(self, keep):
+        if self.max_bytes is None:
+            return
+        while self.resident_bytes > self.max_bytes and len(self._shards) > 1:
+            name = next(iter(self._shards))
+            if name == keep:
+                break
+            del self._shards[name]
+            self.evictions += 1
+
+    @property
+    def resident_bytes(self):
+        return sum(m.nbytes for m in self._shards.values())
+
+    def stats(self):
+        with self._lock:
+            return {
+                'loaded': list(self._shards.keys()),
+                'resident_mb': self.resident_bytes / 1e6,
+                'loads': self.loads,
+                'evictions': self.evictions,
+            }
+
+    def shard_for_brand(self, brand):
+        return self.meta['shard_of_brand'].get(brand, OTHER_SHARD)
+
+    # ---------- Dự đoán ----------
+    def route(self, X):
+        # Chỉ số shard cho từng dòng của X đã transform
+        onehot = X[:, self.brand_columns]
+        has_brand = onehot.max(axis=1) > 0.5 if len(self.brand_columns) else np.zeros(X.shape[0], dtype=bool)
+        routed = np.full(X.shape[0], self.other_shard, dtype=np.int64)
+        routed[has_brand] = self.shard_of_column[onehot[has_brand].argmax(axis=1)]
+        return routed
+
+    def transform(self, X):
+        if self.preprocessor is not None:
+            X = self.preprocessor.transform(X)
+        if hasattr(X, "toarray"):
+            X = X.toarray()
+        return np.asarray(X, dtype=np.float32)
+
+    def predict_matrix(self, X):
+        routed = self.route(X)
+        out = np.empty(X.shape[0], dtype=np.float64)
+        for shard_index in np.unique(routed):
+            rows = routed == shard_index
+            out[rows] = self.shard(self.shard_names[shard_index]).predict_matrix(X[rows])
+        return out
+
+    def predict(self, X):
+        return self.predict_matrix(self.transform(X))
+
+
+# ============================================================
+# CLI: python -m src.utils.brand_shards models/model_regression_best.pkl
+# ============================================================
+def main():
+    parser = argparse.ArgumentParser(description="Chia model dự đoán giá thành các shard theo hãng xe")
+    parser.add_argument("model", nargs="?", default="./models/model_regression_best.pkl")
+    parser.add_argument("-o", "--out", default=None, help="Thư mục output (mặc định: <tên>_shards)")
+    parser.add_argument("--data", default="./data/processed/data_motobikes_cleaned.csv")
+    parser.add_argument("--min-rows", type=int, default=DEFAULT_MIN_ROWS,
+                        help="Hãng có ít tin đăng hơn dùng model đầy đủ")
+    args = parser.parse_args()
+
+    with open(args.model, "rb") as file:
+        model = pickle.load(file)
+    df = pd.read_csv(args.data)
+    out_dir = args.out or sharded_model_path(args.model)
+
+    start = time.perf_counter()
+    export_brand_shards(model, out_dir, df[BRAND_COL].astype(str).value_counts().to_dict(), args.min_rows)
+    sharded = load_sharded_model(out_dir)
+    print(f"Export {len(sharded.shard_names)} shard trong {time.perf_counter() - start:.1f}s -> {out_dir}")
+
+    shards = sharded.meta['shards']
+    full = shards[GLOBAL_SHARD]['nbytes']
+    for brand, name in sorted(sharded.meta['shard_of_brand'].items(), key=lambda kv: -shards[kv[1]]['nbytes']):
+        if name != GLOBAL_SHARD:
+            print(f"  {brand:<20} {shards[name]['nbytes'] / 1e6:8.2f} MB ({shards[name]['nbytes'] / full:.0%} model đầy đủ)")
+    print(f"  {'(hãng lạ)':<20} {shards[OTHER_SHARD]['nbytes'] / 1e6:8.2f} MB")
+    print(f"  {'(model đầy đủ)':<20} {full / 1e6:8.2f} MB")
+
+    X = df[FEATURES]
+    diff = np.max(np.abs(model.predict(X) - sharded.predict(X)))
+    print(f"Kiểm tra {len(X):,} dòng: lệch tối đa {diff:.3e}")
+
+
+if __name__ == "__main__":
+    main()
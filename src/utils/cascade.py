@@ -0,0 +1,266 @@
+import argparse
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.utils.model_arrays import read_model # type: ignore
+from src.utils.conformal import HELDOUT_FILE, heldout_rows # type: ignore
+from src.utils.model_artifacts import ModelArtifact, load_arrays, sample_signature, save_arrays # type: ignore
+from src.utils.prediction import FEATURES, predict_price, predict_price_batch # type: ignore
+
+# ============================================================
+# CASCADE: MODEL NHỎ TRẢ LỜI TRƯỚC, MODEL ĐẦY ĐỦ KHI KHÔNG CHẮC
+# ============================================================
+#
+# Mỗi phân khúc (thuong_hieu, dong_xe) có 1 hồi quy tuyến tính nhỏ
+#   output gốc ~ b0 + b1*t + b2*t^2 + b3*log1p(km)      (t = năm đăng ký - 2015)
+# học lại (distill) từ chính dự đoán của model đầy đủ trên dữ liệu + các
+# điểm sinh thêm. Độ không chắc chắn của 1 xe = RMSE của phân khúc so với
+# model đầy đủ (output gốc ~ log giá nên xấp xỉ sai số tương đối) nhân
+# sqrt(1 + h), h = x^T (X^T X)^-1 x tính trên các tin đăng thật của phân khúc:
+# xe có năm / km ở rìa hoặc xa phần lớn dữ liệu có h lớn. Phân khúc lạ,
+# năm / km ngoài khoảng đã học, hoặc độ không chắc chắn > max_uncertainty
+# -> lookup_raw trả về None và predict_price gọi model đầy đủ.
+#
+# Cùng giao diện lookup_raw với PriceLattice nên đi chung đường "tra nhanh"
+# (FastPathChain) trước model.
+
+SEGMENT_COLS = ['thuong_hieu', 'dong_xe']
+YEAR_CENTER = 2015.0
+N_COEF = 4
+
+DEFAULT_MIN_ROWS = 20
+DEFAULT_MAX_UNCERTAINTY = 0.08
+N_AUGMENT = 32
+
+
+def _design(year, km):
+    t = np.asarray(year, dtype=np.float64) - YEAR_CENTER
+    return np.stack([np.ones_like(t), t, t * t, np.log1p(np.maximum(np.asarray(km, dtype=np.float64), 0))], axis=-1)
+
+
+def _augment(df, n_per_segment=N_AUGMENT, seed=0):
+    # Thêm điểm trong khoảng năm / km của từng phân khúc để hồi quy không chỉ khớp các điểm có sẵn
+    rng = np.random.default_rng(seed)
+    parts = []
+    for _, seg in df.groupby(SEGMENT_COLS, sort=False):
+        rows = seg.iloc[rng.integers(0, len(seg), n_per_segment)].copy()
+        rows['nam_dang_ky'] = rng.integers(int(seg['nam_dang_ky'].min()), int(seg['nam_dang_ky'].max()) + 1, n_per_segment)
+        rows['so_km_da_di'] = rng.uniform(0, max(float(seg['so_km_da_di'].max()), 1.0), n_per_segment).round(-2)
+        parts.append(rows)
+    return pd.concat([df] + parts, ignore_index=True)
+
+
+def fit_cascade(df, model, min_rows=DEFAULT_MIN_ROWS):
+    """Học bảng hệ số theo phân khúc từ dự đoán của model -> dict mảng (lưu bằng save_arrays)"""
+    df = df[FEATURES].dropna(subset=SEGMENT_COLS + ['nam_dang_ky', 'so_km_da_di']).reset_index(drop=True)
+    df[SEGMENT_COLS] = df[SEGMENT_COLS].astype(str)
+    train = _augment(df)
+    target = predict_price_batch(train, model, inverse_log=False)
+
+    real = dict(tuple(df.groupby(SEGMENT_COLS, sort=False)))
+    segments, coefs, rmse, xtx_inv, n_rows, year_min, year_max, km_max = [], [], [], [], [], [], [], []
+    for key, seg in train.assign(_y=target).groupby(SEGMENT_COLS, sort=True):
+        # Số tin đăng thật (không tính điểm sinh thêm) quyết định phân khúc có đủ tin cậy không
+        n_real = len(real[key])
+        if n_real < min_rows:
+            continue
+        X = _design(seg['nam_dang_ky'], seg['so_km_da_di'])
+        coef, *_ = np.linalg.lstsq(X, seg['_y'].to_numpy(), rcond=None)
+        residual = seg['_y'].to_numpy() - X @ coef
+        X_real = _design(real[key]['nam_dang_ky'], real[key]['so_km_da_di'])
+
+        segments.append(key)
+        coefs.append(coef)
+        rmse.append(float(np.sqrt(np.mean(residual ** 2))))
+        xtx_inv.append(np.linalg.pinv(X_real.T @ X_real))
+        n_rows.append(n_real)
+        year_min.append(seg['nam_dang_ky'].min())
+        year_max.append(seg['nam_dang_ky'].max())
+        km_max.append(seg['so_km_da_di'].max())
+
+    return {
+        'segments': np.array(segments, dtype=str).reshape(-1, len(SEGMENT_COLS)),
+        'coefs': np.array(coefs, dtype=np.float64).reshape(-1, N_COEF),
+        'rmse': np.array(rmse),
+        'xtx_inv': np.array(xtx_inv, dtype=np.float64).reshape(-1, N_COEF, N_COEF),
+        'n_rows': np.array(n_rows),
+        'year_min': np.array(year_min, dtype=np.float64),
+        'year_max': np.array(year_max, dtype=np.float64),
+        'km_max': np.array(km_max, dtype=np.float64),
+        **sample_signature(df, model),
+    }
+
+
+def load_cascade(path, max_uncertainty=DEFAULT_MAX_UNCERTAINTY):
+    """Load bảng cascade; không có file -> None"""
+    arrays = load_arrays(path)
+    return None if arrays is None else CascadePredictor(arrays, max_uncertainty)
+
+
+class CascadePredictor(ModelArtifact):
+    """Tầng rẻ của cascade: lookup_raw -> output gốc hoặc None (cần model đầy đủ)"""
+
+    def __init__(self, arrays, max_uncertainty=DEFAULT_MAX_UNCERTAINTY):
+        self.arrays = arrays
+        self.max_uncertainty = max_uncertainty
+        self.index = {tuple(row): i for i, row in enumerate(arrays['segments'].tolist())}
+        self.coefs = arrays['coefs'].tolist()
+        self.rmse = arrays['rmse'].tolist()
+        # Bảng build trước khi có xtx_inv: độ không chắc chắn = RMSE của phân khúc
+        self.xtx_inv = arrays.get('xtx_inv')
+        self.year_min = arrays['year_min'].tolist()
+        self.year_max = arrays['year_max'].tolist()
+        self.km_max = arrays['km_max'].tolist()
+
+        self._lock = threading.Lock()
+        self.answered = 0
+        self.escalated = 0
+
+    def __len__(self):
+        return len(self.index)
+
+    def estimate(self, info):
+        """(output gốc, độ không chắc chắn); phân khúc lạ / ngoài khoảng -> (None, inf)"""
+        try:
+            key = tuple(str(info[c]) for c in SEGMENT_COLS)
+            year = float(info['nam_dang_ky'])
+            km = float(info['so_km_da_di'])
+        except (KeyError, TypeError, ValueError):
+            return None, float('inf')
+
+        i = self.index.get(key)
+        if i is None or not self.year_min[i] <= year <= self.year_max[i] or not 0 <= km <= self.km_max[i]:
+            return None, float('inf')
+
+        t = year - YEAR_CENTER
+        x = np.array([1.0, t, t * t, np.log1p(km)])
+        leverage = float(x @ self.xtx_inv[i] @ x) if self.xtx_inv is not None else 0.0
+        return float(x @ self.coefs[i]), float(self.rmse[i] * np.sqrt(1.0 + max(leverage, 0.0)))
+
+    def lookup_raw(self, info):
+        pred, uncertainty = self.estimate(info)
+        confident = pred is not None and uncertainty <= self.max_uncertainty
+        with self._lock:
+            if confident:
+                self.answered += 1
+            else:
+                self.escalated += 1
+        return float(pred) if confident else None
+
+    def stats(self):
+        with self._lock:
+            total = self.answered + self.escalated
+            return {
+                'answered': self.answered,
+                'escalated': self.escalated,
+                'escalation_rate': self.escalated / total if total else 0.0,
+            }
+
+
+class FastPathChain:
+    """Ghép nhiều bảng tra nhanh (PriceLattice, CascadePredictor...): lookup_raw thử lần lượt"""
+
+    def __init__(self, *paths):
+        self.paths = [p for p in paths if p is not None]
+
+    def lookup_raw(self, info):
+        for path in self.paths:
+            pred = path.lookup_raw(info)
+            if pred is not None:
+                return pred
+        return None
+
+
+def cascade_stats(fast_path):
+    """stats() của CascadePredictor trong đường tra nhanh, None nếu không dùng cascade"""
+    for path in getattr(fast_path, 'paths', [fast_path]):
+        if isinstance(path, CascadePredictor):
+            return path.stats()
+    return None
+
+
+def chain_fast_paths(*paths):
+    # 0 bảng -> None, 1 bảng -> chính nó, nhiều bảng -> FastPathChain
+    paths = [p for p in paths if p is not None]
+    if len(paths) <= 1:
+        return paths[0] if paths else None
+    return FastPathChain(*paths)
+
+
+# ============================================================
+# CLI: python -m src.utils.cascade
+# ============================================================
+def evaluate_cascade(cascade, df, model, thresholds):
+    """Tỉ lệ chuyển lên model đầy đủ + sai số so với model đầy đủ và so với giá thật theo từng ngưỡng"""
+    df = df[df['gia'] > 0]
+    records = df[FEATURES].to_dict('records')
+    actual = df['gia'].to_numpy(dtype=np.float64) * 1e6  # gia: triệu VND
+    full = predict_price_batch(records, model, inverse_log=False)
+    cheap, uncertainty = zip(*(cascade.estimate(r) for r in records))
+    cheap = np.array([np.nan if c is None else c for c in cheap])
+    uncertainty = np.array(uncertainty)
+
+    results = []
+    for threshold in thresholds:
+        answered = uncertainty <= threshold
+        final = np.where(answered, cheap, full)
+        ape = np.abs(np.expm1(final) / np.expm1(full) - 1)
+        results.append({
+            'threshold': threshold,
+            'escalation_rate': float(1 - answered.mean()),
+            'mape': float(ape.mean()),
+            'p95': float(np.quantile(ape, 0.95)),
+            'mape_true': float(np.mean(np.abs(np.expm1(final) / actual - 1))),
+            'full_mape_true': float(np.mean(np.abs(np.expm1(full) / actual - 1))),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Học tầng rẻ của cascade và đánh giá tỉ lệ chuyển lên model đầy đủ")
+    parser.add_argument("--model", default="./models/model_regression_best.pkl")
+    parser.add_argument("--data", default="./data/processed/data_motobikes_cleaned.csv")
+    parser.add_argument("--out", default="./models/cascade.npz")
+    parser.add_argument("--min-rows", type=int, default=DEFAULT_MIN_ROWS)
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.03, 0.05, 0.08, 0.12, 0.2])
+    args = parser.parse_args()
+
+    model = read_model(args.model)
+    df = pd.read_csv(args.data)
+
+    # Đánh giá trên tập test lúc train của model (sai số so với giá thật mới có nghĩa), học trên phần còn lại;
+    # không có file -> 20% ngẫu nhiên (model đầy đủ đã thấy các dòng này)
+    test = heldout_rows(df, HELDOUT_FILE) if os.path.exists(HELDOUT_FILE) else df.sample(frac=0.2, random_state=0)
+    train = df.drop(test.index)
+
+    start = time.perf_counter()
+    arrays = fit_cascade(train, model, args.min_rows)
+    save_arrays(arrays, args.out)
+    cascade = load_cascade(args.out)
+    print(f"Học {len(cascade)} phân khúc trong {time.perf_counter() - start:.1f}s -> {args.out}")
+
+    results = evaluate_cascade(cascade, test, model, args.thresholds)
+    print(f"{len(test):,} tin đăng giữ lại; model đầy đủ: MAPE so với giá thật {results[0]['full_mape_true']:.2%}")
+    print(f"{'ngưỡng':>8} {'chuyển lên':>11} {'MAPE':>8} {'p95':>8} {'MAPE thật':>10}   (MAPE / p95 so với model đầy đủ)")
+    for r in results:
+        print(f"{r['threshold']:>8.2f} {r['escalation_rate']:>11.1%} {r['mape']:>8.2%} {r['p95']:>8.2%} {r['mape_true']:>10.2%}")
+
+    # Độ trễ trung bình 1 request: tầng rẻ trả lời hoặc chuyển lên model
+    records = test[FEATURES].head(300).to_dict('records')
+    start = time.perf_counter()
+    for r in records:
+        predict_price(r, model)
+    full_ms = (time.perf_counter() - start) / len(records) * 1e3
+    start = time.perf_counter()
+    for r in records:
+        predict_price(r, model, lattice=cascade)
+    cascade_ms = (time.perf_counter() - start) / len(records) * 1e3
+    print(f"Độ trễ TB (ngưỡng {cascade.max_uncertainty}): model đầy đủ {full_ms:.2f} ms, cascade {cascade_ms:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
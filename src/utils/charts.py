@@ -129,6 +129,89 @@ def price_range_chart(gia_ban_nhanh, gia_de_xuat, gia_toi_da, gia_min, gia_max):
     
     return fig
 
+def price_sweep_chart(surface, km_now, year_now):
+    # Giá dự đoán theo số km (trục x), mỗi năm đăng ký 1 đường; surface từ predict_price_sweep
+
+    fig = go.Figure()
+
+    for year, row in surface.iterrows():
+        is_now = year == year_now
+        fig.add_trace(go.Scatter(
+            x=list(surface.columns),
+            y=row.values,
+            mode='lines+markers',
+            name=f"{year}" + (" (xe của bạn)" if is_now else ""),
+            line=dict(width=4 if is_now else 2, dash='solid' if is_now else 'dot'),
+            marker=dict(size=8 if is_now else 5),
+            hovertemplate=f'Năm {year}<br>%{{x:,.0f}} km<br>%{{y:,.0f}} VND<extra></extra>'
+        ))
+
+    # Điểm hiện tại của xe
+    if year_now in surface.index and km_now in surface.columns:
+        fig.add_trace(go.Scatter(
+            x=[km_now],
+            y=[surface.loc[year_now, km_now]],
+            mode='markers',
+            marker=dict(size=16, color='#ffc107', symbol='star', line=dict(width=1, color='#333')),
+            showlegend=False,
+            hovertemplate='⭐ Hiện tại<br>%{y:,.0f} VND<extra></extra>'
+        ))
+
+    fig.update_layout(
+        title={
+            'text': '📉 Giá thay đổi theo số km và năm đăng ký',
+            'font': {'size': 22, 'family': 'Arial'}
+        },
+        xaxis_title='Số km đã đi',
+        yaxis_title='Giá dự đoán (VND)',
+        height=380,
+        margin=dict(l=20, r=20, t=50, b=40),
+        legend=dict(title='Năm đăng ký'),
+        xaxis=dict(tickformat=',.0f'),
+        yaxis=dict(tickformat=',.0f'),
+        plot_bgcolor='rgba(240,240,240,0.3)',
+        paper_bgcolor='white'
+    )
+
+    return fig
+
+def explanation_chart(explanation):
+    # Đóng góp (%) của từng đặc trưng vào giá, so với xe trung bình trên thị trường
+    items = explanation['contributions'][::-1]
+    labels = [f"{c['label']}: {c['value']}" for c in items]
+    values = [c['percent'] * 100 for c in items]
+
+    fig = go.Figure(go.Bar(
+        x=values,
+        y=labels,
+        orientation='h',
+        marker=dict(color=['#28a745' if v >= 0 else '#dc3545' for v in values]),
+        text=[f"{v:+.1f}%" for v in values],
+        textposition='outside',
+        hovertemplate='%{y}<br>%{x:+.1f}%<extra></extra>'
+    ))
+
+    fig.update_layout(
+        xaxis_title='% so với xe trung bình',
+        yaxis_title='',
+        height=60 + 36 * len(items),
+        margin=dict(l=20, r=40, t=20, b=40),
+        showlegend=False,
+        xaxis=dict(ticksuffix='%', zeroline=True, zerolinecolor='#999'),
+        plot_bgcolor='white',
+        paper_bgcolor='white'
+    )
+
+    return fig
+
+def show_price_explanation(explanation):
+    """Hiển thị phần "Vì sao có mức giá này?" từ PriceExplanations.explain"""
+    with st.expander("🔎 Vì sao có mức giá này?"):
+        st.caption("Mỗi thanh là mức giá tăng / giảm do đặc trưng đó so với một chiếc xe trung bình trên thị trường "
+                   "(tính sẵn từ mô hình, phần còn lại do các đặc trưng tác động lẫn nhau).")
+        st.plotly_chart(explanation_chart(explanation), use_container_width=True)
+        st.markdown(f"- Tác động kết hợp giữa các đặc trưng: **{explanation['other_percent']:+.1%}**")
+
 def show_price_suggestion(gia_ban_nhanh, gia_de_xuat, gia_toi_da):
     """Hiển thị toàn bộ phần gợi ý giá bán"""
     
@@ -0,0 +1,248 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from sklearn.compose import ColumnTransformer # type: ignore
+from sklearn.impute import SimpleImputer # type: ignore
+from sklearn.pipeline import Pipeline # type: ignore
+from sklearn.preprocessing import FunctionTransformer, OneHotEncoder, OrdinalEncoder, StandardScaler # type: ignore
+
+# ============================================================
+# ENCODER BIÊN DỊCH SẴN TỪ PIPELINE ĐÃ FIT
+# ============================================================
+#
+# Thay cho prepare_input (DataFrame 1 dòng) + ColumnTransformer.transform:
+# đọc thẳng dict xe -> ghi vào ma trận đầu vào của estimator cuối.
+#   - OneHotEncoder : dict category -> cột (offset + vị trí), category lạ -> toàn 0
+#   - OrdinalEncoder: dict category -> mã số
+#   - passthrough / StandardScaler: copy (và chuẩn hóa) giá trị số
+# Pipeline có bước không hỗ trợ -> compile_model trả về None, dùng đường sklearn cũ.
+
+
+class UnsupportedPipeline(Exception):
+    pass
+
+
+def _as_list(columns):
+    if isinstance(columns, (str, int, np.integer)):
+        return [columns]
+    return list(columns)
+
+
+def _column_names(columns, feature_names):
+    # Chuẩn hóa đặc tả cột của ColumnTransformer (tên / chỉ số / mask / slice) -> list tên cột
+    if isinstance(columns, slice):
+        return list(feature_names[columns])
+    columns = _as_list(columns)
+    if not columns:
+        return []
+    if all(isinstance(c, (bool, np.bool_)) for c in columns):
+        return [name for name, keep in zip(feature_names, columns) if keep]
+    if all(isinstance(c, (int, np.integer)) for c in columns):
+        return [feature_names[c] for c in columns]
+    if all(isinstance(c, str) for c in columns):
+        return columns
+    raise UnsupportedPipeline(f"Không hỗ trợ đặc tả cột {columns!r}")
+
+
+def _unwrap(transformer):
+    # Bỏ các bước SimpleImputer đứng trước (sau prepare_input không còn NaN)
+    if isinstance(transformer, Pipeline):
+        steps = [step for _, step in transformer.steps]
+        for step in steps[:-1]:
+            if not isinstance(step, SimpleImputer) or np.isnan(np.asarray(step.statistics_, dtype=float)).any():
+                raise UnsupportedPipeline(f"Không hỗ trợ bước {type(step).__name__}")
+        return _unwrap(steps[-1])
+    return transformer
+
+
+class _Block:
+    """Một transformer trong ColumnTransformer đã biên dịch: ghi các cột [start, start + width)"""
+
+    def __init__(self, kind, columns, start, width, **params):
+        self.kind = kind
+        self.columns = columns
+        self.start = start
+        self.width = width
+        self.__dict__.update(params)
+
+
+def _compile_block(transformer, columns, start):
+    transformer = _unwrap(transformer)
+
+    if isinstance(transformer, OneHotEncoder):
+        if transformer.drop is not None or getattr(transformer, "_infrequent_enabled", False):
+            raise UnsupportedPipeline("OneHotEncoder có drop / infrequent category")
+        if transformer.handle_unknown not in ("ignore", "error"):
+            raise UnsupportedPipeline(f"OneHotEncoder handle_unknown={transformer.handle_unknown!r}")
+        lookups, offset = [], start
+        for cats in transformer.categories_:
+            lookups.append({c: offset + i for i, c in enumerate(cats.tolist())})
+            offset += len(cats)
+        return _Block("onehot", columns, start, offset - start,
+                      lookups=lookups, strict=transformer.handle_unknown == "error")
+
+    if isinstance(transformer, OrdinalEncoder):
+        if transformer.handle_unknown not in ("use_encoded_value", "error"):
+            raise UnsupportedPipeline(f"OrdinalEncoder handle_unknown={transformer.handle_unknown!r}")
+        lookups = [{c: float(i) for i, c in enumerate(cats.tolist())} for cats in transformer.categories_]
+        return _Block("ordinal", columns, start, len(columns),
+                      lookups=lookups, strict=transformer.handle_unknown == "error",
+                      unknown_value=float(transformer.unknown_value) if transformer.unknown_value is not None else np.nan)
+
+    if isinstance(transformer, StandardScaler):
+        n = len(columns)
+        mean = transformer.mean_ if transformer.mean_ is not None else np.zeros(n)
+        scale = transformer.scale_ if transformer.scale_ is not None else np.ones(n)
+        return _Block("numeric", columns, start, n, mean=np.asarray(mean), scale=np.asarray(scale))
+
+    # 'passthrough' sau khi fit trở thành FunctionTransformer không có func
+    if transformer == "passthrough" or (isinstance(transformer, FunctionTransformer) and transformer.func is None):
+        n = len(columns)
+        return _Block("numeric", columns, start, n, mean=np.zeros(n), scale=np.ones(n))
+
+    raise UnsupportedPipeline(f"Không hỗ trợ transformer {type(transformer).__name__}")
+
+
+class CompiledEncoder:
+    """Biến dict xe -> ma trận float64 giống hệt output của ColumnTransformer"""
+
+    def __init__(self, preprocessor, features, cat_cols, numeric_cols):
+        if not isinstance(preprocessor, ColumnTransformer):
+            raise UnsupportedPipeline(f"Không hỗ trợ preprocessor {type(preprocessor).__name__}")
+
+        feature_names = list(getattr(preprocessor, "feature_names_in_", features))
+        self.features = list(features)
+        self.cat_cols = set(cat_cols)
+        self.numeric_cols = set(numeric_cols)
+
+        self.blocks = []
+        width = 0
+        for name, transformer, columns in preprocessor.transformers_:
+            if transformer == "drop":
+                continue
+            columns = _column_names(columns, feature_names)
+            if not columns:
+                continue
+            unknown = [c for c in columns if c not in self.features]
+            if unknown:
+                raise UnsupportedPipeline(f"Cột {unknown} không có trong features")
+            block = _compile_block(transformer, columns, width)
+            self.blocks.append(block)
+            width += block.width
+        self.n_columns = width
+
+    # Cùng quy tắc với prepare_input, nhưng làm trên từng giá trị
+    def _value(self, column, v):
+        if column in self.cat_cols:
+            if v is None or (isinstance(v, float) and v != v):
+                return "unknown"
+            return v if isinstance(v, str) else ("unknown" if pd.isna(v) else str(v))
+        if column in self.numeric_cols:
+            if not isinstance(v, (int, float)) or isinstance(v, bool):
+                v = pd.to_numeric(v, errors="coerce")
+            # 1 dòng: cột số NaN cũng là cột "all-NaN" -> 0
+            return 0.0 if v != v else float(v)
+        return v
+
+    def _fill_row(self, out, info):
+        for block in self.blocks:
+            values = [self._value(c, info.get(c, np.nan)) for c in block.columns]
+            if block.kind == "onehot":
+                for lookup, v in zip(block.lookups, values):
+                    col = lookup.get(v)
+                    if col is not None:
+                        out[col] = 1.0
+                    elif block.strict:
+                        raise ValueError(f"Category lạ {v!r} trong lúc transform")
+            elif block.kind == "ordinal":
+                for i, (lookup, v) in enumerate(zip(block.lookups, values)):
+                    code = lookup.get(v)
+                    if code is None:
+                        if block.strict:
+                            raise ValueError(f"Category lạ {v!r} trong lúc transform")
+                        code = block.unknown_value
+                    out[block.start + i] = code
+            else:
+                for i, v in enumerate(values):
+                    out[block.start + i] = (float(v) - block.mean[i]) / block.scale[i]
+
+    def transform_one(self, info):
+        out = np.zeros((1, self.n_columns), dtype=np.float64)
+        self._fill_row(out[0], info)
+        return out
+
+    def transform_records(self, records):
+        records = list(records)
+        out = np.zeros((len(records), self.n_columns), dtype=np.float64)
+        for row, info in zip(out, records):
+            self._fill_row(row, info)
+        return out
+
+
+class CompiledModel:
+    """Encoder biên dịch + estimator cuối của pipeline"""
+
+    def __init__(self, encoder, predict_matrix):
+        self.encoder = encoder
+        self.predict_matrix = predict_matrix
+
+    def predict_one(self, info):
+        return float(self.predict_matrix(self.encoder.transform_one(info))[0])
+
+    def predict_records(self, records):
+        return np.asarray(self.predict_matrix(self.encoder.transform_records(records)), dtype=np.float64)
+
+
+def _split(model):
+    # (preprocessor, hàm predict trên ma trận đã transform)
+    if isinstance(model, Pipeline):
+        if len(model.steps) != 2:
+            raise UnsupportedPipeline("Pipeline phải gồm đúng preprocessor + estimator")
+        estimator = model.steps[-1][1]
+        if hasattr(estimator, "feature_names_in_"):
+            raise UnsupportedPipeline("Estimator được fit trên DataFrame có tên cột")
+        return model.steps[0][1], estimator.predict
+
+    # ArrayForestModel (model_arrays): preprocessor là Pipeline chỉ gồm ColumnTransformer
+    if hasattr(model, "predict_matrix") and getattr(model, "preprocessor", None) is not None:
+        preprocessor = model.preprocessor
+        if isinstance(preprocessor, Pipeline):
+            if len(preprocessor.steps) != 1:
+                raise UnsupportedPipeline("Preprocessor nhiều bước")
+            preprocessor = preprocessor.steps[0][1]
+        return preprocessor, lambda X: model.predict_matrix(X.astype(np.float32))
+
+    raise UnsupportedPipeline(f"Không hỗ trợ model {type(model).__name__}")
+
+
+def compile_model(model, features, cat_cols, numeric_cols):
+    """CompiledModel cho model, hoặc None nếu pipeline có bước chưa hỗ trợ"""
+    try:
+        preprocessor, predict_matrix = _split(model)
+        return CompiledModel(CompiledEncoder(preprocessor, features, cat_cols, numeric_cols), predict_matrix)
+    except (UnsupportedPipeline, AttributeError):
+        return None
+
+
+# ============================================================
+# CACHE THEO MODEL (biên dịch 1 lần cho mỗi model đã load)
+# ============================================================
+_compiled = {}
+_compiled_lock = threading.Lock()
+
+def compiled_model(model, features, cat_cols, numeric_cols):
+    key = (id(model), tuple(features))
+    with _compiled_lock:
+        entry = _compiled.get(key)
+        # Giữ tham chiếu tới model để id() không bị dùng lại cho model khác
+        if entry is None or entry[0] is not model:
+            entry = (model, compile_model(model, features, cat_cols, numeric_cols))
+            _compiled[key] = entry
+        return entry[1]
+
+def forget_compiled(model):
+    with _compiled_lock:
+        for key in [k for k, (m, _) in _compiled.items() if m is model]:
+            del _compiled[key]
@@ -0,0 +1,225 @@
+import argparse
+import math
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.utils.model_arrays import read_model # type: ignore
+from src.utils.model_artifacts import ModelArtifact, load_arrays, sample_signature, save_arrays # type: ignore
+from src.utils.prediction import FEATURES, NUMERIC_COLS, predict_price_batch # type: ignore
+
+# ============================================================
+# KHOẢNG GIÁ CONFORMAL THEO PHÂN KHÚC
+# ============================================================
+#
+# Residual trên tập calibration gồm các tin đăng model chưa thấy lúc train
+# (mặc định: tập test lúc train, lưu trong result_regression_predictions.csv):
+#   e = log(giá thật) - log(giá dự đoán)
+# Residual trên dữ liệu train nhỏ hơn thực tế -> khoảng quá hẹp, độ phủ
+# split-conformal không còn đúng.
+# Với mỗi phân khúc (thuong_hieu, dong_xe, nhóm tuổi xe) lưu các phân vị
+# split-conformal của e. Khi gợi ý giá: giá * exp(phân vị) -> khoảng giá đã
+# hiệu chỉnh, chỉ cần tra dict. Phân khúc ít dữ liệu lùi dần về
+# (hãng, dòng xe) -> (hãng) -> toàn bộ.
+
+ANY = "*"
+SEGMENT_LEVELS = (
+    ('thuong_hieu', 'dong_xe', 'tuoi_xe'),
+    ('thuong_hieu', 'dong_xe'),
+    ('thuong_hieu',),
+    (),
+)
+
+# Nhóm tuổi xe (năm): 0-2, 3-5, 6-10, 11+
+AGE_BUCKETS = (3, 6, 11)
+
+# Các mức giá gợi ý -> phân vị residual tương ứng
+QUANTILES = {
+    'fair_min': 0.025,
+    'fair_low': 0.10,
+    'fast_sell': 0.30,
+    'max_profit': 0.70,
+    'fair_high': 0.90,
+    'fair_max': 0.975,
+}
+
+DEFAULT_MIN_ROWS = 20
+
+# File dự đoán trên tập test lúc train (không có loai_xe / tinh_trang): khớp lại dòng
+# của dữ liệu đầy đủ theo các cột chung + giá
+HELDOUT_FILE = "./data/results/result_regression_predictions.csv"
+HELDOUT_KEYS = ['thuong_hieu', 'dong_xe', 'nam_dang_ky', 'so_km_da_di', 'dung_tich_xe', 'xuat_xu']
+
+
+def age_bucket(nam_dang_ky, reference_year):
+    age = reference_year - float(nam_dang_ky)
+    for i, upper in enumerate(AGE_BUCKETS):
+        if age < upper:
+            return str(i)
+    return str(len(AGE_BUCKETS))
+
+
+def conformal_quantile(residuals, p):
+    """Phân vị có hiệu chỉnh mẫu hữu hạn của split conformal (bảo thủ về 2 phía)"""
+    n = len(residuals)
+    if p >= 0.5:
+        level = min(1.0, math.ceil((n + 1) * p) / n)
+        return float(np.quantile(residuals, level, method='higher'))
+    level = max(0.0, math.floor((n + 1) * p) / n)
+    return float(np.quantile(residuals, level, method='lower'))
+
+
+def heldout_rows(df, heldout_path):
+    """Các dòng của df có trong file tập test lúc train; dòng trùng khóa (có thể 1 bản nằm trong train) bị bỏ"""
+    held = pd.read_csv(heldout_path)
+    held = held[HELDOUT_KEYS].assign(_gia=held['gia_thuc_te'].round(3)).drop_duplicates()
+    keyed = df.assign(_gia=df['gia'].round(3))
+    unique = ~keyed.duplicated(HELDOUT_KEYS + ['_gia'], keep=False)
+    matched = keyed[unique].reset_index().merge(held, on=HELDOUT_KEYS + ['_gia'])['index']
+    return df.loc[matched]
+
+
+def _segment_frame(df, reference_year):
+    seg = df[['thuong_hieu', 'dong_xe']].astype(str)
+    seg['tuoi_xe'] = [age_bucket(y, reference_year) for y in df['nam_dang_ky']]
+    return seg
+
+
+def calibrate(df, model, min_rows=DEFAULT_MIN_ROWS):
+    """Tính bảng phân vị residual theo phân khúc từ tập calibration -> dict mảng"""
+    df = df.dropna(subset=NUMERIC_COLS + ['gia'])
+    df = df[df['gia'] > 0].reset_index(drop=True)
+    reference_year = float(df['nam_dang_ky'].max())
+
+    pred = predict_price_batch(df[FEATURES], model)
+    # gia trong dữ liệu tính theo triệu VND, predict_price_batch trả về VND
+    residuals = np.log(df['gia'].to_numpy(dtype=np.float64) * 1e6) - np.log(pred)
+    seg = _segment_frame(df, reference_year).assign(_e=residuals)
+
+    keys, offsets, counts = [], [], []
+    for level in SEGMENT_LEVELS:
+        groups = seg.groupby(list(level), sort=True)['_e'] if level else [((), seg['_e'])]
+        for key, e in groups:
+            if len(e) < min_rows:
+                continue
+            key = key if isinstance(key, tuple) else (key,)
+            keys.append(list(key) + [ANY] * (len(SEGMENT_LEVELS[0]) - len(key)))
+            offsets.append([conformal_quantile(e.to_numpy(), p) for p in QUANTILES.values()])
+            counts.append(len(e))
+
+    return {
+        'keys': np.array(keys, dtype=str).reshape(-1, len(SEGMENT_LEVELS[0])),
+        'offsets': np.array(offsets, dtype=np.float64).reshape(-1, len(QUANTILES)),
+        'counts': np.array(counts, dtype=np.int64),
+        'names': np.array(list(QUANTILES), dtype=str),
+        'reference_year': np.array(reference_year),
+        **sample_signature(df, model),
+    }
+
+
+def load_intervals(path):
+    """Load bảng khoảng giá; không có file -> None"""
+    arrays = load_arrays(path)
+    return None if arrays is None else ConformalIntervals(arrays)
+
+
+class ConformalIntervals(ModelArtifact):
+    """Tra hệ số khoảng giá (giá * hệ số) theo phân khúc của xe"""
+
+    def __init__(self, arrays):
+        self.arrays = arrays
+        self.names = arrays['names'].tolist()
+        self.reference_year = float(arrays['reference_year'])
+        # Lưu sẵn exp(phân vị): lúc gợi ý giá chỉ còn phép nhân
+        factors = np.exp(arrays['offsets'])
+        self.table = {tuple(k): dict(zip(self.names, f)) for k, f in zip(arrays['keys'].tolist(), factors.tolist())}
+
+    def __len__(self):
+        return len(self.table)
+
+    def factors(self, info):
+        """{tên mức giá: hệ số}, phân khúc chi tiết nhất có đủ dữ liệu"""
+        brand, line = str(info.get('thuong_hieu')), str(info.get('dong_xe'))
+        try:
+            age = age_bucket(info['nam_dang_ky'], self.reference_year)
+        except (KeyError, TypeError, ValueError):
+            age = ANY
+        for key in ((brand, line, age), (brand, line, ANY), (brand, ANY, ANY), (ANY, ANY, ANY)):
+            found = self.table.get(key)
+            if found is not None:
+                return found
+        return None
+
+
+# ============================================================
+# CLI: python -m src.utils.conformal
+# ============================================================
+def _coverage(df, model, intervals):
+    pred = predict_price_batch(df[FEATURES], model)
+    actual = df['gia'].to_numpy(dtype=np.float64) * 1e6
+    f = [intervals.factors(r) for r in df[FEATURES].to_dict('records')]
+    result = {}
+    for name, lo, hi, fixed in (('80%', 'fair_low', 'fair_high', (0.9, 1.1)), ('95%', 'fair_min', 'fair_max', (0.4, 1.6))):
+        low = pred * np.array([x[lo] for x in f])
+        high = pred * np.array([x[hi] for x in f])
+        result[name] = {
+            'coverage': float(np.mean((actual >= low) & (actual <= high))),
+            'width': float(np.median((high - low) / pred)),
+            'fixed_coverage': float(np.mean((actual >= pred * fixed[0]) & (actual <= pred * fixed[1]))),
+            'fixed_width': fixed[1] - fixed[0],
+        }
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hiệu chỉnh khoảng giá gợi ý (split conformal theo phân khúc)")
+    parser.add_argument("--model", default="./models/model_regression_best.pkl")
+    parser.add_argument("--data", default="./data/processed/data_motobikes_cleaned.csv")
+    parser.add_argument("--heldout", default=HELDOUT_FILE,
+                        help="File dự đoán trên tập test lúc train: chỉ dùng các dòng của --data có trong file này. "
+                             "Chuỗi rỗng -> --data đã là dữ liệu model chưa thấy, dùng cả file")
+    parser.add_argument("--out", default="./models/price_intervals.npz")
+    parser.add_argument("--holdout", type=float, default=0.4,
+                        help="Chỉ khi không có --heldout: tỉ lệ --data dùng để hiệu chỉnh + kiểm tra (trong mẫu)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--min-rows", type=int, default=DEFAULT_MIN_ROWS)
+    args = parser.parse_args()
+
+    model = read_model(args.model)
+    df = pd.read_csv(args.data).dropna(subset=NUMERIC_COLS + ['gia'])
+    df = df[df['gia'] > 0]
+
+    in_sample = False
+    if not args.heldout:
+        holdout = df
+        print(f"Dùng cả {args.data}: {len(df):,} tin đăng (coi là model chưa thấy)")
+    elif os.path.exists(args.heldout):
+        holdout = heldout_rows(df, args.heldout)
+        print(f"Tập test lúc train ({args.heldout}): {len(holdout):,} tin đăng")
+    else:
+        # Không biết dòng nào model chưa thấy -> chỉ chạy được trên dữ liệu train
+        in_sample = True
+        holdout = df.sample(frac=args.holdout, random_state=args.seed)
+        print(f"⚠️ Không có {args.heldout}: hiệu chỉnh trên mẫu ngẫu nhiên của {args.data} (dữ liệu train). "
+              "Residual trong mẫu -> khoảng quá hẹp, độ phủ bên dưới không đáng tin")
+
+    # Chia đôi: 1 nửa hiệu chỉnh, 1 nửa đo độ phủ thực tế
+    calibration = holdout.sample(frac=0.5, random_state=args.seed)
+    test = holdout.drop(calibration.index)
+
+    start = time.perf_counter()
+    save_arrays(calibrate(calibration, model, args.min_rows), args.out)
+    intervals = load_intervals(args.out)
+    print(f"Hiệu chỉnh trên {len(calibration):,} tin đăng trong {time.perf_counter() - start:.1f}s: "
+          f"{len(intervals)} phân khúc -> {args.out}")
+
+    print(f"Kiểm tra trên {len(test):,} tin đăng" + (" (dữ liệu train, trong mẫu):" if in_sample else ":"))
+    for name, r in _coverage(test, model, intervals).items():
+        print(f"  khoảng {name}: phủ {r['coverage']:.1%} (rộng TB {r['width']:.0%} giá)"
+              f" | cố định: phủ {r['fixed_coverage']:.1%} (rộng {r['fixed_width']:.0%})")
+
+
+if __name__ == "__main__":
+    main()
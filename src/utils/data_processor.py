@@ -4,6 +4,28 @@ import numpy as np
 import pickle
 import os
 
+from src.config import PREFER_COMPACT_MODEL, MODEL_MMAP, PRICE_LATTICE_MAX_GAP # type: ignore
+from src.config import USE_BRAND_SHARDS, SHARD_CACHE_MAX_MB, USE_PRICE_LATTICE, PRICE_LATTICE # type: ignore
+from src.config import REGRESSION_MODEL, MODEL_REGISTRY # type: ignore
+from src.config import USE_CASCADE, CASCADE_TABLE, CASCADE_MAX_UNCERTAINTY # type: ignore
+from src.config import USE_DATASET_CACHE, DATASET_CACHE_DIR, DATASETS # type: ignore
+from src.config import USE_LISTING_STORE, LISTING_DB, LISTING_TABLES # type: ignore
+from src.config import USE_MODERATION_LOG, MODERATION_LOG_DIR, MODERATION_COMPACT_RECORDS # type: ignore
+from src.utils.cascade import chain_fast_paths, load_cascade # type: ignore
+from src.utils.dataset_cache import read_dataset_cache # type: ignore
+from src.utils.dataset_catalog import DatasetCatalog # type: ignore
+from src.utils.explanations import load_explanations # type: ignore
+from src.utils.listing_store import ListingStore, StoreTable # type: ignore
+from src.utils.moderation_log import STATUS_VALUES, ACTIONS, ModerationLog, ModeratedTable, store_fold # type: ignore
+from src.utils.conformal import load_intervals # type: ignore
+from src.utils.quantile_forest import load_quantile_index # type: ignore
+from src.utils.model_arrays import read_model # type: ignore
+from src.utils.model_artifacts import load_checked # type: ignore
+from src.utils.model_registry import ModelHandle # type: ignore
+from src.utils.model_warmup import ModelWarmup # type: ignore
+from src.utils.prediction_cache import release_model # type: ignore
+from src.utils.price_lattice import load_price_lattice # type: ignore
+
 # ============================================================
 # HÀM LOAD DATA VÀ MODELS
 # ============================================================
@@ -11,30 +33,182 @@ import os
 def load_data(file_path):
     if not os.path.exists(file_path):
         raise FileNotFoundError(file_path)
-        
+
+    # Cache dạng cột (đã build và mới hơn CSV) load nhanh và tốn ít RAM hơn
+    if USE_DATASET_CACHE:
+        df = read_dataset_cache(file_path, DATASET_CACHE_DIR)
+        if df is not None:
+            return df
+
     df = pd.read_csv(file_path)
     return df
 
 def save_data(df, file_path):
    
     df.to_csv(file_path, index=False)
+    # Ghi đè cả file: catalog load lại (append_to_csv không cần, catalog tự đọc phần ghi thêm)
+    dataset_catalog().invalidate_path(file_path)
+
+@st.cache_resource
+def listing_store():
+    # SQLite tin đăng dùng chung mọi session (None nếu tắt); bảng chưa có -> nạp từ CSV lần đầu
+    if not USE_LISTING_STORE:
+        return None
+    store = ListingStore(LISTING_DB)
+    for table, csv_path in LISTING_TABLES.items():
+        if os.path.exists(csv_path):
+            store.import_csv(table, csv_path)
+    return store
+
+def listing_table(file_path):
+    # Bảng SQLite đang thay cho file CSV này, None nếu file không nằm trong store
+    if listing_store() is None:
+        return None
+    path = os.path.abspath(file_path)
+    for table, csv_path in LISTING_TABLES.items():
+        if os.path.abspath(csv_path) == path:
+            return table
+    return None
+
+@st.cache_resource
+def moderation_logs():
+    # {bảng: ModerationLog}; rỗng nếu tắt / không dùng listing store (log cần id ổn định của SQLite)
+    store = listing_store()
+    if not USE_MODERATION_LOG or store is None:
+        return {}
+    logs = {table: ModerationLog(MODERATION_LOG_DIR / f"{table}.log") for table in LISTING_TABLES}
+    for table, log in logs.items():
+        # Gộp nốt log còn sót / đã quá ngưỡng từ lần chạy trước
+        log.maybe_compact(store_fold(store, table), MODERATION_COMPACT_RECORDS)
+    return logs
+
+# Đã tạo catalog trong process chưa (khung hiệu năng chỉ đọc thống kê, không tạo catalog)
+_catalog_created = False
+
+@st.cache_resource
+def dataset_catalog():
+    # Dùng chung mọi session: mỗi file trong DATASETS load 1 lần / process,
+    # các bảng tin đăng đọc từ SQLite (+ replay log kiểm duyệt) khi dùng listing store
+    store = listing_store()
+    logs = moderation_logs()
+    sources = {}
+    for name, path in DATASETS.items():
+        if store is not None and name in LISTING_TABLES:
+            source = StoreTable(store, name)
+            sources[name] = ModeratedTable(source, logs[name]) if name in logs else source
+        else:
+            sources[name] = path
+    global _catalog_created
+    _catalog_created = True
+    return DatasetCatalog(sources, load_data)
+
+def loaded_dataset_catalog():
+    # Catalog nếu đã có trang dùng tới; chưa có -> None (không tạo SQLite / import CSV / gộp log chỉ để xem thống kê)
+    return dataset_catalog() if _catalog_created else None
+
+def load_dataset(name):
+    # View chỉ đọc của dataset (copy-on-write): trang sửa / thêm cột không ảnh hưởng trang khác
+    return dataset_catalog().get(name)
+
+def update_listing(name, row_id, **values):
+    # Listing store: UPDATE đúng 1 tin đăng theo id;
+    # không dùng store -> sửa dòng row_id của file DATASETS[name] rồi ghi lại cả file
+    store = listing_store()
+    if store is not None and name in LISTING_TABLES:
+        store.update(name, row_id, **values)
+    else:
+        df = load_data(DATASETS[name])
+        df.loc[row_id, list(values)] = list(values.values())
+        save_data(df, DATASETS[name])
+
+def delete_listing(name, row_id):
+    # Listing store: DELETE 1 tin đăng; không dùng store -> bỏ dòng row_id của file DATASETS[name], ghi lại cả file
+    store = listing_store()
+    if store is not None and name in LISTING_TABLES:
+        store.delete(name, row_id)
+    else:
+        save_data(load_data(DATASETS[name]).drop(row_id), DATASETS[name])
+
+def moderate_listing(name, action, row_id):
+    # Duyệt / yêu cầu sửa / từ chối (action trong ACTIONS): ghi thêm 1 sự kiện vào log, gộp vào SQLite trong nền;
+    # không dùng log -> UPDATE / DELETE trực tiếp (hoặc ghi lại file của dataset)
+    log = moderation_logs().get(name)
+    if log is not None:
+        log.append(row_id, action)
+        log.maybe_compact(store_fold(listing_store(), name), MODERATION_COMPACT_RECORDS)
+    elif ACTIONS[action] in STATUS_VALUES:
+        update_listing(name, row_id, **STATUS_VALUES[ACTIONS[action]])
+    else:
+        delete_listing(name, row_id)
+
+def read_app_model(model_path):
+    # Ưu tiên bản export dạng mảng numpy (nhỏ, load nhanh) nếu đã chạy bước export
+    # MODEL_MMAP: memory-map các file .npy -> các worker dùng chung page cache
+    # USE_BRAND_SHARDS: dùng bản chia theo hãng nếu có, shard load khi cần (LRU SHARD_CACHE_MAX_MB)
+    return read_model(model_path, prefer_compact=PREFER_COMPACT_MODEL, mmap=MODEL_MMAP,
+                      prefer_shards=USE_BRAND_SHARDS, shard_max_mb=SHARD_CACHE_MAX_MB)
+
+# Các bảng tính sẵn từ model (src.utils.model_artifacts) mà trang đọc qua load_model_table
+MODEL_TABLES = {
+    'explanations': load_explanations,
+    'intervals': load_intervals,
+    'quantiles': load_quantile_index,
+}
+
+def read_app_fast_path(lattice_path, cascade_path, model=None):
+    # Các bước tra nhanh trước model: bảng giá, rồi tầng rẻ của cascade (None nếu không có gì);
+    # bảng build từ model khác bị bỏ qua, dùng model trực tiếp
+    lattice = load_checked(load_price_lattice, lattice_path, model, PRICE_LATTICE_MAX_GAP) if USE_PRICE_LATTICE else None
+    cascade = load_checked(load_cascade, cascade_path, model, CASCADE_MAX_UNCERTAINTY) if USE_CASCADE else None
+    return chain_fast_paths(lattice, cascade)
+
+def make_app_warmup(model_path, lattice_path=None, cascade_path=None):
+    # ModelWarmup (chưa start) cho 1 file model; path None -> bảng giá / cascade mặc định
+    lattice_path = lattice_path or PRICE_LATTICE
+    cascade_path = cascade_path or CASCADE_TABLE
+    return ModelWarmup(lambda: read_app_model(model_path),
+                       lambda model: read_app_fast_path(lattice_path, cascade_path, model))
+
+@st.cache_resource
+def model_warmup(model_path):
+    # Dùng chung mọi session: bắt đầu load model + bảng giá trên thread nền và trả về ngay
+    return make_app_warmup(model_path).start()
+
+@st.cache_resource
+def model_handle():
+    # Model đang được promote trong registry, tự đổi khi có version mới (không cần restart);
+    # registry chưa có version nào -> REGRESSION_MODEL
+    return ModelHandle(make_app_warmup, REGRESSION_MODEL, MODEL_REGISTRY, on_release=release_model).start()
 
 @st.cache_resource
 def load_model(model_path):
-    if not os.path.exists(model_path):
-        raise FileNotFoundError(model_path)
+    # Chặn đến khi model nền load xong (không load lần 2)
+    return model_warmup(model_path).wait()
+
+@st.cache_resource
+def read_model_table(kind, table_path, mtime, version=None, _model=None):
+    # mtime / version chỉ làm key cache: build lại bảng hoặc đổi version model -> load + kiểm tra lại
+    return load_checked(MODEL_TABLES[kind], table_path, _model)
 
-    with open(model_path, 'rb') as file:
-        model = pickle.load(file)
-    return model
+def load_model_table(kind, table_path, version=None, model=None):
+    # Bảng kind trong MODEL_TABLES (None nếu chưa build / build từ model khác);
+    # chưa có file -> None nhưng không cache: bảng build sau khi app chạy vẫn được load
+    if not os.path.exists(table_path):
+        return None
+    return read_model_table(kind, table_path, os.path.getmtime(table_path), version, model)
 
 def append_to_csv(new_data_df, output_path):    
     # Kiểm tra sự tồn tại của file
     file_exists = os.path.exists(output_path)
+    # File tin đăng đã chuyển sang SQLite -> 1 INSERT thay cho ghi thêm vào CSV
+    table = listing_table(output_path)
 
     # Xử lý ghi file
     try:
-        if file_exists:
+        if table is not None:
+            listing_store().insert(table, new_data_df)
+            st.success(f"✅ Tin đăng thành công!")
+        elif file_exists:
             # Nếu file TỒN TẠI:
             # - mode='a' (append): Thêm vào cuối.
             # - header=False: KHÔNG ghi lại tên cột.
@@ -58,7 +232,7 @@ def append_to_csv(new_data_df, output_path):
                 encoding="utf-8-sig"
             )
             st.success(f"⭐ File **{output_path}** chưa tồn tại. Đã **tạo mới** và lưu **{len(new_data_df)}** dòng dữ liệu.")
-            
+
         return True # Trả về True nếu thành công
 
     except Exception as e:
@@ -68,10 +242,15 @@ def append_to_csv(new_data_df, output_path):
 def append_to_csv_with_str(new_data_df, output_path, str):    
     # Kiểm tra sự tồn tại của file
     file_exists = os.path.exists(output_path)
+    # File tin đăng đã chuyển sang SQLite -> 1 INSERT thay cho ghi thêm vào CSV
+    table = listing_table(output_path)
 
     # Xử lý ghi file
     try:
-        if file_exists:
+        if table is not None:
+            listing_store().insert(table, new_data_df)
+            st.success(f"✅ {str}")
+        elif file_exists:
             # Nếu file TỒN TẠI:
             # - mode='a' (append): Thêm vào cuối.
             # - header=False: KHÔNG ghi lại tên cột.
@@ -95,7 +274,7 @@ def append_to_csv_with_str(new_data_df, output_path, str):
                 encoding="utf-8-sig"
             )
             st.success(f"⭐ File **{output_path}** chưa tồn tại. Đã **tạo mới** và lưu **{len(new_data_df)}** dòng dữ liệu.")
-            
+
         return True # Trả về True nếu thành công
 
     except Exception as e:
@@ -104,4 +283,5 @@ def append_to_csv_with_str(new_data_df, output_path, str):
 
 # Hàm save df to csv
 def save_df_to_csv(df, file_path):
-    df.to_csv(file_path, index=False)
\ No newline at end of file
+    df.to_csv(file_path, index=False)
+    dataset_catalog().invalidate_path(file_path)
\ No newline at end of file
@@ -0,0 +1,217 @@
+import argparse
+import glob
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:  # không có pyarrow: cột chữ được giải mã từng dòng
+    pa = None
+
+# ============================================================
+# CACHE DẠNG CỘT CHO CÁC FILE CSV TIN ĐĂNG
+# ============================================================
+#
+# Mỗi file CSV -> 1 file .npz (mỗi cột 1 mảng, không nén) + 1 manifest .json
+# trong data/cache:
+#   - cột phân loại (CATEGORY_COLS): mã int8/int16 + danh sách giá trị
+#   - cột số: int thu nhỏ kiểu nhất có thể; float -> float32 nếu không mất giá trị
+#   - cột chữ còn lại (mo_ta_chi_tiet, tieu_de...): 1 khối UTF-8 + offset + mask NaN
+# Manifest ghi lại kích thước / mtime của CSV lúc build. CSV bị sửa sau đó
+# (append tin mới, duyệt tin...) -> cache cũ, load_data quay về đọc CSV.
+
+CATEGORY_COLS = ['thuong_hieu', 'dong_xe', 'loai_xe', 'tinh_trang', 'dung_tich_xe', 'xuat_xu']
+
+# Các file được build mặc định (python -m src.utils.dataset_cache)
+DEFAULT_SOURCES = ['./data/processed/*.csv', './data/results/*.csv']
+
+# File CSV nhỏ hơn mức này đọc thẳng còn nhanh hơn mở .npz -> CLI không build
+MIN_SOURCE_BYTES = 64 * 1024
+
+CACHE_VERSION = 1
+
+
+def cache_paths(csv_path, cache_dir):
+    """(file .npz, manifest .json) của 1 file CSV; thêm tên thư mục cha để tránh trùng tên"""
+    csv_path = os.path.abspath(csv_path)
+    parent = os.path.basename(os.path.dirname(csv_path))
+    stem = os.path.splitext(os.path.basename(csv_path))[0]
+    base = os.path.join(cache_dir, f"{parent}__{stem}")
+    return base + ".npz", base + ".json"
+
+
+def _downcast_float(values):
+    # float32 chỉ khi đổi qua lại không làm thay đổi giá trị (giá 12.3 vẫn giữ float64)
+    small = values.astype(np.float32)
+    return small if np.array_equal(small.astype(np.float64), values, equal_nan=True) else values
+
+
+def _encode_text(series):
+    # Khối byte UTF-8 + offset (giống bố cục cột chuỗi của Arrow) + mask NaN
+    mask = series.isna().to_numpy()
+    encoded = [b'' if m else str(v).encode('utf-8') for v, m in zip(series.tolist(), mask)]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    offsets = offsets.astype(np.int32) if offsets[-1] < 2 ** 31 else offsets
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets, mask
+
+
+def _decode_text(blob, offsets, mask):
+    # Kiểu chuỗi mặc định của pandas (như read_csv): str chạy trên pyarrow (pandas 3) hoặc object
+    dtype = pd.Series([''], dtype=None).dtype
+    if pa is not None and getattr(dtype, 'storage', None) == 'pyarrow' and offsets.dtype == np.int32:
+        # Dựng thẳng mảng Arrow từ các buffer, không tạo string Python cho từng dòng
+        validity = pa.py_buffer(np.packbits(~mask, bitorder='little'))
+        array = pa.StringArray.from_buffers(len(mask), pa.py_buffer(offsets), pa.py_buffer(blob), validity)
+        return pd.Series(array, dtype=dtype)
+    data = blob.tobytes()
+    values = np.array([None if m else data[offsets[i]:offsets[i + 1]].decode('utf-8')
+                       for i, m in enumerate(mask)], dtype=object)
+    return pd.Series(values)
+
+
+def _store_text(arrays, key, series):
+    arrays[f"{key}__values"], arrays[f"{key}__offsets"], arrays[f"{key}__nulls"] = _encode_text(series)
+
+
+def _load_text(npz, key):
+    return _decode_text(npz[f"{key}__values"], npz[f"{key}__offsets"], npz[f"{key}__nulls"])
+
+
+def _encode_column(i, series, arrays):
+    # Trả về mô tả cột cho manifest, các mảng được thêm vào arrays
+    key = f"c{i}"
+    if series.name in CATEGORY_COLS and series.dtype.kind not in 'biuf':
+        cat = pd.Categorical(series.astype(object))
+        codes = cat.codes
+        arrays[f"{key}__codes"] = codes.astype(np.int8 if len(cat.categories) < 127 else np.int16)
+        _store_text(arrays, key, pd.Series(cat.categories, dtype=object))
+        return {'name': series.name, 'kind': 'category'}
+    if series.dtype.kind == 'b':
+        arrays[key] = series.to_numpy(dtype=bool)
+        return {'name': series.name, 'kind': 'numeric'}
+    if series.dtype.kind in 'iu':
+        arrays[key] = pd.to_numeric(series, downcast='integer').to_numpy()
+        return {'name': series.name, 'kind': 'numeric'}
+    if series.dtype.kind == 'f':
+        arrays[key] = _downcast_float(series.to_numpy(dtype=np.float64))
+        return {'name': series.name, 'kind': 'numeric'}
+    _store_text(arrays, key, series)
+    return {'name': series.name, 'kind': 'text'}
+
+
+def _decode_column(i, column, npz):
+    key = f"c{i}"
+    if column['kind'] == 'category':
+        categories = _load_text(npz, key)
+        return pd.Categorical.from_codes(npz[f"{key}__codes"].astype(np.int16), categories=pd.Index(categories))
+    if column['kind'] == 'text':
+        return _load_text(npz, key)
+    return npz[key]
+
+
+def _source_stat(csv_path):
+    stat = os.stat(csv_path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def build_dataset_cache(csv_path, cache_dir, df=None):
+    """Đọc CSV (hoặc df đã đọc từ chính file đó) -> ghi .npz + manifest; trả về đường dẫn .npz"""
+    # Lấy stat trước khi đọc: CSV bị ghi thêm trong lúc build -> cache bị coi là cũ
+    source = _source_stat(csv_path)
+    if df is None:
+        df = pd.read_csv(csv_path)
+
+    arrays = {}
+    columns = [_encode_column(i, df[c], arrays) for i, c in enumerate(df.columns)]
+    npz_path, manifest_path = cache_paths(csv_path, cache_dir)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    # Ghi file tạm rồi đổi tên: process khác không bao giờ đọc phải file ghi dở
+    tmp = npz_path + ".tmp.npz"
+    np.savez(tmp, **arrays)
+    os.replace(tmp, npz_path)
+    manifest = {
+        'version': CACHE_VERSION,
+        'source': os.path.abspath(csv_path),
+        **source,
+        'rows': len(df),
+        'columns': columns,
+        'built_at': time.time(),
+    }
+    with open(manifest_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(manifest_path + ".tmp", manifest_path)
+    return npz_path
+
+
+def read_manifest(csv_path, cache_dir):
+    """Manifest nếu cache còn khớp với CSV (cùng file, cùng kích thước, cache mới hơn), ngược lại None"""
+    npz_path, manifest_path = cache_paths(csv_path, cache_dir)
+    try:
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        source = _source_stat(csv_path)
+        cache_mtime = os.stat(npz_path).st_mtime_ns
+    except (OSError, ValueError):
+        return None
+
+    if manifest.get('version') != CACHE_VERSION or manifest.get('source') != os.path.abspath(csv_path):
+        return None
+    if manifest['size'] != source['size'] or manifest['mtime_ns'] != source['mtime_ns'] \
+            or cache_mtime < source['mtime_ns']:
+        return None
+    return manifest
+
+
+def read_dataset_cache(csv_path, cache_dir):
+    """DataFrame từ cache; chưa build / CSV đã đổi / file hỏng -> None (dùng CSV)"""
+    manifest = read_manifest(csv_path, cache_dir)
+    if manifest is None:
+        return None
+    npz_path, _ = cache_paths(csv_path, cache_dir)
+    try:
+        with np.load(npz_path) as npz:
+            data = {c['name']: _decode_column(i, c, npz) for i, c in enumerate(manifest['columns'])}
+    except (OSError, KeyError, ValueError):
+        return None
+    return pd.DataFrame(data, columns=[c['name'] for c in manifest['columns']])
+
+
+# ============================================================
+# CLI: python -m src.utils.dataset_cache
+# ============================================================
+def _measure(load):
+    start = time.perf_counter()
+    df = load()
+    return df, (time.perf_counter() - start) * 1e3, df.memory_usage(deep=True).sum() / 1e6
+
+
+def main():
+    from src.config import DATASET_CACHE_DIR # type: ignore
+
+    parser = argparse.ArgumentParser(description="Build cache dạng cột (.npz + manifest) cho các file CSV tin đăng")
+    parser.add_argument("csv", nargs="*", help="File CSV (mặc định: data/processed/*.csv, data/results/*.csv)")
+    parser.add_argument("--cache-dir", default=str(DATASET_CACHE_DIR))
+    parser.add_argument("--min-bytes", type=int, default=MIN_SOURCE_BYTES,
+                        help="Bỏ qua file CSV nhỏ hơn (đọc CSV đã đủ nhanh)")
+    args = parser.parse_args()
+
+    files = args.csv or sorted(p for pattern in DEFAULT_SOURCES for p in glob.glob(pattern))
+    for csv_path in files:
+        if os.path.getsize(csv_path) < args.min_bytes:
+            print(f"{csv_path}: bỏ qua ({os.path.getsize(csv_path) / 1e3:.1f} KB < --min-bytes)")
+            continue
+        df, csv_ms, csv_mb = _measure(lambda: pd.read_csv(csv_path))
+        npz_path = build_dataset_cache(csv_path, args.cache_dir, df)
+        cached, cache_ms, cache_mb = _measure(lambda: read_dataset_cache(csv_path, args.cache_dir))
+        print(f"{csv_path}: {len(cached):,} dòng -> {npz_path} ({os.path.getsize(npz_path) / 1e6:.2f} MB)")
+        print(f"  load: CSV {csv_ms:.0f} ms / {csv_mb:.1f} MB RAM -> cache {cache_ms:.0f} ms / {cache_mb:.1f} MB RAM")
+
+
+if __name__ == "__main__":
+    main()
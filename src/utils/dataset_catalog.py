@@ -0,0 +1,209 @@
+import hashlib
+import io
+import os
+import threading
+import time
+
+import pandas as pd
+
+# ============================================================
+# CATALOG DỮ LIỆU DÙNG CHUNG TRONG PROCESS
+# ============================================================
+#
+# Mỗi file dữ liệu (tên -> đường dẫn, xem DATASETS trong config) được load
+# 1 lần / process bằng loader (load_data: cache dạng cột hoặc CSV). Các trang
+# nhận bản sao nông (shallow copy): pandas copy-on-write nên trang thêm cột /
+# sửa ô chỉ đổi bản của trang, bản gốc trong catalog không bị ảnh hưởng.
+#
+# Mỗi lần get: os.stat file nguồn (rẻ). mtime / size không đổi -> dùng bản
+# đang giữ. File dài ra và phần đã đọc không đổi (hash đoạn đầu + đoạn cuối
+# phần đã đọc vẫn khớp) -> chỉ đọc các dòng mới ở cuối file (append_to_csv).
+# Các thay đổi khác (ghi đè, xóa dòng...) -> load lại cả file.
+#
+# Nguồn không phải file (vd StoreTable của listing_store) có version() + load():
+# version đổi -> load lại.
+
+# pandas >= 3 luôn bật copy-on-write; bản cũ hơn chỉ khi bật option
+COPY_ON_WRITE = int(pd.__version__.split('.')[0]) >= 3 or pd.get_option('mode.copy_on_write') is True
+
+# Số byte ở đầu file và trước vị trí đã đọc tới dùng để nhận biết file chỉ được ghi thêm
+SIGNATURE_BYTES = 4096
+
+COUNTERS = ('loads', 'tail_reads', 'tail_rows', 'hits')
+
+
+def _signature(path, end, window=SIGNATURE_BYTES):
+    # Hash header + đoạn cuối của end byte đầu tiên: đổi -> phần đã đọc đã bị sửa
+    with open(path, 'rb') as f:
+        head = f.read(min(window, end))
+        f.seek(max(0, end - window))
+        last = f.read(min(window, end))
+    return hashlib.blake2b(head + last, digest_size=16).hexdigest()
+
+
+def read_csv_tail(path, start, columns):
+    """Các dòng CSV hoàn chỉnh từ byte start -> (DataFrame, vị trí sau dòng cuối đã đọc)"""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read()
+    # Dòng cuối chưa ghi xong (không có '\n') để lần sau đọc
+    end = data.rfind(b'\n') + 1
+    if not data[:end].strip():
+        return pd.DataFrame(columns=columns), start + end
+    tail = pd.read_csv(io.BytesIO(data[:end]), header=None, encoding='utf-8')
+    if tail.shape[1] != len(columns):
+        raise ValueError(f"Số cột của dòng mới ({tail.shape[1]}) khác file ({len(columns)})")
+    tail.columns = columns
+    return tail, start + end
+
+
+def append_rows(df, tail):
+    """df + các dòng mới, giữ kiểu category (giá trị mới thêm vào cuối danh sách, mã cũ giữ nguyên)"""
+    tail = tail.copy()
+    grown = {}
+    for c in df.columns:
+        if isinstance(df[c].dtype, pd.CategoricalDtype):
+            categories = df[c].cat.categories
+            new = pd.Index(tail[c].dropna().astype(str).unique()).difference(categories)
+            if len(new):
+                grown[c] = df[c].cat.add_categories(new)
+            tail[c] = pd.Categorical(tail[c].astype(object), dtype=grown[c].dtype if c in grown else df[c].dtype)
+    # Cùng kiểu category ở 2 phía -> concat chỉ nối mã, không mã hóa lại cả cột
+    return pd.concat([df.assign(**grown) if grown else df, tail], ignore_index=True)
+
+
+class DatasetCatalog:
+    """Load mỗi dataset 1 lần, trả về view chỉ đọc, thống kê RAM / thời gian load"""
+
+    def __init__(self, sources, loader):
+        self.sources = {name: source if hasattr(source, 'load') else str(source) for name, source in sources.items()}
+        self.loader = loader
+        self._frames = {}
+        self._files = {}  # tên -> size, mtime_ns, end (byte đã đọc tới), signature | version
+        self._info = {}
+        self._lock = threading.Lock()
+        # Mỗi dataset 1 lock: 2 session mở cùng lúc chỉ load 1 lần, dataset khác không phải chờ
+        self._load_locks = {name: threading.Lock() for name in self.sources}
+
+    def names(self):
+        return list(self.sources)
+
+    @staticmethod
+    def _view(df):
+        return df.copy(deep=False) if COPY_ON_WRITE else df.copy()
+
+    def _record(self, name, df, load_ms=None, **counters):
+        # Kích thước hiện tại của dataset + cộng dồn các bộ đếm (loads, tail_reads, tail_rows, hits)
+        with self._lock:
+            info = self._info.setdefault(name, dict.fromkeys(COUNTERS, 0))
+            if df is not None:
+                info['rows'] = len(df)
+                info['memory_mb'] = float(df.memory_usage(deep=True).sum()) / 1e6
+            if load_ms is not None:
+                info['load_ms'] = load_ms
+            for key, value in counters.items():
+                info[key] += value
+
+    def _store(self, name, df, stat, end):
+        # File đổi trong lúc đọc -> không biết đã đọc tới đâu, lần get sau load lại cả file
+        file = None
+        if end is not None:
+            file = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'end': end,
+                    'signature': _signature(self.sources[name], end)}
+        with self._lock:
+            self._frames[name] = df
+            self._files[name] = file
+
+    def _load_versioned(self, name):
+        source = self.sources[name]
+        before = source.version()
+        start = time.perf_counter()
+        df = source.load()
+        load_ms = (time.perf_counter() - start) * 1e3
+        # Có ghi trong lúc đọc -> không lưu version, lần get sau load lại
+        after = source.version()
+        with self._lock:
+            self._frames[name] = df
+            self._files[name] = {'version': after} if before == after else None
+        self._record(name, df, load_ms, loads=1)
+        return df
+
+    def _load(self, name):
+        path = self.sources[name]
+        if not isinstance(path, str):
+            return self._load_versioned(name)
+        before = os.stat(path)
+        start = time.perf_counter()
+        df = self.loader(path)
+        load_ms = (time.perf_counter() - start) * 1e3
+        after = os.stat(path)
+        unchanged = (before.st_size, before.st_mtime_ns) == (after.st_size, after.st_mtime_ns)
+        self._store(name, df, after, after.st_size if unchanged else None)
+        self._record(name, df, load_ms, loads=1)
+        return df
+
+    def _read_appended(self, name, df, file, stat):
+        # Chỉ đọc phần ghi thêm; None nếu phần đã đọc bị sửa / dòng mới không đọc được
+        path = self.sources[name]
+        if stat.st_size <= file['end'] or _signature(path, file['end']) != file['signature']:
+            return None
+        try:
+            tail, end = read_csv_tail(path, file['end'], list(df.columns))
+        except (ValueError, pd.errors.ParserError, UnicodeDecodeError):
+            return None
+        if len(tail):
+            df = append_rows(df, tail)
+        self._store(name, df, stat, end)
+        self._record(name, df, tail_reads=1, tail_rows=len(tail))
+        return df
+
+    def _refresh(self, name):
+        source = self.sources[name]
+        with self._lock:
+            df = self._frames.get(name)
+            file = self._files.get(name)
+        if df is None or file is None:
+            return self._load(name)
+        if not isinstance(source, str):
+            if source.version() == file['version']:
+                self._record(name, None, hits=1)
+                return df
+            return self._load(name)
+
+        stat = os.stat(source)
+        if (stat.st_size, stat.st_mtime_ns) == (file['size'], file['mtime_ns']):
+            self._record(name, None, hits=1)
+            return df
+        appended = self._read_appended(name, df, file, stat)
+        return appended if appended is not None else self._load(name)
+
+    def get(self, name):
+        """View của dataset name; load lần đầu, file nguồn đổi -> đọc phần mới / load lại"""
+        if name not in self.sources:
+            raise KeyError(f"Dataset không có trong catalog: {name}")
+        with self._load_locks[name]:
+            df = self._refresh(name)
+        return self._view(df)
+
+    def invalidate(self, name=None):
+        """Bỏ bản đang giữ (name None -> tất cả), lần get sau load lại"""
+        with self._lock:
+            for key in [name] if name is not None else list(self._frames):
+                self._frames.pop(key, None)
+                self._files.pop(key, None)
+
+    def invalidate_path(self, path):
+        # Dataset nào đọc từ path (so theo đường dẫn tuyệt đối) -> invalidate
+        path = os.path.abspath(path)
+        for name, source in self.sources.items():
+            if isinstance(source, str) and os.path.abspath(source) == path:
+                self.invalidate(name)
+
+    def stats(self):
+        """{tên: rows, memory_mb, load_ms, loads, tail_reads, tail_rows, hits, loaded} của các dataset đã load"""
+        with self._lock:
+            return {name: {**info, 'loaded': name in self._frames} for name, info in self._info.items()}
+
+    def memory_mb(self):
+        with self._lock:
+            return sum(self._info[name]['memory_mb'] for name in self._frames)
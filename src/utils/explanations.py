@@ -0,0 +1,204 @@
+import argparse
+import bisect
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.utils.model_arrays import read_model # type: ignore
+from src.utils.model_artifacts import ModelArtifact, load_arrays, sample_signature, save_arrays # type: ignore
+from src.utils.prediction import FEATURES, CAT_COLS, NUMERIC_COLS, predict_price_batch # type: ignore
+
+# ============================================================
+# BẢNG GIẢI THÍCH GIÁ DỰNG SẴN (PARTIAL DEPENDENCE)
+# ============================================================
+#
+# Offline: với mỗi feature f và giá trị v, PD_f(v) = trung bình output gốc
+# của model trên 1 mẫu nền khi gán f = v cho mọi dòng. Feature số
+# (nam_dang_ky, so_km_da_di) có thêm đường PD riêng cho từng hãng (mẫu nền
+# chỉ gồm xe của hãng đó) vì mỗi hãng mất giá khác nhau.
+#
+# Khi giải thích 1 xe (không gọi model):
+#   output ~ base + sum_f (PD_f(x_f) - mốc của f) + phần còn lại
+# với base = trung bình output trên mẫu nền, mốc = base (feature phân loại)
+# hoặc trung bình của hãng (đường PD theo hãng). Output gốc ~ log giá nên
+# mỗi phần đóng góp đổi thành % bằng exp(c) - 1.
+
+SEGMENT_COL = 'thuong_hieu'
+
+FEATURE_LABELS = {
+    'thuong_hieu': 'Hãng xe',
+    'dong_xe': 'Dòng xe',
+    'nam_dang_ky': 'Năm đăng ký',
+    'so_km_da_di': 'Số km đã đi',
+    'tinh_trang': 'Tình trạng',
+    'loai_xe': 'Loại xe',
+    'dung_tich_xe': 'Dung tích xi lanh',
+    'xuat_xu': 'Xuất xứ',
+}
+
+N_BACKGROUND = 300
+N_SEGMENT_BACKGROUND = 150
+DEFAULT_MIN_ROWS = 30
+N_KM_QUANTILES = 24
+
+
+def _km_grid(df, n_quantiles=N_KM_QUANTILES):
+    grid = np.quantile(df['so_km_da_di'].dropna(), np.linspace(0, 1, n_quantiles)).round(-2)
+    return np.unique(np.concatenate([[0], grid]))
+
+
+def partial_dependence(model, background, feature, values):
+    """PD của feature trên các giá trị values: trung bình output gốc khi gán feature = v cho cả mẫu nền"""
+    n = len(background)
+    grid = background.loc[background.index.repeat(len(values))].reset_index(drop=True)
+    grid[feature] = np.tile(np.asarray(values, dtype=object), n) if feature in CAT_COLS else np.tile(values, n)
+    pred = predict_price_batch(grid, model, inverse_log=False)
+    # Thứ tự dòng: mỗi dòng nền lặp len(values) lần -> (n, len(values))
+    return pred.reshape(n, len(values)).mean(axis=0)
+
+
+def build_explanations(df, model, min_rows=DEFAULT_MIN_ROWS, seed=0):
+    """Tính các đường PD toàn cục + theo hãng -> dict mảng (lưu bằng save_arrays)"""
+    df = df[FEATURES].dropna(subset=NUMERIC_COLS).reset_index(drop=True)
+    df[CAT_COLS] = df[CAT_COLS].astype(str)
+    background = df.sample(min(N_BACKGROUND, len(df)), random_state=seed)
+    base_pred = predict_price_batch(background, model, inverse_log=False)
+
+    years = np.arange(int(df['nam_dang_ky'].min()), int(df['nam_dang_ky'].max()) + 1, dtype=np.float64)
+    numeric_grids = {'nam_dang_ky': years, 'so_km_da_di': _km_grid(df).astype(np.float64)}
+
+    arrays = {'base': np.array(base_pred.mean())}
+    for feature in FEATURES:
+        grid = numeric_grids[feature] if feature in NUMERIC_COLS else np.sort(df[feature].unique())
+        arrays[f'grid__{feature}'] = grid.astype(str) if feature in CAT_COLS else grid
+        arrays[f'pd__{feature}'] = partial_dependence(model, background, feature, grid)
+
+    # Đường PD theo hãng cho feature số
+    counts = df[SEGMENT_COL].value_counts()
+    segments = sorted(counts[counts >= min_rows].index)
+    arrays['segments'] = np.array(segments, dtype=str)
+    segment_base = []
+    for feature in NUMERIC_COLS:
+        curves = []
+        for segment in segments:
+            rows = df[df[SEGMENT_COL] == segment]
+            rows = rows.sample(min(N_SEGMENT_BACKGROUND, len(rows)), random_state=seed)
+            curves.append(partial_dependence(model, rows, feature, numeric_grids[feature]))
+            if feature == NUMERIC_COLS[0]:
+                segment_base.append(predict_price_batch(rows, model, inverse_log=False).mean())
+        arrays[f'segment_pd__{feature}'] = np.array(curves).reshape(len(segments), len(numeric_grids[feature]))
+    arrays['segment_base'] = np.array(segment_base, dtype=np.float64)
+
+    arrays.update(sample_signature(df, model, seed=seed))
+    return arrays
+
+
+def load_explanations(path):
+    """Load bảng giải thích; không có file -> None"""
+    arrays = load_arrays(path)
+    return None if arrays is None else PriceExplanations(arrays)
+
+
+class PriceExplanations(ModelArtifact):
+    """Giải thích giá 1 xe bằng tra bảng PD (không gọi model)"""
+
+    def __init__(self, arrays):
+        self.arrays = arrays
+        self.base = float(arrays['base'])
+        self.grids = {f: arrays[f'grid__{f}'].tolist() for f in FEATURES}
+        self.curves = {f: arrays[f'pd__{f}'].tolist() for f in FEATURES}
+        self.category_index = {f: {v: i for i, v in enumerate(self.grids[f])} for f in CAT_COLS}
+
+        self.segment_index = {s: i for i, s in enumerate(arrays['segments'].tolist())}
+        self.segment_base = arrays['segment_base'].tolist()
+        self.segment_curves = {f: arrays[f'segment_pd__{f}'].tolist() for f in NUMERIC_COLS}
+
+    @staticmethod
+    def _interpolate(grid, curve, x):
+        # Nội suy tuyến tính, ngoài lưới -> giá trị ở đầu mút
+        if x <= grid[0]:
+            return curve[0]
+        if x >= grid[-1]:
+            return curve[-1]
+        i = bisect.bisect_right(grid, x) - 1
+        t = (x - grid[i]) / (grid[i + 1] - grid[i])
+        return curve[i] + t * (curve[i + 1] - curve[i])
+
+    def contribution(self, feature, info):
+        """Đóng góp (output gốc, ~log giá) của 1 feature so với mốc; giá trị lạ -> 0"""
+        value = info.get(feature)
+        if feature in CAT_COLS:
+            i = self.category_index[feature].get(str(value))
+            return 0.0 if i is None else self.curves[feature][i] - self.base
+        try:
+            x = float(value)
+        except (TypeError, ValueError):
+            return 0.0
+        if np.isnan(x):
+            return 0.0
+
+        segment = self.segment_index.get(str(info.get(SEGMENT_COL)))
+        if segment is not None:
+            curve = self.segment_curves[feature][segment]
+            return self._interpolate(self.grids[feature], curve, x) - self.segment_base[segment]
+        return self._interpolate(self.grids[feature], self.curves[feature], x) - self.base
+
+    def explain(self, info, raw_pred=None):
+        """Các phần đóng góp vào giá của xe, sắp theo độ lớn.
+
+        raw_pred: output gốc đã dự đoán (nếu có) -> thêm phần còn lại (tương tác giữa các feature).
+        """
+        contributions = [
+            {'feature': f, 'label': FEATURE_LABELS.get(f, f), 'value': info.get(f),
+             'effect': self.contribution(f, info)}
+            for f in FEATURES
+        ]
+        contributions.sort(key=lambda c: -abs(c['effect']))
+
+        total = self.base + sum(c['effect'] for c in contributions)
+        other = 0.0 if raw_pred is None else float(raw_pred) - total
+        for c in contributions:
+            c['percent'] = float(np.expm1(c['effect']))
+        return {
+            'base_price': float(np.expm1(self.base)),
+            'contributions': contributions,
+            'other_percent': float(np.expm1(other)),
+        }
+
+
+# ============================================================
+# CLI: python -m src.utils.explanations
+# ============================================================
+def main():
+    parser = argparse.ArgumentParser(description="Tính trước bảng giải thích giá (partial dependence)")
+    parser.add_argument("--model", default="./models/model_regression_best.pkl")
+    parser.add_argument("--data", default="./data/processed/data_motobikes_cleaned.csv")
+    parser.add_argument("--out", default="./models/explanations.npz")
+    parser.add_argument("--min-rows", type=int, default=DEFAULT_MIN_ROWS,
+                        help="Hãng có ít tin đăng hơn dùng đường PD chung")
+    args = parser.parse_args()
+
+    model = read_model(args.model)
+    df = pd.read_csv(args.data)
+
+    start = time.perf_counter()
+    arrays = build_explanations(df, model, args.min_rows)
+    save_arrays(arrays, args.out)
+    explanations = load_explanations(args.out)
+    print(f"Tính bảng trong {time.perf_counter() - start:.1f}s -> {args.out} "
+          f"({os.path.getsize(args.out) / 1e3:,.0f} KB, {len(explanations.segment_index)} hãng có đường riêng)")
+
+    # Ví dụ: xe đầu tiên trong dữ liệu
+    info = df[FEATURES].iloc[0].to_dict()
+    raw = predict_price_batch([info], model, inverse_log=False)[0]
+    result = explanations.explain(info, raw)
+    print(f"Giá trung bình: {result['base_price']:,.0f} VND, dự đoán: {np.expm1(raw):,.0f} VND")
+    for c in result['contributions']:
+        print(f"  {c['label']:<20} {str(c['value']):<20} {c['percent']:+8.1%}")
+    print(f"  {'(tương tác)':<20} {'':<20} {result['other_percent']:+8.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from src.config import INFERENCE_MAX_THREADS, PARALLEL_MIN_ROWS # type: ignore
+from src.utils.model_arrays import PREDICT_CHUNK_ROWS # type: ignore
+
+# ============================================================
+# CHÍNH SÁCH THREAD KHI DỰ ĐOÁN
+# ============================================================
+#
+#   - Lô nhỏ (< PARALLEL_MIN_ROWS dòng, gồm mọi lần dự đoán 1 xe): chạy tuần tự.
+#     n_jobs của estimator luôn được đặt về 1 để predict 1 dòng không tốn
+#     chi phí dispatch của joblib.
+#   - Lô lớn: chia các cây (sklearn) hoặc các khúc dòng (model mảng) cho tối
+#     đa max_threads() thread; cây sklearn và gather numpy đều nhả GIL.
+#   - max_threads(): INFERENCE_MAX_THREADS, hoặc số CPU chia đều cho số
+#     worker Streamlit (biến môi trường WEB_CONCURRENCY) để các process
+#     trên cùng máy không tranh nhau CPU.
+
+logger = logging.getLogger(__name__)
+
+_serial_models = {}
+_serial_lock = threading.Lock()
+_executor = None
+_executor_size = 0
+_executor_lock = threading.Lock()
+
+
+def max_threads():
+    if INFERENCE_MAX_THREADS:
+        return max(1, int(INFERENCE_MAX_THREADS))
+    workers = max(1, int(os.environ.get("WEB_CONCURRENCY", "1") or 1))
+    return max(1, (os.cpu_count() or 1) // workers)
+
+
+def threads_for(n_rows):
+    """Số thread dùng cho 1 lô n_rows dòng"""
+    return 1 if n_rows < PARALLEL_MIN_ROWS else max_threads()
+
+
+def limit_native_threads():
+    # Giới hạn thread của BLAS / OpenMP trong process (threadpoolctl đi kèm scikit-learn)
+    try:
+        from threadpoolctl import threadpool_limits # type: ignore
+    except ImportError:
+        return
+    threadpool_limits(max_threads())
+    logger.info("Giới hạn %d thread / process cho inference", max_threads())
+
+
+def ensure_serial(model):
+    """Đặt n_jobs = 1 cho estimator cuối (1 lần cho mỗi model); song song do predict_parallel lo"""
+    # Giữ tham chiếu tới model để id() không bị dùng lại cho model khác
+    if _serial_models.get(id(model)) is model:
+        return model
+
+    estimator = model.steps[-1][1] if hasattr(model, "steps") else model
+    for attr in ("n_jobs", "nthread"):
+        if getattr(estimator, attr, None) not in (None, 1):
+            setattr(estimator, attr, 1)
+
+    with _serial_lock:
+        _serial_models[id(model)] = model
+    return model
+
+
+def forget_serial(model):
+    with _serial_lock:
+        if _serial_models.get(id(model)) is model:
+            del _serial_models[id(model)]
+
+
+def _pool():
+    global _executor, _executor_size
+    with _executor_lock:
+        if _executor is None or _executor_size != max_threads():
+            _executor_size = max_threads()
+            _executor = ThreadPoolExecutor(_executor_size, thread_name_prefix="inference")
+        return _executor
+
+
+def _split(n, parts):
+    bounds = np.linspace(0, n, parts + 1).astype(int)
+    return [(a, b) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+
+def _forest_parts(estimator):
+    # (danh sách cây, hàm ghép tổng giá trị các cây -> dự đoán), None nếu không hỗ trợ
+    name = type(estimator).__name__
+    if name in ("RandomForestRegressor", "ExtraTreesRegressor"):
+        trees = list(estimator.estimators_)
+        return trees, lambda total, Xt: total / len(trees)
+    if name == "GradientBoostingRegressor" and estimator.init_ != "zero":
+        trees = list(np.ravel(estimator.estimators_))
+        return trees, lambda total, Xt: np.ravel(estimator.init_.predict(Xt)) + estimator.learning_rate * total
+    return None
+
+
+def predict_parallel(model, X, n_threads):
+    """model.predict(X) chia cho n_threads thread"""
+    if n_threads <= 1:
+        return np.asarray(model.predict(X), dtype=np.float64)
+
+    pool = _pool()
+
+    # Pipeline sklearn dạng ensemble cây: transform 1 lần, rồi chia các cây cho các thread
+    parts = _forest_parts(model.steps[-1][1]) if hasattr(model, "steps") else None
+    if parts is not None:
+        trees, finish = parts
+        Xt = model[:-1].transform(X) if len(model.steps) > 1 else X
+        # Cây sklearn predict trên float32 (sparse: CSR): đổi 1 lần thay vì ở mỗi cây
+        Xt = Xt.tocsr().astype(np.float32) if hasattr(Xt, "tocsr") else np.asarray(Xt, dtype=np.float32)
+
+        def partial_sum(bounds):
+            total = np.zeros(Xt.shape[0], dtype=np.float64)
+            for tree in trees[bounds[0]:bounds[1]]:
+                total += tree.predict(Xt)
+            return total
+
+        return finish(sum(pool.map(partial_sum, _split(len(trees), n_threads))), Xt)
+
+    # Model khác (ArrayForestModel, ShardedModel...): chia khúc dòng, mỗi thread transform + predict khúc của mình
+    rows = X.iloc if hasattr(X, "iloc") else X
+    n_rows = X.shape[0]
+    n_parts = max(n_threads, -(-n_rows // PREDICT_CHUNK_ROWS))
+    chunks = pool.map(lambda b: np.asarray(model.predict(rows[b[0]:b[1]]), dtype=np.float64), _split(n_rows, n_parts))
+    return np.concatenate(list(chunks))
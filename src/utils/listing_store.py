@@ -0,0 +1,245 @@
+import argparse
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.utils.dataset_cache import CATEGORY_COLS # type: ignore
+
+# ============================================================
+# LƯU TIN ĐĂNG TRONG SQLITE (WAL)
+# ============================================================
+#
+# Mỗi file tin đăng (results_post_new_pending.csv, results_with_anomalies.csv)
+# là 1 bảng cùng tên dataset trong catalog, giữ nguyên các cột của CSV + khóa
+# id INTEGER PRIMARY KEY. Đăng tin = 1 INSERT, duyệt / từ chối = 1 UPDATE /
+# DELETE theo id (1 transaction nhỏ), không ghi lại cả file. Bảng _versions
+# được trigger tăng sau mỗi thay đổi -> catalog chỉ cần đọc 1 số để biết có
+# cần load lại không. export_csv ghi lại file CSV cho các công cụ cũ.
+
+INDEXED_COLS = ['thuong_hieu', 'dong_xe', 'nam_dang_ky', 'trang_thai', 'anomaly_flag']
+
+BUSY_TIMEOUT_SECONDS = 5.0
+
+
+def _sql_type(series):
+    kind = series.dtype.kind
+    if kind in 'biu':
+        return 'INTEGER'
+    if kind == 'f':
+        return 'REAL'
+    return 'TEXT'
+
+
+def _quote(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _quote_literal(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _python_rows(df):
+    # numpy / pandas scalar -> kiểu Python mà sqlite3 hiểu, NaN -> NULL
+    columns = [df[c].astype(object).where(df[c].notna(), None) for c in df.columns]
+    for row in zip(*columns):
+        yield tuple(v.item() if isinstance(v, np.generic) else v for v in row)
+
+
+class ListingStore:
+    """Bảng tin đăng trong 1 file SQLite, dùng được từ nhiều thread / process"""
+
+    def __init__(self, path):
+        self.path = str(path)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS _versions (name TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+
+    def _connect(self):
+        # Mỗi thread 1 connection (sqlite3 không cho dùng chung connection giữa các thread)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_SECONDS)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # ===== SCHEMA =====
+    def tables(self):
+        rows = self._connect().execute("SELECT name FROM _versions ORDER BY name").fetchall()
+        return [r[0] for r in rows]
+
+    def has_table(self, table):
+        return table in self.tables()
+
+    def columns(self, table):
+        rows = self._connect().execute(f"PRAGMA table_info({_quote(table)})").fetchall()
+        return [r[1] for r in rows if r[1] != 'id']
+
+    def _ensure_columns(self, conn, table, df):
+        # Tạo bảng nếu chưa có; cột mới -> ALTER TABLE ADD COLUMN; cột cần index -> CREATE INDEX
+        existing = [r[1] for r in conn.execute(f"PRAGMA table_info({_quote(table)})").fetchall()]
+        if not existing:
+            conn.execute(f"CREATE TABLE {_quote(table)} (id INTEGER PRIMARY KEY)")
+            conn.execute("INSERT OR IGNORE INTO _versions VALUES (?, 0)", (table,))
+            for action in ('INSERT', 'UPDATE', 'DELETE'):
+                conn.execute(
+                    f"CREATE TRIGGER {_quote(f'{table}_{action.lower()}_version')} AFTER {action} ON {_quote(table)} "
+                    f"BEGIN UPDATE _versions SET version = version + 1 WHERE name = {_quote_literal(table)}; END"
+                )
+            existing = ['id']
+        for c in df.columns:
+            if c not in existing:
+                conn.execute(f"ALTER TABLE {_quote(table)} ADD COLUMN {_quote(c)} {_sql_type(df[c])}")
+                existing.append(c)
+            if c in INDEXED_COLS:
+                conn.execute(f"CREATE INDEX IF NOT EXISTS {_quote(f'idx_{table}_{c}')} ON {_quote(table)} ({_quote(c)})")
+
+    # ===== GHI =====
+    def insert(self, table, df):
+        """Thêm các dòng của df (1 transaction) -> danh sách id mới"""
+        conn = self._connect()
+        columns = self.columns(table) if self.has_table(table) else []
+        # Giống ghi thêm CSV không header: tên cột khác nhưng cùng số cột -> ghép theo vị trí
+        if columns and not set(df.columns) <= set(columns) and len(df.columns) == len(columns):
+            df = df.set_axis(columns, axis=1)
+        with conn:
+            self._ensure_columns(conn, table, df)
+            names = ", ".join(_quote(c) for c in df.columns)
+            marks = ", ".join("?" for _ in df.columns)
+            ids = []
+            for row in _python_rows(df):
+                ids.append(conn.execute(f"INSERT INTO {_quote(table)} ({names}) VALUES ({marks})", row).lastrowid)
+        return ids
+
+    def update(self, table, row_id, **values):
+        """Sửa các cột của 1 tin đăng theo id; cột chưa có được thêm vào bảng"""
+        conn = self._connect()
+        with conn:
+            self._ensure_columns(conn, table, pd.DataFrame({k: [v] for k, v in values.items()}))
+            assignments = ", ".join(f"{_quote(k)} = ?" for k in values)
+            params = [v.item() if isinstance(v, np.generic) else v for v in values.values()]
+            cursor = conn.execute(f"UPDATE {_quote(table)} SET {assignments} WHERE id = ?", (*params, int(row_id)))
+        return cursor.rowcount
+
+    def update_many(self, table, row_ids, **values):
+        """Gán cùng giá trị cho nhiều tin đăng (1 transaction) -> số dòng đã sửa"""
+        conn = self._connect()
+        with conn:
+            self._ensure_columns(conn, table, pd.DataFrame({k: [v] for k, v in values.items()}))
+            assignments = ", ".join(f"{_quote(k)} = ?" for k in values)
+            params = [v.item() if isinstance(v, np.generic) else v for v in values.values()]
+            cursor = conn.executemany(f"UPDATE {_quote(table)} SET {assignments} WHERE id = ?",
+                                      [(*params, int(i)) for i in row_ids])
+        return cursor.rowcount
+
+    def delete(self, table, row_id):
+        conn = self._connect()
+        with conn:
+            cursor = conn.execute(f"DELETE FROM {_quote(table)} WHERE id = ?", (int(row_id),))
+        return cursor.rowcount
+
+    def delete_many(self, table, row_ids):
+        conn = self._connect()
+        with conn:
+            cursor = conn.executemany(f"DELETE FROM {_quote(table)} WHERE id = ?", [(int(i),) for i in row_ids])
+        return cursor.rowcount
+
+    def import_csv(self, table, csv_path, replace=False):
+        """Nạp 1 file CSV vào bảng (bảng đã có và không replace -> bỏ qua) -> số dòng đã nạp"""
+        if self.has_table(table) and not replace:
+            return 0
+        df = pd.read_csv(csv_path)
+        conn = self._connect()
+        with conn:
+            if replace:
+                conn.execute(f"DROP TABLE IF EXISTS {_quote(table)}")
+                conn.execute("DELETE FROM _versions WHERE name = ?", (table,))
+        self.insert(table, df)
+        return len(df)
+
+    # ===== ĐỌC =====
+    def version(self, table):
+        """Số tăng sau mỗi INSERT / UPDATE / DELETE trên bảng (0 nếu chưa có bảng)"""
+        row = self._connect().execute("SELECT version FROM _versions WHERE name = ?", (table,)).fetchone()
+        return row[0] if row else 0
+
+    def read(self, table, categorical=True):
+        """Cả bảng -> DataFrame, index = id của tin đăng; cột phân loại -> category (như dataset cache)"""
+        if not self.has_table(table):
+            return pd.DataFrame()
+        df = pd.read_sql_query(f"SELECT * FROM {_quote(table)} ORDER BY id", self._connect(), index_col='id')
+        df.index.name = None
+        if categorical:
+            for c in CATEGORY_COLS:
+                if c in df and df[c].dtype.kind not in 'biuf':
+                    df[c] = df[c].astype('category')
+        return df
+
+    def export_csv(self, table, csv_path):
+        """Ghi bảng ra CSV cùng định dạng với append_to_csv (không có cột id)"""
+        self.read(table, categorical=False).to_csv(csv_path, index=False, encoding="utf-8-sig")
+
+
+class StoreTable:
+    """Nguồn dữ liệu của catalog đọc từ 1 bảng trong ListingStore"""
+
+    def __init__(self, store, table):
+        self.store = store
+        self.table = table
+
+    def version(self):
+        return self.store.version(self.table)
+
+    def load(self):
+        return self.store.read(self.table)
+
+
+# ============================================================
+# CLI: python -m src.utils.listing_store
+# ============================================================
+def main():
+    from src.config import LISTING_DB, LISTING_TABLES # type: ignore
+
+    parser = argparse.ArgumentParser(description="Nạp / xuất các bảng tin đăng trong SQLite")
+    parser.add_argument("action", choices=["import", "export", "bench"])
+    parser.add_argument("--db", default=str(LISTING_DB))
+    parser.add_argument("--replace", action="store_true", help="import: nạp lại dù bảng đã có")
+    parser.add_argument("--out-dir", default=None, help="export: thư mục ghi CSV (mặc định: ghi đè file gốc)")
+    args = parser.parse_args()
+
+    store = ListingStore(args.db)
+    for table, csv_path in LISTING_TABLES.items():
+        if args.action == "import":
+            if not os.path.exists(csv_path):
+                print(f"{table}: không có {csv_path}")
+                continue
+            n = store.import_csv(table, csv_path, replace=args.replace)
+            print(f"{table}: " + (f"nạp {n:,} dòng từ {csv_path}" if n else "đã có, bỏ qua (--replace để nạp lại)"))
+        elif args.action == "export":
+            out = os.path.join(args.out_dir, os.path.basename(csv_path)) if args.out_dir else csv_path
+            os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+            store.export_csv(table, out)
+            print(f"{table}: {len(store.read(table)):,} dòng -> {out}")
+        elif store.has_table(table):
+            # Đổi trạng thái 1 tin đăng: UPDATE theo id so với ghi lại cả file CSV
+            df = store.read(table, categorical=False)
+            row_id = int(df.index[len(df) // 2])
+            current = df.loc[row_id, 'anomaly_flag'] if 'anomaly_flag' in df else 0
+            start = time.perf_counter()
+            for _ in range(50):
+                store.update(table, row_id, anomaly_flag=current)
+            update_ms = (time.perf_counter() - start) / 50 * 1e3
+            start = time.perf_counter()
+            df.to_csv(os.devnull, index=False)
+            rewrite_ms = (time.perf_counter() - start) * 1e3
+            print(f"{table} ({len(df):,} dòng): UPDATE 1 tin {update_ms:.2f} ms, ghi lại cả CSV {rewrite_ms:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
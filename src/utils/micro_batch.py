@@ -0,0 +1,142 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+# ============================================================
+# MICRO-BATCHING: GOM CÁC REQUEST ĐẾN GẦN NHAU THÀNH 1 LẦN PREDICT
+# ============================================================
+#
+# Thread nền lấy request đầu tiên trong hàng đợi, chờ thêm tối đa
+# max_wait_ms (hoặc đến khi đủ max_batch) rồi gọi predict_fn 1 lần cho
+# cả lô. Trong lúc lô trước đang chạy, request mới tiếp tục xếp hàng nên
+# khi tải cao lô tự lớn lên mà không cần chờ thêm.
+#
+# adaptive=True: chỉ chờ khi lô trước có từ 2 item trở lên (đang có tải
+# đồng thời); lúc vắng, request lẻ được chạy ngay, không mất max_wait_ms.
+#
+# predict_fn lỗi trên cả lô -> chạy lại từng item riêng: chỉ item gây lỗi
+# nhận exception, các request khác trong lô vẫn có kết quả.
+
+class BatcherClosed(RuntimeError):
+    """submit sau khi batcher đã đóng"""
+
+
+class MicroBatcher:
+    """Gom các item lẻ thành lô; predict_fn(list item) -> list kết quả cùng thứ tự"""
+
+    def __init__(self, predict_fn, max_batch=256, max_wait_ms=2.0, name="micro-batcher", adaptive=False):
+        self.predict_fn = predict_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.name = name
+        self.adaptive = adaptive
+        self._last_batch = 0
+
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._closed = False
+
+        self.batches = 0
+        self.items = 0
+        self.max_seen_batch = 0
+
+    def submit(self, item):
+        """Đưa 1 item vào hàng đợi, trả về Future chứa kết quả của riêng item đó"""
+        future = Future()
+        # Kiểm tra _closed và put trong cùng 1 lock với close(): item không thể nằm sau tín hiệu đóng
+        with self._lock:
+            if self._closed:
+                raise BatcherClosed(f"{self.name} đã đóng")
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+            self._queue.put((item, future))
+        return future
+
+    def predict(self, item, timeout=None):
+        return self.submit(item).result(timeout)
+
+    def predict_many(self, items, timeout=None):
+        futures = [self.submit(item) for item in items]
+        return [f.result(timeout) for f in futures]
+
+    def close(self):
+        """Xử lý nốt các item đã nhận rồi dừng thread; submit sau đó -> BatcherClosed"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+            if thread is not None:
+                self._queue.put(None)
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def stats(self):
+        return {
+            'batches': self.batches,
+            'items': self.items,
+            'avg_batch': self.items / self.batches if self.batches else 0.0,
+            'max_batch': self.max_seen_batch,
+            'queued': self._queue.qsize(),
+        }
+
+    def _collect(self, first):
+        batch = [first]
+        wait = self.max_wait if not self.adaptive or self._last_batch > 1 else 0.0
+        deadline = time.monotonic() + wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                job = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if job is None:
+                # Tín hiệu đóng: xử lý nốt lô hiện tại rồi dừng
+                self._queue.put(None)
+                break
+            batch.append(job)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+
+            batch = self._collect(first)
+            items = [item for item, _ in batch]
+            futures = [future for _, future in batch]
+
+            self._last_batch = len(batch)
+            self.batches += 1
+            self.items += len(batch)
+            self.max_seen_batch = max(self.max_seen_batch, len(batch))
+
+            try:
+                results = self._predict(items)
+            except Exception as e:
+                if len(batch) == 1:
+                    futures[0].set_exception(e)
+                else:
+                    self._predict_each(batch)
+                continue
+
+            for future, result in zip(futures, results):
+                future.set_result(result)
+
+    def _predict(self, items):
+        results = self.predict_fn(items)
+        if len(results) != len(items):
+            raise RuntimeError(f"predict_fn trả về {len(results)} kết quả cho {len(items)} item")
+        return results
+
+    def _predict_each(self, batch):
+        # Lô lỗi: chạy lại từng item để 1 request hỏng không làm lỗi các request khác
+        for item, future in batch:
+            try:
+                future.set_result(self._predict([item])[0])
+            except Exception as e:
+                future.set_exception(e)
@@ -0,0 +1,579 @@
+import argparse
+import json
+import os
+import pickle
+import time
+
+import numpy as np
+
+# ============================================================
+# EXPORT MODEL CÂY (RandomForest / ExtraTrees / GradientBoosting)
+# THÀNH CÁC MẢNG NUMPY PHẲNG
+# ============================================================
+#
+# Cấu trúc thư mục export:
+#   <ten_model>_arrays/
+#       meta.json           -> loại ensemble, base_score, scale, số cây...
+#       arrays.npz          -> feature, threshold, left, right, value, ...
+#       preprocessor.pkl    -> phần tiền xử lý của Pipeline (nhỏ)
+#
+# Với layout "npy" mỗi mảng là một file <tên>.npy riêng thay cho arrays.npz,
+# có thể memory-map (mmap_mode='r') để nhiều worker dùng chung page cache.
+#
+# Tất cả node của mọi cây được nối liền nhau, chỉ số con (left/right)
+# là chỉ số toàn cục. Node lá có left = right = chính nó và feature = -1,
+# nên duyệt đủ max_depth bước sẽ dừng tại lá mà không cần rẽ nhánh.
+# Dự đoán:
+#   forest   -> trung bình giá trị lá của các cây
+#   boosting -> base_score + tổng(scale * giá trị lá của từng cây)
+# Model nén (src.utils.model_compression) có thể lưu giá trị lá float16 trừ đi
+# value_offset (meta); forest cộng lại value_offset sau khi lấy trung bình.
+
+ARRAYS_FILE = "arrays.npz"
+META_FILE = "meta.json"
+PREPROCESSOR_FILE = "preprocessor.pkl"
+COMPACT_SUFFIX = "_arrays"
+
+FORMAT_VERSION = 1
+
+# Engine dự đoán:
+#   sklearn   -> model.predict của Pipeline gốc
+#   per_tree  -> ArrayForestModel, lặp từng cây, mỗi cây vector hóa theo dòng
+#   levelwise -> ArrayForestModel, duyệt mọi cây cùng lúc theo từng tầng
+ENGINES = ("sklearn", "per_tree", "levelwise")
+
+# levelwise: số ô (dòng x cây) tối đa trong 1 khúc, giới hạn bộ nhớ tạm
+LEVELWISE_MAX_CELLS = 1 << 18
+
+# Số dòng transform (sparse -> dense) mỗi lần trong ArrayForestModel.predict
+PREDICT_CHUNK_ROWS = 65536
+
+
+def compact_model_path(model_path):
+    """models/model_regression_best.pkl -> models/model_regression_best_arrays"""
+    root, _ = os.path.splitext(str(model_path))
+    return root + COMPACT_SUFFIX
+
+
+def split_pipeline(model):
+    """Tách Pipeline thành (tiền xử lý, estimator cuối). Không phải Pipeline -> (None, model)"""
+    if hasattr(model, "steps"):
+        preprocessor = model[:-1] if len(model.steps) > 1 else None
+        return preprocessor, model.steps[-1][1]
+    return None, model
+
+
+def _tree_list(estimator):
+    # Trả về (danh sách tree_, base_score, scale, kind)
+    name = type(estimator).__name__
+
+    if hasattr(estimator, "tree_"):
+        return [estimator.tree_], 0.0, 1.0, "forest"
+
+    if name in ("RandomForestRegressor", "ExtraTreesRegressor"):
+        trees = [e.tree_ for e in estimator.estimators_]
+        return trees, 0.0, 1.0, "forest"
+
+    if name == "GradientBoostingRegressor":
+        trees = [e.tree_ for e in np.ravel(estimator.estimators_)]
+        if estimator.init_ == "zero":
+            base = 0.0
+        else:
+            dummy = np.zeros((1, estimator.n_features_in_))
+            base = float(np.ravel(estimator.init_.predict(dummy))[0])
+        return trees, base, float(estimator.learning_rate), "boosting"
+
+    raise ValueError(f"Không hỗ trợ export model loại {name}")
+
+
+def _threshold_float32(threshold):
+    # X được so sánh ở dạng float32 (giống sklearn), làm tròn ngưỡng XUỐNG
+    # float32 gần nhất để x <= t32 tương đương x <= t64 với mọi x float32
+    t32 = threshold.astype(np.float32)
+    too_high = t32.astype(np.float64) > threshold
+    t32[too_high] = np.nextafter(t32[too_high], np.float32(-np.inf))
+    return t32
+
+
+def flatten_trees(estimator):
+    """Chuyển estimator dạng cây thành dict các mảng phẳng + meta"""
+    trees, base, scale, kind = _tree_list(estimator)
+
+    node_counts = np.array([t.node_count for t in trees], dtype=np.int64)
+    tree_offsets = np.concatenate([[0], np.cumsum(node_counts)]).astype(np.int64)
+
+    feature, threshold, left, right, value, missing_left = [], [], [], [], [], []
+    for t, offset in zip(trees, tree_offsets[:-1]):
+        is_leaf = t.children_left < 0
+        nodes = np.arange(t.node_count) + offset
+        feature.append(np.where(is_leaf, -1, t.feature).astype(np.int32))
+        threshold.append(_threshold_float32(np.where(is_leaf, np.inf, t.threshold)))
+        left.append(np.where(is_leaf, nodes, t.children_left + offset).astype(np.int32))
+        right.append(np.where(is_leaf, nodes, t.children_right + offset).astype(np.int32))
+        value.append(t.value[:, 0, 0].astype(np.float64))
+        # sklearn >= 1.3: hướng đi của giá trị NaN tại từng node
+        mgl = getattr(t, "missing_go_to_left", None)
+        missing_left.append(np.zeros(t.node_count, dtype=bool) if mgl is None else np.asarray(mgl, dtype=bool))
+
+    arrays = {
+        "feature": np.concatenate(feature),
+        "threshold": np.concatenate(threshold),
+        "left": np.concatenate(left),
+        "right": np.concatenate(right),
+        "value": np.concatenate(value),
+        "missing_left": np.concatenate(missing_left),
+        "tree_offsets": tree_offsets,
+        "tree_depths": np.array([t.max_depth for t in trees], dtype=np.int32),
+    }
+    if int(tree_offsets[-1]) >= np.iinfo(np.int32).max:
+        raise ValueError("Số node vượt quá giới hạn int32")
+
+    meta = {
+        "format_version": FORMAT_VERSION,
+        "estimator": type(estimator).__name__,
+        "kind": kind,
+        "n_trees": len(trees),
+        "n_nodes": int(tree_offsets[-1]),
+        "n_features": int(estimator.n_features_in_),
+        "base_score": base,
+        "scale": scale,
+    }
+    return arrays, meta
+
+
+def prune_arrays(arrays, meta, fixed):
+    """Cố định giá trị một số feature (dict cột -> giá trị) và bỏ các nhánh không thể đi tới.
+
+    Mọi input có đúng các giá trị đó cho kết quả giống hệt ensemble gốc.
+    """
+    feature, threshold = arrays["feature"], arrays["threshold"]
+    left, right = arrays["left"], arrays["right"]
+    tree_offsets = arrays["tree_offsets"]
+    n_trees = len(tree_offsets) - 1
+
+    # target[i]: node thực sự đến được khi đi vào i (node rẽ theo feature cố định -> nhánh con tương ứng)
+    target = np.arange(len(feature), dtype=np.int64)
+    for column, value in fixed.items():
+        at = np.flatnonzero(feature == column)
+        go_left = np.float32(value) <= threshold[at]
+        target[at] = np.where(go_left, left[at], right[at])
+    # Nhảy con trỏ đến khi không còn node bị rẽ cố định
+    while True:
+        jumped = target[target]
+        if np.array_equal(jumped, target):
+            break
+        target = jumped
+
+    new_left, new_right = target[left], target[right]
+
+    # Duyệt từ gốc mới của từng cây theo tầng: đánh dấu node còn đến được + độ sâu mới
+    reachable = np.zeros(len(feature), dtype=bool)
+    depths = np.zeros(n_trees, dtype=np.int32)
+    frontier = target[tree_offsets[:-1]]
+    level = 0
+    while frontier.size:
+        reachable[frontier] = True
+        np.maximum.at(depths, np.searchsorted(tree_offsets, frontier, side="right") - 1, level)
+        internal = frontier[feature[frontier] >= 0]
+        frontier = np.concatenate([new_left[internal], new_right[internal]])
+        level += 1
+
+    # Node sklearn đánh số theo thứ tự tiền tố: gốc mới luôn là node nhỏ nhất còn lại của cây
+    keep = np.flatnonzero(reachable)
+    new_index = (np.cumsum(reachable) - 1).astype(np.int32)
+    counts = np.bincount(np.searchsorted(tree_offsets, keep, side="right") - 1, minlength=n_trees)
+
+    pruned = {
+        "feature": feature[keep],
+        "threshold": threshold[keep],
+        "left": new_index[new_left[keep]],
+        "right": new_index[new_right[keep]],
+        "value": arrays["value"][keep],
+        "missing_left": arrays["missing_left"][keep],
+        "tree_offsets": np.concatenate([[0], np.cumsum(counts)]).astype(np.int64),
+        "tree_depths": depths,
+    }
+    meta = dict(meta, n_nodes=int(len(keep)))
+    return pruned, meta
+
+
+# ============================================================
+# ĐỌC / GHI THƯ MỤC MẢNG
+# ============================================================
+def save_arrays(out_dir, arrays, meta, layout="npz"):
+    if layout not in ("npz", "npy"):
+        raise ValueError(f"Layout không hợp lệ: {layout}")
+
+    os.makedirs(out_dir, exist_ok=True)
+    # Xóa file của layout cũ (nếu export lại) để thư mục không chứa 2 bản
+    for old in os.listdir(out_dir):
+        if old == ARRAYS_FILE or old.endswith(".npy"):
+            os.remove(os.path.join(out_dir, old))
+
+    if layout == "npz":
+        np.savez(os.path.join(out_dir, ARRAYS_FILE), **arrays)
+    else:
+        for name, array in arrays.items():
+            np.save(os.path.join(out_dir, f"{name}.npy"), np.ascontiguousarray(array))
+
+    meta = dict(meta, layout=layout, array_names=sorted(arrays))
+    with open(os.path.join(out_dir, META_FILE), "w", encoding="utf-8") as file:
+        json.dump(meta, file, indent=2)
+
+
+def load_arrays(path, mmap=False):
+    """Trả về (arrays, meta). mmap=True chỉ có tác dụng với layout "npy" """
+    if not os.path.isdir(path):
+        raise FileNotFoundError(path)
+
+    with open(os.path.join(path, META_FILE), encoding="utf-8") as file:
+        meta = json.load(file)
+
+    if meta.get("layout", "npz") == "npz":
+        with np.load(os.path.join(path, ARRAYS_FILE)) as npz:
+            arrays = {k: npz[k] for k in npz.files}
+    else:
+        mmap_mode = "r" if mmap else None
+        arrays = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode)
+            for name in meta["array_names"]
+        }
+    return arrays, meta
+
+
+def export_model_arrays(model, out_dir, layout="npz"):
+    """Export model (Pipeline hoặc estimator cây) ra thư mục mảng numpy"""
+    preprocessor, estimator = split_pipeline(model)
+    arrays, meta = flatten_trees(estimator)
+    return save_model_arrays(out_dir, arrays, meta, preprocessor, layout)
+
+
+def save_model_arrays(out_dir, arrays, meta, preprocessor=None, layout="npz"):
+    """Ghi mảng cây đã làm phẳng (+ preprocessor) thành thư mục load_model đọc được"""
+    meta = dict(meta, artifact="tree_ensemble", has_preprocessor=preprocessor is not None)
+    save_arrays(out_dir, arrays, meta, layout)
+
+    if preprocessor is not None:
+        with open(os.path.join(out_dir, PREPROCESSOR_FILE), "wb") as file:
+            pickle.dump(preprocessor, file)
+
+    return out_dir
+
+
+def load_model_arrays(path, mmap=False):
+    """Load thư mục export -> ArrayForestModel"""
+    arrays, meta = load_arrays(path, mmap)
+
+    preprocessor = None
+    if meta.get("has_preprocessor"):
+        with open(os.path.join(path, PREPROCESSOR_FILE), "rb") as file:
+            preprocessor = pickle.load(file)
+
+    return ArrayForestModel(arrays, meta, preprocessor)
+
+
+# ============================================================
+# MA TRẬN (tfidf_matrix.pkl, cosine_similarity.pkl)
+# ============================================================
+def export_matrix_arrays(matrix, out_dir, layout="npy"):
+    """Export ndarray hoặc scipy sparse matrix ra thư mục mảng numpy"""
+    if hasattr(matrix, "tocsr"):
+        csr = matrix.tocsr()
+        arrays = {"data": csr.data, "indices": csr.indices, "indptr": csr.indptr}
+        meta = {"artifact": "matrix", "format": "csr", "shape": list(csr.shape)}
+    elif isinstance(matrix, np.ndarray):
+        arrays = {"matrix": matrix}
+        meta = {"artifact": "matrix", "format": "dense", "shape": list(matrix.shape)}
+    else:
+        raise ValueError(f"Không hỗ trợ export ma trận loại {type(matrix).__name__}")
+
+    save_arrays(out_dir, arrays, meta, layout)
+    return out_dir
+
+
+def load_matrix_arrays(path, mmap=False):
+    arrays, meta = load_arrays(path, mmap)
+    if meta["format"] == "dense":
+        return arrays["matrix"]
+
+    from scipy.sparse import csr_matrix
+
+    # copy=False: giữ nguyên các mảng memory-map, không tạo bản sao riêng
+    return csr_matrix((arrays["data"], arrays["indices"], arrays["indptr"]),
+                      shape=tuple(meta["shape"]), copy=False)
+
+
+def read_model(model_path, prefer_compact=True, mmap=False, prefer_shards=False, shard_max_mb=None):
+    """Đọc model: thư mục shard theo hãng / export mảng (nếu có) hoặc file pickle"""
+    if prefer_shards:
+        from src.utils.brand_shards import load_sharded_model, sharded_model_path # type: ignore
+
+        shards_path = sharded_model_path(model_path)
+        if os.path.isdir(shards_path):
+            return load_sharded_model(shards_path, mmap, shard_max_mb)
+
+    compact_path = compact_model_path(model_path)
+    if prefer_compact and os.path.isdir(compact_path):
+        return load_artifact(compact_path, mmap)
+
+    if os.path.isdir(model_path):
+        return load_artifact(model_path, mmap)
+
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(model_path)
+
+    with open(model_path, 'rb') as file:
+        return pickle.load(file)
+
+
+def load_artifact(path, mmap=False):
+    """Load thư mục export bất kỳ (model cây hoặc ma trận)"""
+    with open(os.path.join(path, META_FILE), encoding="utf-8") as file:
+        artifact = json.load(file).get("artifact", "tree_ensemble")
+
+    if artifact == "matrix":
+        return load_matrix_arrays(path, mmap)
+    if artifact == "brand_shards":
+        from src.utils.brand_shards import load_sharded_model # type: ignore
+
+        return load_sharded_model(path, mmap)
+    return load_model_arrays(path, mmap)
+
+
+def model_for_engine(model, engine):
+    """Model dùng engine đã chọn; Pipeline sklearn được làm phẳng trong bộ nhớ khi cần"""
+    if engine not in ENGINES:
+        raise ValueError(f"Engine không hợp lệ: {engine} (chọn {', '.join(ENGINES)})")
+
+    if isinstance(model, ArrayForestModel):
+        # Model đã export không còn cây sklearn: "sklearn" giữ nguyên engine hiện tại
+        if engine in ("sklearn", model.engine):
+            return model
+    elif engine == "sklearn":
+        return model
+
+    key = (id(model), engine)
+    entry = _engine_models.get(key)
+    # Giữ tham chiếu tới model để id() không bị dùng lại cho model khác; bản theo engine
+    # được giữ lại để các cache theo model (encoder biên dịch...) không phải tạo lại mỗi lần
+    if entry is None or entry[0] is not model:
+        if isinstance(model, ArrayForestModel):
+            entry = (model, model.with_engine(engine))
+        else:
+            preprocessor, estimator = split_pipeline(model)
+            try:
+                arrays, meta = flatten_trees(estimator)
+                entry = (model, ArrayForestModel(arrays, meta, preprocessor, engine))
+            except ValueError:
+                # Không phải ensemble cây (vd. ShardedModel): dùng model gốc
+                entry = (model, model)
+        _engine_models[key] = entry
+    return entry[1]
+
+
+_engine_models = {}
+
+
+def forget_engine_models(model):
+    """Bỏ các bản làm phẳng của model khỏi cache, trả về danh sách các bản đó"""
+    removed = []
+    for key in [k for k, (m, _) in _engine_models.items() if m is model]:
+        removed.append(_engine_models.pop(key)[1])
+    return removed
+
+
+# ============================================================
+# PREDICTOR DÙNG MẢNG PHẲNG (thay cho model pickle)
+# ============================================================
+class ArrayForestModel:
+    """Predictor tương thích model.predict(df) của Pipeline sklearn"""
+
+    def __init__(self, arrays, meta, preprocessor=None, engine="per_tree"):
+        if engine not in ("per_tree", "levelwise"):
+            raise ValueError(f"Engine không hợp lệ cho ArrayForestModel: {engine}")
+        self.arrays = arrays
+        self.meta = meta
+        self.preprocessor = preprocessor
+        self.engine = engine
+
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.left = arrays["left"]
+        self.right = arrays["right"]
+        self.value = arrays["value"]
+        self.missing_left = arrays["missing_left"]
+        self.tree_offsets = arrays["tree_offsets"]
+        self.tree_depths = arrays["tree_depths"]
+        self._children = None
+
+    @property
+    def n_trees(self):
+        return int(self.meta["n_trees"])
+
+    @property
+    def nbytes(self):
+        return int(sum(a.nbytes for a in self.arrays.values()))
+
+    def transform(self, X):
+        if self.preprocessor is not None:
+            X = self.preprocessor.transform(X)
+        if hasattr(X, "toarray"):
+            X = X.toarray()
+        return np.asarray(X, dtype=np.float32)
+
+    def apply_tree(self, X, tree):
+        # Chỉ số node lá (toàn cục) của cây `tree` cho từng dòng của X đã transform
+        rows = np.arange(X.shape[0])
+        node = np.full(X.shape[0], self.tree_offsets[tree], dtype=np.int32)
+        for _ in range(int(self.tree_depths[tree])):
+            # feature = -1 tại lá: đọc tạm cột cuối, kết quả không ảnh hưởng vì lá trỏ về chính nó
+            x = X[rows, self.feature[node]]
+            go_left = (x <= self.threshold[node]) | (np.isnan(x) & self.missing_left[node])
+            node = np.where(go_left, self.left[node], self.right[node])
+        return node
+
+    def with_engine(self, engine):
+        """Cùng mảng (không copy), khác engine"""
+        return ArrayForestModel(self.arrays, self.meta, self.preprocessor, engine)
+
+    def apply_levelwise(self, X):
+        # Ma trận (dòng x cây) chỉ số node lá: mỗi tầng 1 lượt gather trên toàn bộ ma trận
+        n_rows, n_features = X.shape
+        n_trees = self.n_trees
+        X = np.ascontiguousarray(X)
+
+        node = np.repeat(self.tree_offsets[None, :n_trees].astype(np.int32), n_rows, axis=0)
+        # Vị trí đầu dòng trong X.ravel(); feature = -1 tại lá đọc nhầm ô khác nhưng lá trỏ về chính nó
+        row_start = np.arange(n_rows, dtype=np.int64)[:, None] * n_features
+        flat = X.ravel()
+        has_missing = bool(self.missing_left.any())
+
+        for _ in range(int(self.tree_depths.max()) if n_trees else 0):
+            x = flat[row_start + self.feature[node]]
+            go_left = x <= self.threshold[node]
+            if has_missing:
+                go_left |= np.isnan(x) & self.missing_left[node]
+            # children[2 * node] = left, children[2 * node + 1] = right: 1 lượt gather thay cho 2
+            node = self.children[2 * node + ~go_left]
+        return node
+
+    @property
+    def children(self):
+        # Tạo khi cần (bản sao riêng của left/right, chỉ dùng cho levelwise)
+        if self._children is None:
+            self._children = np.stack([self.left, self.right], axis=1).ravel()
+        return self._children
+
+    def _predict_levelwise(self, X):
+        n_rows = X.shape[0]
+        total = np.empty(n_rows, dtype=np.float64)
+        chunk = max(1, LEVELWISE_MAX_CELLS // max(self.n_trees, 1))
+
+        for start in range(0, n_rows, chunk):
+            # values.T: mỗi cây là 1 dòng liền nhau, cộng dồn theo thứ tự cây như sklearn
+            # Giá trị lá có thể lưu float16 (model nén): đổi sang float64 trước khi cộng
+            values = self.value[self.apply_levelwise(X[start:start + chunk])].T.astype(np.float64, copy=False)
+            if self.meta["kind"] == "forest":
+                acc = np.zeros(values.shape[1], dtype=np.float64)
+                for tree_values in values:
+                    acc += tree_values
+                acc /= self.n_trees
+                acc += self.meta.get("value_offset", 0.0)
+            else:
+                acc = np.full(values.shape[1], self.meta["base_score"], dtype=np.float64)
+                for tree_values in values:
+                    acc += self.meta["scale"] * tree_values
+            total[start:start + chunk] = acc
+        return total
+
+    def predict_matrix(self, X):
+        if self.engine == "levelwise":
+            return self._predict_levelwise(X)
+
+        # Cộng dồn theo đúng thứ tự của sklearn để kết quả trùng khớp
+        if self.meta["kind"] == "forest":
+            total = np.zeros(X.shape[0], dtype=np.float64)
+            for tree in range(self.n_trees):
+                total += self.value[self.apply_tree(X, tree)]
+            return total / self.n_trees + self.meta.get("value_offset", 0.0)
+
+        total = np.full(X.shape[0], self.meta["base_score"], dtype=np.float64)
+        for tree in range(self.n_trees):
+            total += self.meta["scale"] * self.value[self.apply_tree(X, tree)].astype(np.float64, copy=False)
+        return total
+
+    def predict(self, X):
+        # Chia khúc để ma trận dense sau one-hot không chiếm quá nhiều bộ nhớ
+        n_rows = X.shape[0]
+        if n_rows <= PREDICT_CHUNK_ROWS:
+            return self.predict_matrix(self.transform(X))
+        rows = X.iloc if hasattr(X, "iloc") else X
+        return np.concatenate([self.predict_matrix(self.transform(rows[start:start + PREDICT_CHUNK_ROWS]))
+                               for start in range(0, n_rows, PREDICT_CHUNK_ROWS)])
+
+
+# ============================================================
+# CLI: python -m src.utils.model_arrays models/model_regression_best.pkl
+#      python -m src.utils.model_arrays --layout npy models/*.pkl
+# ============================================================
+def _dir_size(path):
+    return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export model cây / ma trận sang mảng numpy phẳng")
+    parser.add_argument("paths", nargs="*", default=["./models/model_regression_best.pkl"],
+                        help="Các file .pkl cần export (model cây, tfidf_matrix, cosine_similarity)")
+    parser.add_argument("-o", "--out", default=None, help="Thư mục output khi export 1 file (mặc định: <tên>_arrays)")
+    parser.add_argument("--layout", choices=["npz", "npy"], default="npz",
+                        help="npy: mỗi mảng một file, dùng được với MODEL_MMAP")
+    parser.add_argument("--check-data", default="./data/processed/data_motobikes_cleaned.csv",
+                        help="CSV dùng để kiểm tra dự đoán trùng khớp ('' để bỏ qua)")
+    args = parser.parse_args()
+
+    if args.out and len(args.paths) > 1:
+        parser.error("--out chỉ dùng khi export 1 file")
+
+    for path in args.paths:
+        export_one(path, args.out or compact_model_path(path), args.layout, args.check_data)
+
+
+def export_one(path, out_dir, layout, check_data):
+    start = time.perf_counter()
+    with open(path, "rb") as file:
+        obj = pickle.load(file)
+    pickle_load_s = time.perf_counter() - start
+
+    print(f"== {path}")
+    print(f"Pickle : {os.path.getsize(path) / 1e6:,.1f} MB, load {pickle_load_s:.2f}s")
+
+    if isinstance(obj, np.ndarray) or hasattr(obj, "tocsr"):
+        export_matrix_arrays(obj, out_dir, layout)
+        start = time.perf_counter()
+        load_matrix_arrays(out_dir, mmap=True)
+        print(f"Arrays : {_dir_size(out_dir) / 1e6:,.1f} MB, load (mmap) {time.perf_counter() - start:.3f}s")
+        return
+
+    model = obj
+    export_model_arrays(model, out_dir, layout)
+
+    start = time.perf_counter()
+    compact = load_model_arrays(out_dir)
+    compact_load_s = time.perf_counter() - start
+
+    print(f"Arrays : {_dir_size(out_dir) / 1e6:,.1f} MB, load {compact_load_s:.2f}s "
+          f"({compact.n_trees} cây, {compact.meta['n_nodes']:,} node)")
+
+    if check_data:
+        import pandas as pd
+
+        features = ['thuong_hieu', 'dong_xe', 'nam_dang_ky', 'so_km_da_di',
+                    'tinh_trang', 'loai_xe', 'dung_tich_xe', 'xuat_xu']
+        df = pd.read_csv(check_data)[features]
+        expected = model.predict(df)
+        got = compact.predict(df)
+        print(f"Kiểm tra {len(df):,} dòng: lệch tối đa {np.max(np.abs(expected - got)):.3e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from src.utils.prediction import FEATURES, NUMERIC_COLS, predict_price_batch # type: ignore
+
+# ============================================================
+# BẢNG TÍNH SẴN TỪ 1 MODEL (LƯU / LOAD / KIỂM TRA CHỮ KÝ)
+# ============================================================
+#
+# Các bảng offline (price_lattice, cascade, explanations, conformal,
+# quantile_forest) đều là 1 file .npz các mảng, kèm "chữ ký" của model đã
+# dùng để build: vài dòng input (probes) + output gốc của model trên các dòng
+# đó (probe_values). Khi load, chạy lại model đang dùng trên probes: lệch ->
+# bảng được build từ model khác, app bỏ qua bảng.
+
+N_PROBES = 8
+
+
+def model_signature(probes, model):
+    """{'probes', 'probe_values'} của các dòng probes (DataFrame có FEATURES) để lưu cùng bảng"""
+    probes = probes[FEATURES]
+    return {
+        'probes': probes.astype(str).to_numpy(dtype=str),
+        'probe_values': predict_price_batch(probes, model, inverse_log=False),
+    }
+
+
+def sample_signature(df, model, n_probes=N_PROBES, seed=0):
+    """Chữ ký từ n_probes dòng ngẫu nhiên của df"""
+    return model_signature(df.sample(min(n_probes, len(df)), random_state=seed), model)
+
+
+def signature_matches(arrays, model, atol=1e-4):
+    """Model cho lại đúng probe_values trên probes (bảng thiếu chữ ký -> False)"""
+    if 'probes' not in arrays or 'probe_values' not in arrays or arrays['probes'].shape[1:] != (len(FEATURES),):
+        return False
+    probes = pd.DataFrame(arrays['probes'], columns=FEATURES)
+    for c in NUMERIC_COLS:
+        probes[c] = pd.to_numeric(probes[c], errors='coerce')
+    got = predict_price_batch(probes, model, inverse_log=False)
+    return bool(np.allclose(got, arrays['probe_values'], atol=atol))
+
+
+def save_arrays(arrays, path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    np.savez_compressed(path, **arrays)
+
+
+def load_arrays(path):
+    """dict mảng của file .npz; không có file -> None"""
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as npz:
+        return {k: npz[k] for k in npz.files}
+
+
+def load_checked(load_fn, path, model=None, *args):
+    """load_fn(path, *args); không có file / build từ model khác -> None"""
+    table = load_fn(path, *args)
+    if table is not None and model is not None and not table.matches(model):
+        return None
+    return table
+
+
+class ModelArtifact:
+    """Bảng tính sẵn: self.arrays chứa chữ ký của model đã dùng để build"""
+
+    def matches(self, model, atol=1e-4):
+        """Kiểm tra bảng được build từ đúng model này"""
+        return signature_matches(self.arrays, model, atol)
@@ -0,0 +1,286 @@
+import argparse
+import csv
+import itertools
+import os
+import pickle
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.utils.model_arrays import ( # type: ignore
+    ArrayForestModel, flatten_trees, load_artifact, prune_arrays, read_model,
+    save_model_arrays, split_pipeline,
+)
+from src.utils.prediction import FEATURES, predict_price, predict_price_batch # type: ignore
+
+# ============================================================
+# NÉN MODEL CÂY + BÁO CÁO PARETO (KÍCH THƯỚC / ĐỘ TRỄ / ĐỘ CHÍNH XÁC)
+# ============================================================
+#
+# Các phép nén chạy trên mảng đã làm phẳng (model_arrays.flatten_trees),
+# kết quả là thư mục export bình thường -> load_model / read_model đọc được:
+#   keep_trees      -> giữ n cây đầu
+#   limit_depth     -> cắt cây ở độ sâu d, node bị cắt thành lá (giá trị = trung bình tại node)
+#   float16_leaves  -> giá trị lá float16 (forest: lưu phần lệch so với value_offset)
+#   merge_subtrees  -> gộp các cây con giống hệt nhau (kể cả giữa các cây) thành 1
+#
+# Model sau merge_subtrees không còn là các cây rời nhau nên không dùng để
+# chia shard theo hãng (brand_shards) được.
+
+DEFAULT_OUT_DIR = "./models/compressed"
+REPORT_FILE = "pareto.csv"
+LATENCY_ROWS = 300
+
+
+def model_to_arrays(model):
+    """(arrays, meta, preprocessor) của Pipeline sklearn cây hoặc ArrayForestModel"""
+    if isinstance(model, ArrayForestModel):
+        return {k: np.asarray(v) for k, v in model.arrays.items()}, dict(model.meta), model.preprocessor
+    preprocessor, estimator = split_pipeline(model)
+    arrays, meta = flatten_trees(estimator)
+    return arrays, meta, preprocessor
+
+
+def keep_trees(arrays, meta, n_trees):
+    """Chỉ giữ n_trees cây đầu"""
+    if meta.get("merged_subtrees"):
+        raise ValueError("Không bớt cây được sau khi đã gộp cây con")
+    n_trees = min(int(n_trees), int(meta["n_trees"]))
+    end = int(arrays["tree_offsets"][n_trees])
+    out = {k: arrays[k][:end] for k in ("feature", "threshold", "left", "right", "value", "missing_left")}
+    out["tree_offsets"] = arrays["tree_offsets"][:n_trees + 1].copy()
+    out["tree_depths"] = arrays["tree_depths"][:n_trees].copy()
+    return out, dict(meta, n_trees=n_trees, n_nodes=end)
+
+
+def node_depths(arrays):
+    """Độ sâu của từng node (gốc = 0)"""
+    feature, left, right = arrays["feature"], arrays["left"], arrays["right"]
+    depth = np.zeros(len(feature), dtype=np.int32)
+    frontier = arrays["tree_offsets"][:-1].astype(np.int64)
+    level = 0
+    while frontier.size:
+        depth[frontier] = level
+        internal = frontier[feature[frontier] >= 0]
+        frontier = np.concatenate([left[internal], right[internal]]).astype(np.int64)
+        level += 1
+    return depth
+
+
+def limit_depth(arrays, meta, max_depth):
+    """Cắt mọi cây ở độ sâu max_depth; node ở độ sâu đó thành lá"""
+    if meta.get("merged_subtrees"):
+        raise ValueError("Không cắt độ sâu được sau khi đã gộp cây con")
+    cut = (node_depths(arrays) >= max_depth) & (arrays["feature"] >= 0)
+    nodes = np.arange(len(cut), dtype=np.int32)
+
+    arrays = dict(arrays)
+    arrays["feature"] = np.where(cut, -1, arrays["feature"]).astype(np.int32)
+    arrays["threshold"] = np.where(cut, np.float32(np.inf), arrays["threshold"]).astype(np.float32)
+    arrays["left"] = np.where(cut, nodes, arrays["left"]).astype(np.int32)
+    arrays["right"] = np.where(cut, nodes, arrays["right"]).astype(np.int32)
+    # Bỏ các node không còn đến được (prune không cố định feature nào)
+    return prune_arrays(arrays, meta, {})
+
+
+def float16_leaves(arrays, meta):
+    """Giá trị node lưu float16; forest trừ đi giá trị trung bình để giữ độ chính xác"""
+    value = arrays["value"].astype(np.float64)
+    offset = float(meta.get("value_offset", 0.0))
+    if meta["kind"] == "forest":
+        leaves = value[arrays["feature"] < 0]
+        shift = float(leaves.mean()) if leaves.size else 0.0
+        value, offset = value - shift, offset + shift
+
+    arrays = dict(arrays, value=value.astype(np.float16))
+    return arrays, dict(meta, value_offset=offset, value_dtype="float16")
+
+
+def merge_subtrees(arrays, meta):
+    """Gộp các cây con giống hệt nhau (cùng feature, ngưỡng, con, giá trị lá) thành 1 node"""
+    feature, threshold = arrays["feature"], arrays["threshold"]
+    left, right, value = arrays["left"], arrays["right"], arrays["value"]
+    missing_left = arrays["missing_left"]
+    n_nodes = len(feature)
+    internal = feature >= 0
+    roots = arrays["tree_offsets"][:-1].astype(np.int64)
+
+    # Chiều cao (lá = 0): xử lý từ dưới lên, con luôn được gộp trước cha
+    height = np.zeros(n_nodes, dtype=np.int32)
+    for _ in range(int(arrays["tree_depths"].max()) if len(roots) else 0):
+        height[internal] = 1 + np.maximum(height[left[internal]], height[right[internal]])
+
+    canon = np.arange(n_nodes, dtype=np.int64)
+    is_root = np.zeros(n_nodes, dtype=bool)
+    is_root[roots] = True
+    value_bits = value.astype(np.float64).view(np.int64)
+
+    for h in range(int(height.max()) + 1 if n_nodes else 0):
+        nodes = np.flatnonzero((height == h) & ~is_root)
+        if not nodes.size:
+            continue
+        leaf = ~internal[nodes]
+        keys = np.stack([
+            feature[nodes].astype(np.int64),
+            threshold[nodes].astype(np.float32).view(np.int32).astype(np.int64),
+            np.where(leaf, -1, canon[left[nodes]]),
+            np.where(leaf, -1, canon[right[nodes]]),
+            missing_left[nodes].astype(np.int64),
+            # Giá trị của node trong chỉ dùng khi cắt độ sâu -> chỉ so giá trị lá
+            np.where(leaf, value_bits[nodes], 0),
+        ], axis=1)
+        _, first, inverse = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+        canon[nodes] = nodes[first][inverse.ravel()]
+
+    keep = canon == np.arange(n_nodes)
+    new_index = (np.cumsum(keep) - 1).astype(np.int32)
+    merged = {
+        "feature": feature[keep],
+        "threshold": threshold[keep],
+        "left": np.where(internal[keep], new_index[canon[left[keep]]], new_index[keep]).astype(np.int32),
+        "right": np.where(internal[keep], new_index[canon[right[keep]]], new_index[keep]).astype(np.int32),
+        "value": value[keep],
+        "missing_left": missing_left[keep],
+        # Gốc các cây không bị gộp -> tree_offsets[:-1] vẫn là gốc của từng cây
+        "tree_offsets": np.append(new_index[roots], int(keep.sum())).astype(np.int64),
+        "tree_depths": arrays["tree_depths"].copy(),
+    }
+    return merged, dict(meta, n_nodes=int(keep.sum()), merged_subtrees=True)
+
+
+def compress(arrays, meta, n_trees=None, max_depth=None, fp16=False, merge=False):
+    """Áp dụng các phép nén theo thứ tự: bớt cây -> cắt độ sâu -> float16 -> gộp cây con"""
+    if n_trees is not None:
+        arrays, meta = keep_trees(arrays, meta, n_trees)
+    if max_depth is not None:
+        arrays, meta = limit_depth(arrays, meta, max_depth)
+    if fp16:
+        arrays, meta = float16_leaves(arrays, meta)
+    if merge:
+        arrays, meta = merge_subtrees(arrays, meta)
+    return arrays, meta
+
+
+def variant_name(n_trees=None, max_depth=None, fp16=False, merge=False):
+    parts = [f"t{n_trees}" if n_trees else "", f"d{max_depth}" if max_depth else "",
+             "f16" if fp16 else "", "merge" if merge else ""]
+    return "_".join(p for p in parts if p) or "full"
+
+
+# ============================================================
+# ĐÁNH GIÁ
+# ============================================================
+def _dir_size(path):
+    return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+
+
+def evaluate_variant(path, holdout, reference=None):
+    """Load thư mục export, đo kích thước / thời gian load / sai số / độ trễ 1 dòng"""
+    start = time.perf_counter()
+    model = load_artifact(path)
+    load_s = time.perf_counter() - start
+
+    raw = predict_price_batch(holdout[FEATURES], model, inverse_log=False)
+    pred = np.expm1(raw) / 1e6 # triệu VND, cùng đơn vị cột gia
+    actual = holdout['gia'].to_numpy(dtype=np.float64)
+    result = {
+        'size_mb': _dir_size(path) / 1e6,
+        'load_ms': load_s * 1e3,
+        'n_nodes': model.meta['n_nodes'],
+        'mae': float(np.mean(np.abs(pred - actual))),
+        'mape': float(np.mean(np.abs(pred / actual - 1))),
+        'r2': float(1 - np.sum((pred - actual) ** 2) / np.sum((actual - actual.mean()) ** 2)),
+        # Lệch so với model gốc (độ "trung thành" của bản nén)
+        'vs_full': float(np.mean(np.abs(pred / reference - 1))) if reference is not None else 0.0,
+    }
+
+    records = holdout[FEATURES].head(LATENCY_ROWS).to_dict('records')
+    predict_price(records[0], model)
+    times = []
+    for r in records:
+        start = time.perf_counter()
+        predict_price(r, model)
+        times.append(time.perf_counter() - start)
+    result['p50_ms'] = float(np.percentile(times, 50) * 1e3)
+    result['p99_ms'] = float(np.percentile(times, 99) * 1e3)
+    return result, pred
+
+
+def pareto_front(results, objectives=('size_mb', 'p50_ms', 'mape')):
+    """Tên các variant không bị variant khác tốt hơn hoặc bằng ở mọi tiêu chí (nhỏ hơn = tốt hơn)"""
+    front = set()
+    for a in results:
+        dominated = any(
+            all(b[o] <= a[o] for o in objectives) and any(b[o] < a[o] for o in objectives)
+            for b in results if b is not a
+        )
+        if not dominated:
+            front.add(a['name'])
+    return front
+
+
+# ============================================================
+# CLI: python -m src.utils.model_compression
+# ============================================================
+def main():
+    parser = argparse.ArgumentParser(description="Tạo các bản nén của model cây và báo cáo Pareto")
+    parser.add_argument("model", nargs="?", default="./models/model_regression_best.pkl")
+    parser.add_argument("--data", default="./data/processed/data_motobikes_cleaned.csv")
+    parser.add_argument("-o", "--out", default=DEFAULT_OUT_DIR)
+    parser.add_argument("--trees", type=float, nargs="*", default=[0.5, 0.25],
+                        help="Số cây giữ lại (< 1: tỉ lệ so với model gốc)")
+    parser.add_argument("--depths", type=int, nargs="*", default=[12, 8])
+    parser.add_argument("--holdout", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--layout", choices=["npz", "npy"], default="npz")
+    args = parser.parse_args()
+
+    model = read_model(args.model, prefer_compact=False)
+    arrays, meta, preprocessor = model_to_arrays(model)
+    n_total = int(meta["n_trees"])
+    tree_options = sorted({max(1, int(round(t * n_total))) if t < 1 else int(t) for t in args.trees} - {n_total})
+
+    df = pd.read_csv(args.data).dropna(subset=['gia'])
+    holdout = df[df['gia'] > 0].sample(frac=args.holdout, random_state=args.seed)
+    print(f"Model: {n_total} cây, {meta['n_nodes']:,} node; holdout {len(holdout):,} tin đăng")
+
+    if os.path.isdir(args.out):
+        shutil.rmtree(args.out)
+    os.makedirs(args.out)
+
+    results, reference = [], None
+    grid = itertools.product([None] + tree_options, [None] + sorted(args.depths, reverse=True), [False, True], [False, True])
+    for n_trees, max_depth, fp16, merge in grid:
+        name = variant_name(n_trees, max_depth, fp16, merge)
+        variant_arrays, variant_meta = compress(arrays, meta, n_trees, max_depth, fp16, merge)
+        path = save_model_arrays(os.path.join(args.out, name), variant_arrays, variant_meta, preprocessor, args.layout)
+
+        result, pred = evaluate_variant(path, holdout, reference)
+        if reference is None:
+            reference = pred # variant đầu tiên là "full"
+        results.append(dict(result, name=name))
+
+    front = pareto_front(results)
+    for r in results:
+        r['pareto'] = r['name'] in front
+
+    columns = ['name', 'pareto', 'size_mb', 'load_ms', 'n_nodes', 'p50_ms', 'p99_ms', 'mae', 'mape', 'r2', 'vs_full']
+    with open(os.path.join(args.out, REPORT_FILE), "w", newline="", encoding="utf-8") as file:
+        writer = csv.DictWriter(file, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows({c: r[c] for c in columns} for r in results)
+
+    print(f"\n{'':2}{'variant':<22}{'MB':>8}{'load ms':>9}{'p50 ms':>8}{'p99 ms':>8}"
+          f"{'MAE':>8}{'MAPE':>8}{'R²':>7}{'lệch gốc':>10}")
+    for r in sorted(results, key=lambda r: r['size_mb']):
+        mark = "★" if r['pareto'] else ""
+        print(f"{mark:<2}{r['name']:<22}{r['size_mb']:>8.2f}{r['load_ms']:>9.1f}{r['p50_ms']:>8.2f}{r['p99_ms']:>8.2f}"
+              f"{r['mae']:>8.2f}{r['mape']:>8.1%}{r['r2']:>7.3f}{r['vs_full']:>10.2%}")
+    print(f"\n★ = Pareto (kích thước, p50, MAPE). Báo cáo: {os.path.join(args.out, REPORT_FILE)}")
+    print("Dùng 1 bản nén: đặt REGRESSION_MODEL = <thư mục variant> hoặc copy thành models/model_regression_best_arrays")
+
+
+if __name__ == "__main__":
+    main()
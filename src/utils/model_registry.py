@@ -0,0 +1,321 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from src.config import MODEL_REGISTRY, REGISTRY_CHECK_SECONDS # type: ignore
+from src.utils.model_warmup import READY, FAILED # type: ignore
+from src.utils.prediction import FEATURES # type: ignore
+
+# ============================================================
+# REGISTRY CÁC VERSION MODEL + ĐỔI MODEL KHÔNG CẦN RESTART
+# ============================================================
+#
+#   models/registry/
+#       CURRENT                 -> tên version đang dùng (ghi bằng os.replace, atomic)
+#       <version>/
+#           manifest.json       -> version, sha256, metrics, features, thời điểm tạo
+#           model.pkl           -> model (có thể export thêm model_arrays/, model_shards/)
+#           price_lattice.npz   -> bảng giá của version này (tùy chọn)
+#           cascade.npz         -> tầng rẻ của cascade học từ version này (tùy chọn)
+#
+# Worker kiểm tra CURRENT (os.stat) tối đa mỗi REGISTRY_CHECK_SECONDS giây.
+# Khi CURRENT đổi: version mới được load + warm-up trên thread nền, request
+# vẫn dùng version cũ; load xong mới đổi sang. Version cũ được giải phóng
+# (cache, micro-batcher...) khi các lần dự đoán đang dùng nó kết thúc.
+
+logger = logging.getLogger(__name__)
+
+CURRENT_FILE = "CURRENT"
+MANIFEST_FILE = "manifest.json"
+MODEL_FILE = "model.pkl"
+LATTICE_FILE = "price_lattice.npz"
+CASCADE_FILE = "cascade.npz"
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def version_dir(version, registry_dir=MODEL_REGISTRY):
+    return os.path.join(str(registry_dir), version)
+
+
+def version_model_path(version, registry_dir=MODEL_REGISTRY):
+    return os.path.join(version_dir(version, registry_dir), MODEL_FILE)
+
+
+def read_manifest(version, registry_dir=MODEL_REGISTRY):
+    with open(os.path.join(version_dir(version, registry_dir), MANIFEST_FILE), encoding="utf-8") as file:
+        return json.load(file)
+
+
+def list_versions(registry_dir=MODEL_REGISTRY):
+    """Manifest của mọi version, cũ -> mới"""
+    if not os.path.isdir(registry_dir):
+        return []
+    manifests = []
+    for name in os.listdir(registry_dir):
+        if os.path.exists(os.path.join(str(registry_dir), name, MANIFEST_FILE)):
+            manifests.append(read_manifest(name, registry_dir))
+    return sorted(manifests, key=lambda m: m['created_at'])
+
+
+def current_version(registry_dir=MODEL_REGISTRY):
+    """Version đang được promote, None nếu registry chưa có"""
+    try:
+        with open(os.path.join(str(registry_dir), CURRENT_FILE), encoding="utf-8") as file:
+            return file.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def register_model(model_path, registry_dir=MODEL_REGISTRY, version=None, metrics=None,
+                   features=None, lattice_path=None, cascade_path=None):
+    """Copy model vào registry thành 1 version mới (chưa promote)"""
+    version = version or datetime.now().strftime("v%Y%m%d-%H%M%S")
+    target = version_dir(version, registry_dir)
+    if os.path.exists(target):
+        raise FileExistsError(f"Version {version} đã tồn tại")
+
+    # Ghi vào thư mục tạm rồi đổi tên: worker không bao giờ thấy version ghi dở
+    tmp = target + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    shutil.copyfile(model_path, os.path.join(tmp, MODEL_FILE))
+    if lattice_path:
+        shutil.copyfile(lattice_path, os.path.join(tmp, LATTICE_FILE))
+    if cascade_path:
+        shutil.copyfile(cascade_path, os.path.join(tmp, CASCADE_FILE))
+
+    manifest = {
+        'version': version,
+        'created_at': datetime.now().isoformat(timespec="seconds"),
+        'source': os.path.abspath(model_path),
+        'sha256': file_sha256(os.path.join(tmp, MODEL_FILE)),
+        'metrics': metrics or {},
+        'features': list(features or FEATURES),
+    }
+    with open(os.path.join(tmp, MANIFEST_FILE), "w", encoding="utf-8") as file:
+        json.dump(manifest, file, ensure_ascii=False, indent=2)
+
+    os.replace(tmp, target)
+    return manifest
+
+
+def verify_version(version, registry_dir=MODEL_REGISTRY):
+    manifest = read_manifest(version, registry_dir)
+    actual = file_sha256(version_model_path(version, registry_dir))
+    if actual != manifest['sha256']:
+        raise ValueError(f"Checksum của version {version} không khớp manifest ({actual} != {manifest['sha256']})")
+    if manifest['features'] != FEATURES:
+        raise ValueError(f"Version {version} dùng bộ feature khác app: {manifest['features']}")
+    return manifest
+
+
+def promote(version, registry_dir=MODEL_REGISTRY):
+    """Đổi CURRENT sang version (atomic); các worker đang chạy tự nhận ở request kế tiếp"""
+    verify_version(version, registry_dir)
+    pointer = os.path.join(str(registry_dir), CURRENT_FILE)
+    tmp = f"{pointer}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as file:
+        file.write(version)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp, pointer)
+
+
+# ============================================================
+# HANDLE DÙNG TRONG APP: LUÔN TRỎ TỚI VERSION ĐANG PROMOTE
+# ============================================================
+class ModelHandle:
+    """Giao diện giống ModelWarmup (ready, state, model, lattice...) + tự đổi version"""
+
+    def __init__(self, make_warmup, fallback_path, registry_dir=MODEL_REGISTRY,
+                 check_seconds=REGISTRY_CHECK_SECONDS, on_release=None):
+        # make_warmup(model_path, lattice_path, cascade_path) -> ModelWarmup chưa start
+        self.make_warmup = make_warmup
+        self.fallback_path = str(fallback_path)
+        self.registry_dir = str(registry_dir)
+        self.check_seconds = check_seconds
+        self.on_release = on_release
+
+        self.version = None
+        self._current = None
+        self._pending = None
+        self._pending_version = None
+        self._retired = []
+        self._in_flight = {}
+        self._pointer_stat = None
+        self._last_check = 0.0
+        self._lock = threading.RLock()
+
+    # ---------- Theo dõi CURRENT ----------
+    def _pointer(self):
+        try:
+            st = os.stat(os.path.join(self.registry_dir, CURRENT_FILE))
+            return (st.st_ino, st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            return None
+
+    def _paths(self, version):
+        if version is None:
+            return self.fallback_path, None, None
+        extras = [os.path.join(version_dir(version, self.registry_dir), name) for name in (LATTICE_FILE, CASCADE_FILE)]
+        return (version_model_path(version, self.registry_dir),
+                *(path if os.path.exists(path) else None for path in extras))
+
+    def _check(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._last_check < self.check_seconds:
+            return
+        self._last_check = now
+
+        pointer = self._pointer()
+        if not force and pointer == self._pointer_stat:
+            return
+        self._pointer_stat = pointer
+
+        version = current_version(self.registry_dir)
+        if self._current is not None and version == self.version:
+            # Promote lại version đang dùng: bỏ version đang load dở (nếu có)
+            self._pending, self._pending_version = None, None
+            return
+        if self._current is not None and version == self._pending_version:
+            return
+
+        warmup = self.make_warmup(*self._paths(version)).start()
+        if self._current is None:
+            self._current, self.version = warmup, version
+        else:
+            # Version mới load nền, trong lúc đó vẫn phục vụ bằng version cũ
+            logger.info("Phát hiện version mới %s, đang load nền", version)
+            self._pending, self._pending_version = warmup, version
+
+    def _maybe_swap(self):
+        pending = self._pending
+        if pending is None or pending.state not in (READY, FAILED):
+            return
+        if pending.state == READY:
+            logger.info("Đổi model: %s -> %s", self.version, self._pending_version)
+            self._retired.append(self._current)
+            self._current, self.version = pending, self._pending_version
+            self._release_retired()
+        else:
+            logger.error("Version %s load thất bại, giữ %s: %s", self._pending_version, self.version, pending.error)
+        self._pending, self._pending_version = None, None
+
+    def _release_retired(self):
+        for warmup in list(self._retired):
+            if self._in_flight.get(id(warmup), 0) == 0:
+                self._retired.remove(warmup)
+                self._in_flight.pop(id(warmup), None)
+                if self.on_release is not None and warmup.model is not None:
+                    self.on_release(warmup.model)
+                warmup.model, warmup.lattice = None, None
+
+    def start(self):
+        with self._lock:
+            self._check(force=True)
+        return self
+
+    def refresh(self):
+        with self._lock:
+            self._check()
+            self._maybe_swap()
+            return self._current
+
+    # ---------- Giao diện giống ModelWarmup ----------
+    @property
+    def ready(self):
+        return self.refresh().ready
+
+    @property
+    def state(self):
+        return self.refresh().state
+
+    @property
+    def error(self):
+        return self.refresh().error
+
+    @property
+    def seconds(self):
+        return self.refresh().seconds
+
+    @property
+    def model(self):
+        return self.refresh().model
+
+    @property
+    def lattice(self):
+        return self.refresh().lattice
+
+    def wait(self, timeout=None):
+        return self.refresh().wait(timeout)
+
+    @contextmanager
+    def acquire(self):
+        """with handle.acquire() as (model, lattice): ... -> version không bị giải phóng giữa chừng"""
+        with self._lock:
+            warmup = self.refresh()
+            self._in_flight[id(warmup)] = self._in_flight.get(id(warmup), 0) + 1
+        try:
+            yield warmup.wait(), warmup.lattice
+        finally:
+            with self._lock:
+                self._in_flight[id(warmup)] -= 1
+                self._release_retired()
+
+
+# ============================================================
+# CLI: python -m src.utils.model_registry register models/model_regression_best.pkl
+#      python -m src.utils.model_registry promote <version>
+# ============================================================
+def main():
+    parser = argparse.ArgumentParser(description="Quản lý các version model dự đoán giá")
+    parser.add_argument("--registry", default=str(MODEL_REGISTRY))
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_register = sub.add_parser("register", help="Thêm model vào registry (chưa dùng ngay)")
+    p_register.add_argument("model")
+    p_register.add_argument("--version", default=None)
+    p_register.add_argument("--metrics", default="{}", help='JSON, vd. \'{"r2": 0.91, "mae": 1.2}\'')
+    p_register.add_argument("--lattice", default=None, help="Bảng giá build từ model này")
+    p_register.add_argument("--cascade", default=None, help="Bảng cascade học từ model này")
+    p_register.add_argument("--promote", action="store_true", help="Promote ngay sau khi thêm")
+
+    p_promote = sub.add_parser("promote", help="Chuyển các worker đang chạy sang version này")
+    p_promote.add_argument("version")
+
+    sub.add_parser("list", help="Liệt kê các version")
+    args = parser.parse_args()
+
+    if args.command == "register":
+        manifest = register_model(args.model, args.registry, args.version, json.loads(args.metrics),
+                                  lattice_path=args.lattice, cascade_path=args.cascade)
+        print(f"Đã thêm version {manifest['version']} (sha256 {manifest['sha256'][:12]}...)")
+        if args.promote:
+            promote(manifest['version'], args.registry)
+            print(f"Đã promote {manifest['version']}")
+    elif args.command == "promote":
+        promote(args.version, args.registry)
+        print(f"Đã promote {args.version}")
+    else:
+        current = current_version(args.registry)
+        for m in list_versions(args.registry):
+            mark = "*" if m['version'] == current else " "
+            print(f"{mark} {m['version']:<20} {m['created_at']}  {m['sha256'][:12]}  {json.dumps(m['metrics'])}")
+
+
+if __name__ == "__main__":
+    main()
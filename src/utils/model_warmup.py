@@ -0,0 +1,91 @@
+import logging
+import threading
+import time
+
+from src.utils.prediction import predict_price, predict_price_batch # type: ignore
+
+# ============================================================
+# KHỞI ĐỘNG MODEL TRÊN THREAD NỀN
+# ============================================================
+#
+# Load model (và bảng giá) trên 1 thread riêng ngay khi app chạy, rồi
+# dự đoán thử 1 xe mẫu để các phần khởi tạo lười (làm phẳng cây, encoder
+# biên dịch, thread pool...) xong trước request thật. Trong lúc đó trang
+# vẫn render form bình thường và kiểm tra `ready` trước khi dự đoán.
+
+logger = logging.getLogger(__name__)
+
+PENDING, LOADING, READY, FAILED = "pending", "loading", "ready", "failed"
+
+# Xe mẫu dùng để chạy thử predict
+WARMUP_VEHICLE = {
+    'thuong_hieu': 'Honda',
+    'dong_xe': 'Vision',
+    'nam_dang_ky': 2019,
+    'so_km_da_di': 12000,
+    'tinh_trang': 'Đã sử dụng',
+    'loai_xe': 'Tay ga',
+    'dung_tich_xe': '100 - 175 cc',
+    'xuat_xu': 'Việt Nam',
+}
+
+
+class ModelWarmup:
+    """Trạng thái load model nền: pending -> loading -> ready / failed"""
+
+    def __init__(self, load_model_fn, load_lattice_fn=None, name="model-warmup"):
+        self.load_model_fn = load_model_fn
+        self.load_lattice_fn = load_lattice_fn
+        self.name = name
+
+        self.state = PENDING
+        self.model = None
+        self.lattice = None
+        self.error = None
+        self.seconds = None
+
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def ready(self):
+        return self.state == READY
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self.state = LOADING
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+        return self
+
+    def wait(self, timeout=None):
+        """Chờ load xong -> model; lỗi khi load được raise lại ở đây"""
+        self.start()
+        if not self._done.wait(timeout):
+            raise TimeoutError(f"Model chưa sẵn sàng sau {timeout}s")
+        if self.state == FAILED:
+            raise RuntimeError(f"Load model thất bại: {self.error}") from self.error
+        return self.model
+
+    def _run(self):
+        start = time.perf_counter()
+        try:
+            model = self.load_model_fn()
+            # Chạy thử cả đường 1 xe và đường theo lô
+            predict_price(WARMUP_VEHICLE, model)
+            predict_price_batch([WARMUP_VEHICLE], model)
+            lattice = self.load_lattice_fn(model) if self.load_lattice_fn is not None else None
+
+            self.model, self.lattice = model, lattice
+            self.state = READY
+        except Exception as e:
+            logger.exception("Khởi động model thất bại")
+            self.error = e
+            self.state = FAILED
+        finally:
+            self.seconds = time.perf_counter() - start
+            self._done.set()
+
+        logger.info("Khởi động model: %s sau %.2fs", self.state, self.seconds)
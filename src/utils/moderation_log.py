@@ -0,0 +1,239 @@
+import argparse
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+
+from src.utils.dataset_catalog import COPY_ON_WRITE # type: ignore
+
+# ============================================================
+# LOG KIỂM DUYỆT TIN ĐĂNG (APPEND-ONLY) + GỘP ĐỊNH KỲ
+# ============================================================
+#
+# Mỗi lần duyệt / yêu cầu sửa / từ chối = ghi thêm 1 bản ghi 24 byte
+# (thời điểm, id tin đăng, trang_thai mới) vào cuối file log của bảng:
+# O(1), không đọc / ghi lại dữ liệu cũ. Bản ghi ghi dở khi crash (file không
+# chia hết cho 24 byte) bị bỏ qua và cắt đi ở lần ghi sau.
+#
+# Trạng thái hiện tại = snapshot (bảng trong listing store) + replay log theo
+# đúng thứ tự ghi: mỗi (id, cột) lấy giá trị của sự kiện cuối cùng gán cột đó
+# (vd duyệt rồi yêu cầu sửa -> anomaly_flag của lần duyệt, trang_thai của lần
+# yêu cầu sửa), tin đã bị từ chối luôn bị xóa. Khi log vượt ngưỡng, 1 thread nền
+# gộp log vào snapshot: đổi tên log -> .compacting, ghi vào snapshot, xóa
+# file .compacting. Replay / gộp lại cùng sự kiện cho cùng kết quả, nên crash
+# giữa chừng chỉ cần gộp lại file .compacting còn sót.
+
+RECORD = struct.Struct('<dqB7x')  # thời điểm (float64), id tin đăng (int64), trang_thai (uint8)
+RECORD_DTYPE = np.dtype({'names': ['ts', 'row_id', 'status'], 'formats': ['<f8', '<i8', 'u1'],
+                         'offsets': [0, 8, 16], 'itemsize': RECORD.size})
+
+# Thao tác trên trang Quản lý tin đăng -> trang_thai mới
+ACTIONS = {'approve': 0, 'request_edit': 4, 'reject': 3}
+REJECTED = ACTIONS['reject']
+
+# Các cột được gán theo trang_thai; tin bị từ chối bị xóa khỏi danh sách (như trước)
+STATUS_VALUES = {
+    ACTIONS['approve']: {'anomaly_flag': 0, 'trang_thai': 0},
+    ACTIONS['request_edit']: {'trang_thai': 4},
+}
+STATUS_COLUMNS = sorted({column for values in STATUS_VALUES.values() for column in values})
+
+
+def _file_size(path):
+    try:
+        return os.stat(path).st_size
+    except FileNotFoundError:
+        return 0
+
+
+def read_records(path):
+    """Các bản ghi hoàn chỉnh trong file log (mảng numpy có cấu trúc), không có file -> rỗng"""
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return np.empty(0, dtype=RECORD_DTYPE)
+    return np.frombuffer(data[:len(data) - len(data) % RECORD.size], dtype=RECORD_DTYPE)
+
+
+def latest_values(records):
+    """Kết quả replay các bản ghi theo thứ tự:
+    {'rejected': ids bị từ chối, 'values': {(cột, giá trị): ids}} - mỗi (id, cột) lấy sự kiện cuối gán cột đó"""
+    values = {}
+    for column in STATUS_COLUMNS:
+        statuses = [s for s, assigned in STATUS_VALUES.items() if column in assigned]
+        events = records[np.isin(records['status'], statuses)][::-1]
+        # np.unique trên mảng đảo ngược: lần xuất hiện đầu = sự kiện cuối của (id, cột)
+        ids, first = np.unique(events['row_id'], return_index=True)
+        last = events['status'][first]
+        for status in np.unique(last):
+            key = (column, STATUS_VALUES[int(status)][column])
+            values[key] = np.union1d(values.get(key, ids[:0]), ids[last == status])
+    # Từ chối là trạng thái cuối: sự kiện sau đó không đưa tin trở lại
+    return {'rejected': np.unique(records['row_id'][records['status'] == REJECTED]), 'values': values}
+
+
+def apply_events(df, latest):
+    """Snapshot df (index = id tin đăng) sau khi áp dụng kết quả của latest_values"""
+    df = df.copy(deep=not COPY_ON_WRITE)
+    for (column, value), ids in latest['values'].items():
+        rows = df.index.intersection(ids)
+        if len(rows):
+            df.loc[rows, column] = value
+    rows = df.index.intersection(latest['rejected'])
+    return df.drop(rows) if len(rows) else df
+
+
+def store_fold(store, table):
+    """Hàm gộp kết quả của latest_values vào 1 bảng của ListingStore (dùng cho compact)"""
+    def fold(latest):
+        for (column, value), ids in latest['values'].items():
+            store.update_many(table, ids, **{column: value})
+        if len(latest['rejected']):
+            store.delete_many(table, latest['rejected'])
+    return fold
+
+
+class ModerationLog:
+    """File log sự kiện kiểm duyệt của 1 bảng tin đăng"""
+
+    def __init__(self, path, fsync=True):
+        self.path = str(path)
+        self.compacting_path = self.path + ".compacting"
+        self.fsync = fsync
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+        self._thread = None
+
+    # ===== GHI =====
+    def append(self, row_id, action):
+        """Ghi 1 sự kiện (action trong ACTIONS) -> số bản ghi đang chờ gộp"""
+        if action not in ACTIONS:
+            raise ValueError(f"Thao tác không hợp lệ: {action}")
+        record = RECORD.pack(time.time(), int(row_id), ACTIONS[action])
+        with self._lock:
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                size = os.fstat(fd).st_size
+                # Bỏ bản ghi ghi dở của lần crash trước để các bản ghi sau không bị lệch
+                if size % RECORD.size:
+                    size -= size % RECORD.size
+                    os.ftruncate(fd, size)
+                os.write(fd, record)
+                if self.fsync:
+                    os.fsync(fd)
+            finally:
+                os.close(fd)
+        return size // RECORD.size + 1
+
+    # ===== ĐỌC =====
+    def version(self):
+        """Kích thước log đang gộp + log hiện tại: đổi -> có sự kiện mới / vừa gộp"""
+        return _file_size(self.compacting_path), _file_size(self.path)
+
+    def pending(self):
+        """Số bản ghi chưa gộp vào snapshot"""
+        return sum(self.version()) // RECORD.size
+
+    def records(self):
+        # Log đang gộp (cũ hơn) trước log hiện tại
+        return np.concatenate([read_records(self.compacting_path), read_records(self.path)])
+
+    def latest(self):
+        return latest_values(self.records())
+
+    # ===== GỘP =====
+    def compact(self, fold):
+        """Gộp log vào snapshot bằng fold(latest_values(...)) -> số bản ghi đã gộp"""
+        with self._compact_lock:
+            # Còn file .compacting (lần trước crash) -> gộp nốt file đó trước
+            if not os.path.exists(self.compacting_path):
+                if not os.path.exists(self.path):
+                    return 0
+                with self._lock:
+                    os.replace(self.path, self.compacting_path)
+            records = read_records(self.compacting_path)
+            if len(records):
+                fold(latest_values(records))
+            os.remove(self.compacting_path)
+            return len(records)
+
+    def maybe_compact(self, fold, max_records):
+        """Log từ max_records bản ghi (hoặc còn file .compacting) -> gộp trong thread nền"""
+        if self.pending() < max_records and not os.path.exists(self.compacting_path):
+            return False
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return False
+            self._thread = threading.Thread(target=self.compact, args=(fold,), daemon=True,
+                                            name=f"compact-{os.path.basename(self.path)}")
+            self._thread.start()
+        return True
+
+
+class ModeratedTable:
+    """Nguồn dữ liệu của catalog: snapshot (version() + load()) + replay log kiểm duyệt"""
+
+    def __init__(self, source, log):
+        self.source = source
+        self.log = log
+        self._base = None
+        self._base_version = None
+
+    def version(self):
+        return (self.source.version(), *self.log.version())
+
+    def load(self):
+        # Snapshot chỉ đọc lại khi đổi (vd sau khi gộp); mỗi lần bấm chỉ replay log
+        version = self.source.version()
+        if self._base is None or version != self._base_version:
+            self._base, self._base_version = self.source.load(), version
+        return apply_events(self._base, self.log.latest())
+
+
+# ============================================================
+# CLI: python -m src.utils.moderation_log
+# ============================================================
+def main():
+    from src.config import LISTING_DB, LISTING_TABLES, MODERATION_LOG_DIR # type: ignore
+    from src.utils.listing_store import ListingStore, StoreTable # type: ignore
+
+    parser = argparse.ArgumentParser(description="Xem / gộp log kiểm duyệt tin đăng")
+    parser.add_argument("action", choices=["status", "compact", "bench"])
+    parser.add_argument("--db", default=str(LISTING_DB))
+    parser.add_argument("--log-dir", default=str(MODERATION_LOG_DIR))
+    args = parser.parse_args()
+
+    store = ListingStore(args.db)
+    for table in LISTING_TABLES:
+        log = ModerationLog(os.path.join(args.log_dir, f"{table}.log"))
+        if args.action == "status":
+            latest = log.latest()
+            counts = ", ".join([f"{column} = {value}: {len(ids)}" for (column, value), ids in sorted(latest['values'].items())]
+                               + ([f"từ chối: {len(latest['rejected'])}"] if len(latest['rejected']) else []))
+            print(f"{table}: {log.pending():,} bản ghi chờ gộp" + (f" ({counts})" if counts else ""))
+        elif args.action == "compact":
+            print(f"{table}: gộp {log.compact(store_fold(store, table)):,} bản ghi vào {args.db}")
+        elif store.has_table(table):
+            # Bấm duyệt 1 tin = ghi thêm vào log; replay = dựng lại danh sách sau mỗi lần bấm (log riêng, xóa sau khi đo)
+            bench = ModerationLog(os.path.join(args.log_dir, f"{table}.bench.log"))
+            source = ModeratedTable(StoreTable(store, table), bench)
+            row_ids = source.source.load().index[:200]
+            start = time.perf_counter()
+            for i in row_ids:
+                bench.append(i, "request_edit")
+            append_ms = (time.perf_counter() - start) / len(row_ids) * 1e3
+            source.load()
+            start = time.perf_counter()
+            for _ in range(20):
+                source.load()
+            replay_ms = (time.perf_counter() - start) / 20 * 1e3
+            os.remove(bench.path)
+            print(f"{table}: ghi log {append_ms:.3f} ms/lần, replay {len(row_ids)} sự kiện {replay_ms:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+import argparse
+import time
+
+import pandas as pd
+import numpy as np
+
+from src.config import USE_COMPILED_ENCODER, INTERACTIVE_ENGINE, BATCH_ENGINE, SMALL_BATCH_ROWS # type: ignore
+from src.utils.compiled_encoder import compiled_model # type: ignore
+from src.utils.inference_policy import ensure_serial, predict_parallel, threads_for # type: ignore
+from src.utils.model_arrays import ENGINES, model_for_engine, read_model # type: ignore
+
+# ============================================================
+# HÀM DỰ ĐOÁN GIÁ (không phụ thuộc Streamlit)
+# ============================================================
+FEATURES = [
+    'thuong_hieu','dong_xe', 'nam_dang_ky','so_km_da_di',
+    'tinh_trang','loai_xe','dung_tich_xe','xuat_xu'
+]
+NUMERIC_COLS = ['so_km_da_di','nam_dang_ky']
+CAT_COLS = ['thuong_hieu','dong_xe','tinh_trang','loai_xe','dung_tich_xe', 'xuat_xu']
+
+
+def normalize_dtypes(df):
+    """Chuẩn hóa kiểu cột (dùng chung cho prepare_input / prepare_batch): số -> float, phân loại -> str"""
+    # numeric auto convert
+    for c in NUMERIC_COLS:
+        if c in df:
+            df[c] = pd.to_numeric(df[c], errors='coerce')
+
+    # categorical auto fill
+    for c in CAT_COLS:
+        # Cột category (DataFrame từ dataset cache) không fillna được giá trị ngoài danh sách
+        if isinstance(df[c].dtype, pd.CategoricalDtype):
+            df[c] = df[c].astype(object)
+        df[c] = df[c].fillna('unknown').astype(str)
+    return df
+
+def prepare_input(input_dict, features):
+    df = normalize_dtypes(pd.DataFrame([{f: input_dict.get(f, np.nan) for f in features}]))
+
+    # Filll any all-NaN numeric → 0
+    for c in df.columns:
+        if df[c].dtype.kind in 'fiu' and df[c].isna().all():
+            df[c] = df[c].fillna(0)
+
+    return df
+
+def get_compiled(model, features=None):
+    # Encoder biên dịch sẵn cho model (None nếu tắt hoặc pipeline không hỗ trợ)
+    if not USE_COMPILED_ENCODER:
+        return None
+    return compiled_model(model, FEATURES if features is None else features, CAT_COLS, NUMERIC_COLS)
+
+def predict_price(info, model, features=None, inverse_log=True, lattice=None):
+
+    if features is None:
+        features = FEATURES
+
+    # Tra bảng giá dựng sẵn trước, chỉ gọi model khi input nằm ngoài bảng
+    pred = lattice.lookup_raw(info) if lattice is not None else None
+
+    if pred is None:
+        # 1 xe: luôn tuần tự, không qua joblib
+        model = model_for_engine(ensure_serial(model), INTERACTIVE_ENGINE)
+
+    compiled = get_compiled(model, features) if pred is None else None
+    if compiled is not None:
+        # Đường nhanh: dict -> ma trận, không qua DataFrame
+        try:
+            pred = compiled.predict_one(info)
+        except Exception as e:
+            raise RuntimeError(f"Predict failed: {e}\nInput:\n{info}")
+
+    if pred is None:
+        df = prepare_input(info, features)
+
+        try:
+            pred = model.predict(df)[0]
+        except Exception as e:
+            raise RuntimeError(f"Predict failed: {e}\nInput:\n{df}")
+
+    return float(np.expm1(pred) if inverse_log else pred)
+
+# ============================================================
+# PHÁT HIỆN BẤT THƯỜNG
+# ============================================================
+def detect_anomaly(model, info, lattice=None):
+    pred = predict_price(info, model, inverse_log=False, lattice=lattice)
+    return anomaly_result(info, pred)
+
+def anomaly_result(info, pred):
+    # pred: output gốc của model (đơn vị triệu)
+    pred = pred*1_000_000
+
+    residual = info['gia'] - pred
+
+    # Z-score với sigma giả định
+    sigma = 0.15 * pred
+    z = residual / sigma
+
+    is_anomaly = abs(z) > 2.5
+
+    if not is_anomaly:
+        ket_luan = "🟡 Giá hợp lý"
+    elif info['gia'] > pred:
+        ket_luan = "🔴 Giá cao bất thường"
+    else:
+        ket_luan = "🟢 Giá thấp bất thường"
+
+    return {
+        'gia_du_doan': pred,
+        'residual': residual,
+        'is_anomaly': is_anomaly,
+        'z_score': z,
+        'ket_luan': ket_luan
+    }
+
+# ============================================================
+# DỰ ĐOÁN THEO LÔ (nhiều xe trong 1 lần gọi model.predict)
+# ============================================================
+def prepare_batch(df_or_records, features):
+    # Cùng quy tắc với prepare_input nhưng xử lý cả lô trong một lần
+    if isinstance(df_or_records, pd.DataFrame):
+        df = df_or_records.reindex(columns=features)
+    else:
+        # dtype=object: giữ nguyên kiểu từng giá trị như khi tạo DataFrame 1 dòng
+        df = pd.DataFrame(list(df_or_records), columns=features, dtype=object)
+    df = normalize_dtypes(df)
+
+    # Với 1 dòng, cột số bị NaN chính là cột "all-NaN" -> điền 0 theo từng ô
+    for c in df.columns:
+        if df[c].dtype.kind in 'fiu':
+            df[c] = df[c].fillna(0)
+
+    return df
+
+def choose_engine(n_rows):
+    # Lô nhỏ (form, micro-batch) và lô lớn (chấm lại cả file) dùng engine khác nhau
+    return INTERACTIVE_ENGINE if n_rows <= SMALL_BATCH_ROWS else BATCH_ENGINE
+
+def predict_price_batch(df_or_records, model, features=None, inverse_log=True, engine=None):
+    """Dự đoán giá cho DataFrame / list dict, trả về np.ndarray cùng thứ tự"""
+    if features is None:
+        features = FEATURES
+
+    if not isinstance(df_or_records, pd.DataFrame):
+        df_or_records = list(df_or_records)
+    model = model_for_engine(ensure_serial(model), engine or choose_engine(len(df_or_records)))
+
+    # List dict nhỏ (micro-batch, inference server): encoder biên dịch sẵn;
+    # lô lớn để pandas vector hóa thì nhanh hơn lặp từng dict
+    small_list = not isinstance(df_or_records, pd.DataFrame) and len(df_or_records) <= SMALL_BATCH_ROWS
+    compiled = get_compiled(model, features) if small_list else None
+    if compiled is not None:
+        records = df_or_records
+        if not records:
+            return np.empty(0, dtype=np.float64)
+        try:
+            pred = compiled.predict_records(records)
+        except Exception as e:
+            raise RuntimeError(f"Predict failed: {e}\nInput:\n{records[:5]}")
+        return np.expm1(pred) if inverse_log else pred
+
+    df = prepare_batch(df_or_records, features)
+    if len(df) == 0:
+        return np.empty(0, dtype=np.float64)
+
+    try:
+        pred = predict_parallel(model, df, threads_for(len(df)))
+    except Exception as e:
+        raise RuntimeError(f"Predict failed: {e}\nInput:\n{df.head()}")
+
+    return np.expm1(pred) if inverse_log else pred
+
+# ============================================================
+# WHAT-IF: GIÁ THEO SỐ KM x NĂM ĐĂNG KÝ
+# ============================================================
+# Lưới mặc định quanh xe đang hỏi: đi thêm bao nhiêu km, đời xe lệch bao nhiêu năm
+SWEEP_KM_STEPS = (0, 5_000, 10_000, 20_000, 30_000, 50_000)
+SWEEP_YEAR_STEPS = (-2, -1, 0, 1, 2)
+
+def sweep_grid(info, km_steps=SWEEP_KM_STEPS, year_steps=SWEEP_YEAR_STEPS, year_range=None):
+    """(km_values, year_values) quanh so_km_da_di / nam_dang_ky của xe; year_range=(min, max) để chặn năm"""
+    km_now = float(info['so_km_da_di'])
+    year_now = int(info['nam_dang_ky'])
+    km_values = sorted({int(max(km_now + step, 0)) for step in km_steps})
+    year_values = sorted({year_now + step for step in year_steps})
+    if year_range is not None:
+        year_values = [y for y in year_values if year_range[0] <= y <= year_range[1]] or [year_now]
+    return km_values, year_values
+
+def predict_price_sweep(info, model, km_values=None, year_values=None, features=None, inverse_log=True,
+                        current_price=None):
+    """Giá của 1 xe trên lưới so_km_da_di x nam_dang_ky, chấm trong 1 lần predict theo lô.
+
+    current_price: giá đã hiển thị cho chính xe này (có thể từ bảng giá / cascade thay vì model);
+    cả lưới được dịch (theo tỉ lệ) để ô km / năm hiện tại bằng đúng giá đó.
+
+    Trả về DataFrame: index = nam_dang_ky, cột = so_km_da_di.
+    """
+    default_km, default_years = sweep_grid(info)
+    km_values = list(default_km if km_values is None else km_values)
+    year_values = list(default_years if year_values is None else year_values)
+
+    records = [dict(info, nam_dang_ky=year, so_km_da_di=km) for year in year_values for km in km_values]
+    pred = predict_price_batch(records, model, features, inverse_log)
+    table = pd.DataFrame(
+        pred.reshape(len(year_values), len(km_values)),
+        index=pd.Index(year_values, name='nam_dang_ky'),
+        columns=pd.Index(km_values, name='so_km_da_di'),
+    )
+    if current_price is None:
+        return table
+
+    km_now, year_now = int(float(info['so_km_da_di'])), int(info['nam_dang_ky'])
+    if year_now not in table.index or km_now not in table.columns:
+        return table
+    cell = table.loc[year_now, km_now]
+    # Model train trên log(giá): chênh lệch giữa các ô là tỉ lệ -> nhân (log: cộng)
+    if not inverse_log:
+        return table + (current_price - cell)
+    return table * (current_price / cell) if cell > 0 else table
+
+def benchmark_predict_batch(df_or_records, model, repeats=3):
+    """Đo thông lượng predict_price_batch (dòng/giây), lấy lần chạy nhanh nhất"""
+    rows = len(df_or_records)
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        predict_price_batch(df_or_records, model)
+        best = min(best, time.perf_counter() - start)
+
+    return {'rows': rows, 'seconds': best, 'rows_per_sec': rows / best if best > 0 else float('inf')}
+
+def benchmark_engines(df, model, sizes=(1, 100, 10_000, 1_000_000), engines=ENGINES, repeats=3):
+    """Thời gian predict_price_batch của từng engine theo kích thước lô -> list dict"""
+    results = []
+    for size in sizes:
+        sample = df.sample(size, replace=len(df) < size, random_state=0).reset_index(drop=True)
+        if size <= SMALL_BATCH_ROWS:
+            # Lô nhỏ đến từ form / micro-batch dưới dạng list dict
+            sample = sample.to_dict('records')
+        expected = None
+        for engine in engines:
+            model_for_engine(model, engine)  # làm phẳng cây trước, không tính vào thời gian
+            best = float('inf')
+            for _ in range(repeats if size < 100_000 else 1):
+                start = time.perf_counter()
+                pred = predict_price_batch(sample, model, inverse_log=False, engine=engine)
+                best = min(best, time.perf_counter() - start)
+            if expected is None:
+                expected = pred
+            results.append({'engine': engine, 'rows': size, 'seconds': best,
+                            'max_diff': float(np.max(np.abs(pred - expected)))})
+    return results
+
+# ============================================================
+# CLI: python -m src.utils.prediction --rows 10000
+# ============================================================
+def main():
+    parser = argparse.ArgumentParser(description="So sánh predict_price (từng dòng) và predict_price_batch")
+    parser.add_argument("--model", default="./models/model_regression_best.pkl")
+    parser.add_argument("--data", default="./data/processed/data_motobikes_cleaned.csv")
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--single-rows", type=int, default=200, help="Số dòng chạy thử theo từng dòng")
+    parser.add_argument("--engines", action="store_true",
+                        help="So sánh các engine (sklearn / per_tree / levelwise) với lô 1, 100, 10k, 1M dòng")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 100, 10_000, 1_000_000])
+    args = parser.parse_args()
+
+    model = read_model(args.model)
+
+    df = pd.read_csv(args.data)[FEATURES]
+
+    if args.engines:
+        for r in benchmark_engines(df, model, args.sizes):
+            print(f"{r['engine']:<10} {r['rows']:>9,} dòng: {r['seconds'] * 1e3:10.1f} ms "
+                  f"({r['rows'] / r['seconds']:,.0f} dòng/s), lệch {r['max_diff']:.1e}")
+        return
+
+    df = df.sample(args.rows, replace=len(df) < args.rows, random_state=0).reset_index(drop=True)
+    records = df.to_dict('records')
+
+    single_rows = records[:args.single_rows]
+    start = time.perf_counter()
+    single = [predict_price(r, model) for r in single_rows]
+    single_s = time.perf_counter() - start
+
+    batch = predict_price_batch(single_rows, model)
+    max_diff = np.max(np.abs(np.asarray(single) - batch))
+
+    stats = benchmark_predict_batch(records, model)
+    print(f"Từng dòng : {len(single_rows) / single_s:,.0f} dòng/s")
+    print(f"Theo lô   : {stats['rows_per_sec']:,.0f} dòng/s ({stats['rows']:,} dòng trong {stats['seconds']:.3f}s)")
+    print(f"Lệch tối đa giữa 2 cách: {max_diff:.3e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+import threading
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from src.config import PREDICTION_CACHE_SIZE, PREDICTION_CACHE_KM_BUCKET # type: ignore
+from src.config import COALESCE_PREDICTIONS, COALESCE_MAX_WAIT_MS, BATCH_MAX_SIZE # type: ignore
+from src.utils.compiled_encoder import forget_compiled # type: ignore
+from src.utils.inference_policy import forget_serial # type: ignore
+from src.utils.micro_batch import BatcherClosed, MicroBatcher # type: ignore
+from src.utils.model_arrays import forget_engine_models # type: ignore
+from src.utils.prediction import FEATURES, CAT_COLS, predict_price, predict_price_batch, anomaly_result # type: ignore
+
+# ============================================================
+# LRU CACHE DÙNG CHUNG TRONG PROCESS (mọi session Streamlit)
+# ============================================================
+class LRUCache:
+    """LRU cache có giới hạn, an toàn khi nhiều thread cùng truy cập"""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        # Trả về (True, value) nếu có trong cache, ngược lại (False, None)
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return True, self._data[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, key, compute):
+        # compute() chạy ngoài lock: 2 miss cùng lúc có thể tính 2 lần, nhưng không chặn nhau
+        found, value = self.get(key)
+        if found:
+            return value
+        value = compute()
+        self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def discard_where(self, predicate):
+        # Xóa các key thỏa predicate (vd. kết quả của model đã bị thay)
+        with self._lock:
+            for key in [k for k in self._data if predicate(k)]:
+                del self._data[key]
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
+
+
+prediction_cache = LRUCache(PREDICTION_CACHE_SIZE)
+
+# ============================================================
+# KEY: BỘ ĐẶC TRƯNG ĐÃ CHUẨN HÓA
+# ============================================================
+def bucket_km(so_km, km_bucket=PREDICTION_CACHE_KM_BUCKET):
+    # Làm tròn số km về mốc gần nhất (km_bucket <= 0: giữ nguyên)
+    if km_bucket <= 0:
+        return so_km
+    return float(round(so_km / km_bucket) * km_bucket)
+
+def normalize_features(info, features=None, km_bucket=PREDICTION_CACHE_KM_BUCKET):
+    """Chuẩn hóa input giống prepare_input -> dict mới, dùng được cho cả key lẫn predict"""
+    if features is None:
+        features = FEATURES
+
+    normalized = {}
+    for f in features:
+        v = info.get(f, np.nan)
+        if f in CAT_COLS:
+            normalized[f] = 'unknown' if pd.isna(v) else str(v)
+        else:
+            v = pd.to_numeric(v, errors='coerce')
+            normalized[f] = 0.0 if pd.isna(v) else float(v)
+
+    if 'so_km_da_di' in normalized:
+        normalized['so_km_da_di'] = bucket_km(normalized['so_km_da_di'], km_bucket)
+    return normalized
+
+def _cache_key(model, features, normalized):
+    # id(model): model mới (load lại / đổi version) không dùng lại kết quả của model cũ
+    return (id(model), tuple(features)) + tuple(normalized[f] for f in features)
+
+# ============================================================
+# GOM REQUEST ĐỒNG THỜI TỪ NHIỀU SESSION (request coalescing)
+# ============================================================
+# Mỗi model dùng chung 1 MicroBatcher: các lần predict 1 dòng từ các
+# thread script khác nhau được gom thành 1 lần predict theo lô.
+_batchers = {}
+_batchers_lock = threading.Lock()
+# Model đã release_model (weakref: không giữ model cũ trong RAM)
+_released = weakref.WeakSet()
+
+def model_batcher(model):
+    """Batcher dùng chung của model; model đã bị release -> None (không tạo lại thread)"""
+    with _batchers_lock:
+        if model in _released:
+            return None
+        entry = _batchers.get(id(model))
+        # Giữ tham chiếu tới model để id() không bị dùng lại cho model khác
+        if entry is None or entry[0] is not model:
+            batcher = MicroBatcher(
+                lambda records: predict_price_batch(records, model, inverse_log=False),
+                max_batch=BATCH_MAX_SIZE,
+                max_wait_ms=COALESCE_MAX_WAIT_MS,
+                name="prediction-coalescer",
+                adaptive=True,
+            )
+            entry = (model, batcher)
+            _batchers[id(model)] = entry
+        return entry[1]
+
+def raw_prediction(normalized, model, features=None):
+    # Output gốc của model cho 1 xe: qua bộ gom request nếu bật COALESCE_PREDICTIONS
+    if COALESCE_PREDICTIONS and features in (None, FEATURES):
+        batcher = model_batcher(model)
+        try:
+            if batcher is not None:
+                return float(batcher.predict(normalized))
+        except BatcherClosed:
+            # Model vừa bị thay trong lúc gọi: dự đoán trực tiếp
+            pass
+        return float(predict_price_batch([normalized], model, inverse_log=False)[0])
+    return predict_price(normalized, model, features, inverse_log=False)
+
+def coalescer_stats():
+    with _batchers_lock:
+        batchers = [b for _, b in _batchers.values()]
+    stats = [b.stats() for b in batchers]
+    batches = sum(s['batches'] for s in stats)
+    items = sum(s['items'] for s in stats)
+    return {'batches': batches, 'items': items, 'avg_batch': items / batches if batches else 0.0}
+
+# ============================================================
+# DỰ ĐOÁN CÓ CACHE
+# ============================================================
+def cached_raw_prediction(info, model, features=None, lattice=None):
+    # Output gốc của model (chưa expm1) cho bộ đặc trưng đã chuẩn hóa
+    if features is None:
+        features = FEATURES
+
+    # Bảng giá dựng sẵn / tầng rẻ của cascade đã đủ nhanh, không cần qua cache
+    if lattice is not None:
+        pred = lattice.lookup_raw(info)
+        if pred is not None:
+            return pred
+
+    normalized = normalize_features(info, features)
+    key = _cache_key(model, features, normalized)
+    return prediction_cache.get_or_compute(
+        key, lambda: raw_prediction(normalized, model, features)
+    )
+
+def cached_predict_price(info, model, features=None, inverse_log=True, lattice=None):
+    pred = cached_raw_prediction(info, model, features, lattice)
+    return float(np.expm1(pred) if inverse_log else pred)
+
+def cached_detect_anomaly(model, info, lattice=None):
+    # Chỉ cache phần dự đoán; so sánh với giá người bán ('gia') tính lại mỗi lần
+    pred = cached_raw_prediction(info, model, lattice=lattice)
+    return anomaly_result(info, pred)
+
+def prediction_cache_stats():
+    return prediction_cache.stats()
+
+# ============================================================
+# GIẢI PHÓNG MODEL ĐÃ BỊ THAY (hot-swap)
+# ============================================================
+def release_model(model):
+    """Xóa mọi tham chiếu tới model trong cache / batcher / encoder để GC thu hồi bộ nhớ"""
+    # Bản làm phẳng theo engine cũng có encoder / batcher riêng
+    variants = [model] + [m for m in forget_engine_models(model) if m is not model]
+
+    ids = {id(m) for m in variants}
+    prediction_cache.discard_where(lambda key: key[0] in ids)
+
+    with _batchers_lock:
+        _released.update(variants)
+        batchers = [_batchers.pop(id(m))[1] for m in variants if id(m) in _batchers and _batchers[id(m)][0] is m]
+    for batcher in batchers:
+        batcher.close()
+
+    for m in variants:
+        forget_compiled(m)
+        forget_serial(m)
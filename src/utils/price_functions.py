@@ -20,7 +20,17 @@ def format_trieu_vnd(x):
         return int(0.0)
 
 
-def suggest_price(g):
+def suggest_price(g, info=None, table=None):
+    # table: ConformalIntervals (python -m src.utils.conformal) -> khoảng giá hiệu chỉnh theo phân khúc của xe;
+    # không có bảng / không tra được -> hệ số cố định
+    factors = table.factors(info) if table is not None and info is not None else None
+    if factors is not None:
+        prices = {name: int(g * factor) for name, factor in factors.items()}
+        # Giá bán nhanh không cao hơn giá đề xuất, giá tối đa lợi nhuận không thấp hơn
+        prices['fast_sell'] = min(prices['fast_sell'], int(g))
+        prices['max_profit'] = max(prices['max_profit'], int(g))
+        return dict(recommended=g, **prices)
+
     return dict(
         recommended=g,
         fast_sell=int(g*0.95),
@@ -0,0 +1,182 @@
+import argparse
+import bisect
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.utils.model_arrays import read_model # type: ignore
+from src.utils.model_artifacts import N_PROBES, ModelArtifact, load_arrays, model_signature, save_arrays # type: ignore
+from src.utils.prediction import FEATURES, predict_price_batch # type: ignore
+
+# ============================================================
+# BẢNG GIÁ DỰNG SẴN (PRICE LATTICE)
+# ============================================================
+#
+# Với mỗi tổ hợp phân loại đã xuất hiện trong dữ liệu
+#   (thuong_hieu, dong_xe, loai_xe, dung_tich_xe, xuat_xu, tinh_trang)
+# dự đoán trước output gốc của model trên lưới nam_dang_ky x so_km_da_di.
+# Khi tra cứu: nội suy song tuyến tính theo năm và km; input nằm ngoài
+# lưới (tổ hợp lạ, năm/km ngoài khoảng) -> trả về None để dùng model.
+
+LATTICE_CATS = ['thuong_hieu', 'dong_xe', 'loai_xe', 'dung_tich_xe', 'xuat_xu', 'tinh_trang']
+
+# Lưới km mặc định: phân vị của so_km_da_di trong dữ liệu (làm tròn 100 km)
+N_KM_QUANTILES = 64
+KM_MAX = 1_000_000
+
+# Model cây là hàm bậc thang: nếu 2 điểm lưới kề nhau chênh nhau quá
+# max_gap (theo output gốc, ~log giá) thì nội suy không đáng tin -> dùng model
+DEFAULT_MAX_GAP = 0.05
+
+
+def default_km_grid(df, n_quantiles=N_KM_QUANTILES):
+    km = df['so_km_da_di'].dropna()
+    grid = np.quantile(km, np.linspace(0, 1, n_quantiles)).round(-2)
+    return np.unique(np.concatenate([[0, KM_MAX], grid]))
+
+
+def build_price_lattice(df, model, years=None, km_grid=None, chunk_size=200_000):
+    """Dự đoán toàn bộ lưới -> dict các mảng (lưu bằng save_arrays)"""
+    combos = df[LATTICE_CATS].astype(str).drop_duplicates().sort_values(LATTICE_CATS).to_numpy()
+
+    if years is None:
+        years = np.arange(int(df['nam_dang_ky'].min()), int(df['nam_dang_ky'].max()) + 1)
+    years = np.asarray(years, dtype=np.float64)
+    km_grid = np.asarray(default_km_grid(df) if km_grid is None else km_grid, dtype=np.float64)
+
+    n_combos, n_years, n_km = len(combos), len(years), len(km_grid)
+    n_points = n_combos * n_years * n_km
+
+    # Thứ tự điểm: combo -> năm -> km (khớp reshape bên dưới)
+    combo_idx = np.repeat(np.arange(n_combos), n_years * n_km)
+    year_idx = np.tile(np.repeat(np.arange(n_years), n_km), n_combos)
+    km_idx = np.tile(np.arange(n_km), n_combos * n_years)
+
+    values = np.empty(n_points, dtype=np.float64)
+    for start in range(0, n_points, chunk_size):
+        sl = slice(start, min(start + chunk_size, n_points))
+        chunk = pd.DataFrame(combos[combo_idx[sl]], columns=LATTICE_CATS)
+        chunk['nam_dang_ky'] = years[year_idx[sl]]
+        chunk['so_km_da_di'] = km_grid[km_idx[sl]]
+        values[sl] = predict_price_batch(chunk, model, inverse_log=False)
+
+    values = values.reshape(n_combos, n_years, n_km)
+
+    # Chữ ký của model: vài điểm trên lưới
+    rng = np.random.default_rng(0)
+    c, y, k = (rng.integers(0, n, N_PROBES) for n in (n_combos, n_years, n_km))
+    probes = pd.DataFrame(combos[c], columns=LATTICE_CATS).assign(nam_dang_ky=years[y], so_km_da_di=km_grid[k])
+
+    return {
+        'combos': combos.astype(str),
+        'years': years,
+        'km_grid': km_grid,
+        'values': values.astype(np.float32),
+        **model_signature(probes, model),
+    }
+
+
+def load_price_lattice(path, max_gap=DEFAULT_MAX_GAP):
+    """Load bảng giá; không có file -> None"""
+    arrays = load_arrays(path)
+    return None if arrays is None else PriceLattice(arrays, max_gap)
+
+
+class PriceLattice(ModelArtifact):
+    """Tra cứu output gốc của model bằng bảng + nội suy năm/km"""
+
+    def __init__(self, arrays, max_gap=DEFAULT_MAX_GAP):
+        self.arrays = arrays
+        self.max_gap = max_gap
+        self.values = arrays['values']
+        # list Python cho bisect: nhanh hơn numpy với 1 giá trị
+        self.years = arrays['years'].tolist()
+        self.km_grid = arrays['km_grid'].tolist()
+        self.index = {tuple(row): i for i, row in enumerate(arrays['combos'].tolist())}
+
+    def __len__(self):
+        return self.values.size
+
+    @staticmethod
+    def _bracket(grid, x):
+        # (i, t): x nằm giữa grid[i] và grid[i+1], t là tỉ lệ nội suy; ngoài lưới -> None
+        if not grid[0] <= x <= grid[-1]:
+            return None
+        if len(grid) == 1:
+            return 0, 0.0
+        i = min(bisect.bisect_right(grid, x) - 1, len(grid) - 2)
+        return i, (x - grid[i]) / (grid[i + 1] - grid[i])
+
+    def lookup_raw(self, info):
+        """Output gốc của model (chưa expm1), hoặc None nếu input nằm ngoài bảng"""
+        try:
+            key = tuple(str(info[c]) for c in LATTICE_CATS)
+            year = float(info['nam_dang_ky'])
+            km = float(info['so_km_da_di'])
+        except (KeyError, TypeError, ValueError):
+            return None
+
+        row = self.index.get(key)
+        if row is None:
+            return None
+
+        by = self._bracket(self.years, year)
+        bk = self._bracket(self.km_grid, km)
+        if by is None or bk is None:
+            return None
+
+        (i, ty), (j, tk) = by, bk
+        v = self.values[row]
+        i1 = min(i + 1, v.shape[0] - 1) if ty > 0 else i
+        j1 = min(j + 1, v.shape[1] - 1) if tk > 0 else j
+
+        corners = (v[i, j], v[i, j1], v[i1, j], v[i1, j1])
+        if max(corners) - min(corners) > self.max_gap:
+            return None
+
+        top = v[i, j] * (1 - tk) + v[i, j1] * tk
+        bottom = v[i1, j] * (1 - tk) + v[i1, j1] * tk
+        return float(top * (1 - ty) + bottom * ty)
+
+
+# ============================================================
+# CLI: python -m src.utils.price_lattice
+# ============================================================
+def main():
+    parser = argparse.ArgumentParser(description="Build bảng giá dựng sẵn cho các cấu hình xe phổ biến")
+    parser.add_argument("--model", default="./models/model_regression_best.pkl")
+    parser.add_argument("--data", default="./data/processed/data_motobikes_cleaned.csv")
+    parser.add_argument("--out", default="./models/price_lattice.npz")
+    args = parser.parse_args()
+
+    model = read_model(args.model)
+
+    df = pd.read_csv(args.data)
+
+    start = time.perf_counter()
+    arrays = build_price_lattice(df, model)
+    save_arrays(arrays, args.out)
+    print(f"Build {arrays['values'].size:,} điểm ({len(arrays['combos']):,} tổ hợp) "
+          f"trong {time.perf_counter() - start:.1f}s -> {args.out} "
+          f"({os.path.getsize(args.out) / 1e6:.1f} MB)")
+
+    # Đánh giá sai số nội suy trên chính dữ liệu (giá VND sau expm1)
+    lattice = load_price_lattice(args.out)
+    records = df[FEATURES].to_dict('records')
+    exact = predict_price_batch(records, model, inverse_log=False)
+
+    start = time.perf_counter()
+    approx = [lattice.lookup_raw(r) for r in records]
+    lookup_us = (time.perf_counter() - start) / len(records) * 1e6
+
+    hit = np.array([a is not None for a in approx])
+    approx = np.array([a if a is not None else np.nan for a in approx])
+    rel_err = np.abs(np.expm1(approx[hit]) / np.expm1(exact[hit]) - 1)
+    print(f"Tra cứu trúng bảng: {hit.mean():.1%}, {lookup_us:.1f} µs/lần")
+    print(f"Sai số tương đối so với model: trung bình {rel_err.mean():.2%}, p99 {np.quantile(rel_err, 0.99):.2%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.utils.model_arrays import LEVELWISE_MAX_CELLS, ArrayForestModel, model_for_engine, read_model # type: ignore
+from src.utils.model_artifacts import ModelArtifact, load_arrays, sample_signature, save_arrays # type: ignore
+from src.utils.prediction import FEATURES, NUMERIC_COLS, get_compiled, prepare_batch, predict_price_batch # type: ignore
+
+# ============================================================
+# QUANTILE FOREST TỪ CÁC LÁ CỦA RANDOM FOREST ĐÃ FIT
+# ============================================================
+#
+# Offline: cho dữ liệu train đi qua từng cây, mỗi lá giữ 1 "sketch" gồm
+# SKETCH_SIZE phân vị đều nhau của target rơi vào lá đó (float16, lệch so
+# với giá trị của lá). Khi dự đoán: lá của xe trên mọi cây (1 lượt duyệt
+# levelwise, như 1 lần predict) -> gộp các sketch (mỗi cây cùng trọng số)
+# -> phân vị của phân phối gộp (Meinshausen 2006, bản xấp xỉ).
+#
+# Sketch gắn với đánh số node của model đã làm phẳng (flatten_trees) nên
+# chỉ dùng cho random forest / extra trees, không dùng cho model chia shard
+# hoặc đã gộp cây con.
+
+SKETCH_SIZE = 8
+DEFAULT_QUANTILES = (0.1, 0.5, 0.9)
+
+# Target trong không gian output gốc của model, tính từ cột gia (triệu VND)
+TARGETS = {
+    'log_vnd': lambda gia: np.log1p(gia * 1e6), # predict_price: expm1(output) = VND
+    'trieu': lambda gia: gia,
+}
+
+
+def _forest(model):
+    forest = model_for_engine(model, "levelwise")
+    if not isinstance(forest, ArrayForestModel) or forest.meta["kind"] != "forest" \
+            or forest.meta.get("merged_subtrees"):
+        raise ValueError("Quantile forest chỉ hỗ trợ RandomForest / ExtraTrees (chưa gộp cây con)")
+    return forest
+
+
+def _encode(forest, df_or_records):
+    # Ma trận float32 đã transform; list dict nhỏ dùng encoder biên dịch (nếu có)
+    if not isinstance(df_or_records, pd.DataFrame):
+        compiled = get_compiled(forest)
+        if compiled is not None:
+            return compiled.encoder.transform_records(df_or_records).astype(np.float32)
+    return forest.transform(prepare_batch(df_or_records, FEATURES))
+
+
+def _leaves(forest, X):
+    # (dòng x cây) chỉ số node lá, chia khúc giống _predict_levelwise
+    chunk = max(1, LEVELWISE_MAX_CELLS // max(forest.n_trees, 1))
+    return np.concatenate([forest.apply_levelwise(X[s:s + chunk]) for s in range(0, X.shape[0], chunk)]) \
+        if X.shape[0] else np.empty((0, forest.n_trees), dtype=np.int32)
+
+
+def detect_target(forest, df):
+    """Chọn cách biến đổi gia gần nhất với giá trị lá của model"""
+    leaf_mean = float(np.mean(forest.value[forest.feature < 0]))
+    gia = df['gia'].to_numpy(dtype=np.float64)
+    return min(TARGETS, key=lambda name: abs(float(np.mean(TARGETS[name](gia))) - leaf_mean))
+
+
+def build_quantile_index(df, model, target=None, sketch_size=SKETCH_SIZE):
+    """Sketch target theo lá -> dict mảng (lưu bằng save_arrays)"""
+    forest = _forest(model)
+    df = df.dropna(subset=NUMERIC_COLS + ['gia'])
+    df = df[df['gia'] > 0].reset_index(drop=True)
+    target = target or detect_target(forest, df)
+    y = TARGETS[target](df['gia'].to_numpy(dtype=np.float64))
+
+    leaves = _leaves(forest, forest.transform(prepare_batch(df[FEATURES], FEATURES))).ravel()
+    targets = np.repeat(y, forest.n_trees)
+
+    # Sắp theo (lá, target): mỗi lá là 1 đoạn liên tiếp đã sắp xếp -> lấy phân vị bằng chỉ số
+    order = np.lexsort((targets, leaves))
+    leaves, targets = leaves[order], targets[order]
+    leaf_ids, starts, counts = np.unique(leaves, return_index=True, return_counts=True)
+    positions = starts[:, None] + ((np.arange(sketch_size) + 0.5) / sketch_size * counts[:, None]).astype(np.int64)
+    sketch = targets[positions] - forest.value[leaf_ids][:, None]
+
+    leaf_row = np.full(forest.meta["n_nodes"], -1, dtype=np.int32)
+    leaf_row[leaf_ids] = np.arange(len(leaf_ids), dtype=np.int32)
+
+    return {
+        'leaf_row': leaf_row,
+        'sketch': sketch.astype(np.float16),
+        'leaf_counts': counts.astype(np.int32),
+        'target': np.array(target),
+        'n_nodes': np.array(forest.meta["n_nodes"]),
+        **sample_signature(df[FEATURES], model),
+    }
+
+
+def load_quantile_index(path):
+    """Load index; không có file -> None"""
+    arrays = load_arrays(path)
+    return None if arrays is None else QuantileIndex(arrays)
+
+
+class QuantileIndex(ModelArtifact):
+    """Phân vị giá từ sketch của các lá mà xe rơi vào"""
+
+    def __init__(self, arrays):
+        self.arrays = arrays
+        self.leaf_row = arrays['leaf_row']
+        # Dòng cuối toàn 0: lá không có dữ liệu train -> chỉ dùng giá trị của lá
+        self.sketch = np.vstack([arrays['sketch'].astype(np.float32),
+                                 np.zeros((1, arrays['sketch'].shape[1]), dtype=np.float32)])
+        self.target = str(arrays['target'])
+
+    def matches(self, model, atol=1e-4):
+        """Kiểm tra index được build từ đúng model này"""
+        try:
+            forest = _forest(model)
+        except ValueError:
+            return False
+        if forest.meta["n_nodes"] != int(self.arrays['n_nodes']):
+            return False
+        return super().matches(model, atol)
+
+    def predict_quantiles(self, df_or_records, model, quantiles=DEFAULT_QUANTILES, inverse_log=True):
+        """(số dòng x số phân vị) giá cho DataFrame / list dict, 1 lượt duyệt cây cho cả lô"""
+        forest = _forest(model)
+        if isinstance(df_or_records, dict):
+            df_or_records = [df_or_records]
+        X = _encode(forest, df_or_records)
+        leaves = _leaves(forest, X)
+
+        rows = self.leaf_row[leaves]
+        values = self.sketch[rows] + forest.value[leaves][..., None].astype(np.float32)
+        pooled = values.reshape(len(leaves), -1)
+        pred = np.quantile(pooled, quantiles, axis=1).T.astype(np.float64)
+        # Cùng quy ước với predict_price: output gốc ~ log giá -> expm1
+        return np.expm1(pred) if inverse_log else pred
+
+
+# ============================================================
+# CLI: python -m src.utils.quantile_forest
+# ============================================================
+def main():
+    parser = argparse.ArgumentParser(description="Build sketch target theo lá cho quantile forest")
+    parser.add_argument("--model", default="./models/model_regression_best.pkl")
+    parser.add_argument("--data", default="./data/processed/data_motobikes_cleaned.csv",
+                        help="Dữ liệu đã dùng để train model")
+    parser.add_argument("--out", default="./models/quantile_index.npz")
+    parser.add_argument("--target", choices=sorted(TARGETS), default=None,
+                        help="Target của model theo cột gia (mặc định: tự nhận theo giá trị lá)")
+    parser.add_argument("--sketch-size", type=int, default=SKETCH_SIZE)
+    args = parser.parse_args()
+
+    model = read_model(args.model)
+    df = pd.read_csv(args.data)
+
+    start = time.perf_counter()
+    save_arrays(build_quantile_index(df, model, args.target, args.sketch_size), args.out)
+    index = load_quantile_index(args.out)
+    print(f"Build trong {time.perf_counter() - start:.1f}s -> {args.out} "
+          f"({os.path.getsize(args.out) / 1e6:.2f} MB, target {index.target}, {len(index.sketch) - 1:,} lá)")
+
+    # Độ phủ của khoảng P10-P90 và độ trễ cho 1 xe
+    sample = df.dropna(subset=NUMERIC_COLS + ['gia']).sample(500, random_state=1)
+    q = index.predict_quantiles(sample[FEATURES], model, inverse_log=False)
+    y = TARGETS[index.target](sample['gia'].to_numpy(dtype=np.float64))
+    print(f"P10-P90 phủ {np.mean((y >= q[:, 0]) & (y <= q[:, 2])):.1%} giá thật (trên dữ liệu train)")
+
+    records = sample[FEATURES].head(200).to_dict('records')
+    index.predict_quantiles(records[0], model)
+    t = time.perf_counter()
+    for r in records:
+        index.predict_quantiles(r, model)
+    quantile_ms = (time.perf_counter() - t) / len(records) * 1e3
+    t = time.perf_counter()
+    for r in records:
+        predict_price_batch([r], model)
+    predict_ms = (time.perf_counter() - t) / len(records) * 1e3
+    print(f"1 xe: predict_quantiles {quantile_ms:.2f} ms, predict {predict_ms:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
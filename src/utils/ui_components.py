@@ -1025,4 +1025,28 @@ class UIComponents:
             </style>
             """,
             unsafe_allow_html=True
-        )
\ No newline at end of file
+        )
+
+    @staticmethod
+    def model_warmup_notice(warmup, poll_seconds: float = 1.0) -> bool:
+        """
+        Placeholder khi model đang khởi động nền, tự chạy lại trang khi model sẵn sàng
+        
+        Returns:
+            True nếu model đã sẵn sàng
+        """
+        if warmup.ready:
+            return True
+
+        if warmup.state == "failed":
+            st.error(f"❌ Không load được mô hình: {warmup.error}")
+            return False
+
+        @st.fragment(run_every=poll_seconds)
+        def _notice():
+            if warmup.ready:
+                st.rerun()
+            st.info("⏳ Mô hình đang khởi động, bạn có thể nhập thông tin xe trong lúc chờ...")
+
+        _notice()
+        return False
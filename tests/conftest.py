@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder
+
+from src.utils.prediction import FEATURES, CAT_COLS # type: ignore
+
+# ============================================================
+# DỮ LIỆU / MODEL NHỎ DÙNG CHUNG CHO CÁC TEST
+# ============================================================
+BRANDS = {
+    'Honda': ['Vision', 'Air Blade', 'Wave Alpha', 'SH'],
+    'Yamaha': ['Exciter', 'Sirius', 'Grande'],
+    'Suzuki': ['Raider', 'Axelo'],
+}
+
+
+def make_listings(n=400, seed=0):
+    """DataFrame tin đăng giả (FEATURES + gia, triệu đồng), giá phụ thuộc hãng / năm / km"""
+    rng = np.random.default_rng(seed)
+    brands = rng.choice(list(BRANDS), n)
+    df = pd.DataFrame({
+        'thuong_hieu': brands,
+        'dong_xe': [rng.choice(BRANDS[b]) for b in brands],
+        'nam_dang_ky': rng.integers(2008, 2025, n),
+        'so_km_da_di': rng.integers(0, 120_000, n),
+        'tinh_trang': rng.choice(['Đã sử dụng', 'Mới'], n),
+        'loai_xe': rng.choice(['Tay ga', 'Xe số', 'Tay côn/Moto'], n),
+        'dung_tich_xe': rng.choice(['Dưới 50 cc', '50 - 100 cc', '100 - 175 cc'], n),
+        'xuat_xu': rng.choice(['Việt Nam', 'Nhật Bản', 'Thái Lan'], n),
+    })
+    base = df['thuong_hieu'].map({'Honda': 30.0, 'Yamaha': 25.0, 'Suzuki': 20.0})
+    df['gia'] = base * (1 + (df['nam_dang_ky'] - 2008) / 10) - df['so_km_da_di'] / 10_000 + rng.normal(0, 1, n)
+    return df
+
+
+@pytest.fixture(name="make_listings", scope="session")
+def make_listings_fixture():
+    return make_listings
+
+
+@pytest.fixture(scope="session")
+def listings():
+    return make_listings()
+
+
+@pytest.fixture(scope="session")
+def forest_model(listings):
+    """Pipeline one-hot + RandomForest (giống model của app) học log1p(giá)"""
+    pre = ColumnTransformer([('cat', OneHotEncoder(handle_unknown='ignore'), CAT_COLS)], remainder='passthrough')
+    model = Pipeline([('pre', pre), ('model', RandomForestRegressor(n_estimators=12, max_depth=8, random_state=0))])
+    return model.fit(listings[FEATURES], np.log1p(listings['gia']))
@@ -0,0 +1,122 @@
+import os
+
+import pandas as pd
+import pytest
+
+from src.utils.dataset_catalog import DatasetCatalog, append_rows, read_csv_tail # type: ignore
+
+HEADER = "thuong_hieu,nam_dang_ky,gia\n"
+ROWS = ["Honda,2019,20.5\n", "Yamaha,2020,25.0\n"]
+
+
+@pytest.fixture
+def csv_file(tmp_path):
+    path = tmp_path / "listings.csv"
+    path.write_text(HEADER + "".join(ROWS), encoding="utf-8")
+    return path
+
+
+def append(path, text):
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(text)
+
+
+# ============================================================
+# ĐỌC PHẦN GHI THÊM
+# ============================================================
+def test_read_csv_tail_reads_only_complete_lines(csv_file):
+    start = csv_file.stat().st_size
+    append(csv_file, "Suzuki,2018,15.0\nHonda,20")
+
+    tail, end = read_csv_tail(csv_file, start, ["thuong_hieu", "nam_dang_ky", "gia"])
+    assert tail.to_dict("records") == [{"thuong_hieu": "Suzuki", "nam_dang_ky": 2018, "gia": 15.0}]
+    assert end == start + len("Suzuki,2018,15.0\n")
+
+    # Dòng dở được đọc ở lần sau, khi đã ghi xong
+    append(csv_file, "21,30.0\n")
+    tail, end = read_csv_tail(csv_file, end, ["thuong_hieu", "nam_dang_ky", "gia"])
+    assert tail.to_dict("records") == [{"thuong_hieu": "Honda", "nam_dang_ky": 2021, "gia": 30.0}]
+    assert end == csv_file.stat().st_size
+
+
+def test_read_csv_tail_without_new_lines(csv_file):
+    size = csv_file.stat().st_size
+    tail, end = read_csv_tail(csv_file, size, ["thuong_hieu", "nam_dang_ky", "gia"])
+    assert tail.empty and list(tail.columns) == ["thuong_hieu", "nam_dang_ky", "gia"]
+    assert end == size
+
+
+def test_read_csv_tail_rejects_other_column_count(csv_file):
+    start = csv_file.stat().st_size
+    append(csv_file, "Suzuki,2018\n")
+    with pytest.raises(ValueError):
+        read_csv_tail(csv_file, start, ["thuong_hieu", "nam_dang_ky", "gia"])
+
+
+def test_append_rows_keeps_category_codes():
+    df = pd.DataFrame({"thuong_hieu": pd.Categorical(["Honda", "Yamaha", "Honda"]), "gia": [20.5, 25.0, 19.0]})
+    tail = pd.DataFrame({"thuong_hieu": ["Suzuki", "Honda"], "gia": [15.0, 30.0]})
+
+    out = append_rows(df, tail)
+    assert isinstance(out["thuong_hieu"].dtype, pd.CategoricalDtype)
+    assert list(out["thuong_hieu"].cat.categories) == ["Honda", "Yamaha", "Suzuki"]
+    assert list(out["thuong_hieu"].cat.codes[:3]) == list(df["thuong_hieu"].cat.codes)
+    assert list(out["thuong_hieu"]) == ["Honda", "Yamaha", "Honda", "Suzuki", "Honda"]
+    assert list(out.index) == [0, 1, 2, 3, 4]
+    # df gốc không bị đổi
+    assert list(df["thuong_hieu"].cat.categories) == ["Honda", "Yamaha"]
+
+
+# ============================================================
+# CATALOG
+# ============================================================
+def test_catalog_reads_appended_rows_and_reloads_rewrites(csv_file):
+    catalog = DatasetCatalog({"listings": csv_file}, pd.read_csv)
+    assert len(catalog.get("listings")) == 2
+    assert len(catalog.get("listings")) == 2
+
+    append(csv_file, "Suzuki,2018,15.0\n")
+    df = catalog.get("listings")
+    assert list(df["thuong_hieu"]) == ["Honda", "Yamaha", "Suzuki"]
+    stats = catalog.stats()["listings"]
+    assert (stats["loads"], stats["tail_reads"], stats["tail_rows"], stats["hits"]) == (1, 1, 1, 1)
+
+    # Sửa phần đã đọc -> load lại cả file
+    csv_file.write_text(HEADER + "Honda,2019,99.9\n", encoding="utf-8")
+    os.utime(csv_file, ns=(0, csv_file.stat().st_mtime_ns + 1))
+    assert catalog.get("listings")["gia"].tolist() == [99.9]
+    assert catalog.stats()["listings"]["loads"] == 2
+
+
+def test_catalog_views_do_not_leak_page_edits(csv_file):
+    catalog = DatasetCatalog({"listings": csv_file}, pd.read_csv)
+    view = catalog.get("listings")
+    view.loc[0, "gia"] = 0.0
+    view["moi"] = 1
+    fresh = catalog.get("listings")
+    assert fresh.loc[0, "gia"] == 20.5 and "moi" not in fresh
+
+
+def test_catalog_versioned_source_reloads_on_version_change():
+    class Source:
+        def __init__(self):
+            self.v, self.loads = 0, 0
+
+        def version(self):
+            return self.v
+
+        def load(self):
+            self.loads += 1
+            return pd.DataFrame({"gia": [float(self.v)]})
+
+    source = Source()
+    catalog = DatasetCatalog({"new_posts": source}, loader=None)
+    catalog.get("new_posts")
+    catalog.get("new_posts")
+    assert source.loads == 1
+
+    source.v = 1
+    assert catalog.get("new_posts")["gia"].tolist() == [1.0]
+    assert source.loads == 2
+    with pytest.raises(KeyError):
+        catalog.get("missing")
@@ -0,0 +1,116 @@
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.utils.listing_store import ListingStore, StoreTable # type: ignore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ListingStore(tmp_path / "listings.db")
+
+
+def listings(n=3):
+    return pd.DataFrame({
+        'thuong_hieu': ['Honda', 'Yamaha', 'Suzuki'][:n],
+        'nam_dang_ky': np.arange(2018, 2018 + n),
+        'gia': [20.5, np.nan, 15.0][:n],
+    })
+
+
+# ============================================================
+# GHI / ĐỌC
+# ============================================================
+def test_insert_returns_ids_and_read_roundtrips(store):
+    ids = store.insert('new_posts', listings())
+    assert ids == [1, 2, 3]
+
+    df = store.read('new_posts', categorical=False)
+    assert list(df.index) == ids
+    assert df['thuong_hieu'].tolist() == ['Honda', 'Yamaha', 'Suzuki']
+    assert df['nam_dang_ky'].tolist() == [2018, 2019, 2020]
+    assert np.isnan(df.loc[2, 'gia'])
+    assert isinstance(store.read('new_posts')['thuong_hieu'].dtype, pd.CategoricalDtype)
+
+
+def test_insert_matches_columns_by_position(store):
+    store.insert('new_posts', listings(1))
+    # Giống ghi thêm CSV không header: tên cột khác, cùng số cột
+    store.insert('new_posts', pd.DataFrame([['Honda', 2021, 30.0]], columns=['a', 'b', 'c']))
+    assert store.read('new_posts', categorical=False).loc[2].tolist() == ['Honda', 2021, 30.0]
+
+
+def test_update_and_delete_touch_one_row(store):
+    store.insert('anomalies', listings())
+    assert store.update('anomalies', 2, trang_thai=4, anomaly_flag=np.int64(0)) == 1
+    assert store.delete('anomalies', 3) == 1
+    assert store.update('anomalies', 99, trang_thai=4) == 0
+
+    df = store.read('anomalies', categorical=False)
+    assert list(df.index) == [1, 2]
+    assert df.loc[2, 'trang_thai'] == 4 and df.loc[2, 'anomaly_flag'] == 0
+    assert pd.isna(df.loc[1, 'trang_thai'])
+
+
+def test_update_many_and_delete_many(store):
+    store.insert('anomalies', listings())
+    assert store.update_many('anomalies', [1, 3], trang_thai=0) == 2
+    assert store.delete_many('anomalies', np.array([2])) == 1
+    assert store.read('anomalies', categorical=False)['trang_thai'].tolist() == [0, 0]
+
+
+# ============================================================
+# VERSION (catalog biết khi nào cần load lại)
+# ============================================================
+def test_version_bumps_on_every_change(store):
+    assert store.version('new_posts') == 0
+    store.insert('new_posts', listings())
+    after_insert = store.version('new_posts')
+    assert after_insert > 0
+
+    store.update('new_posts', 1, trang_thai=0)
+    assert store.version('new_posts') == after_insert + 1
+    store.delete('new_posts', 1)
+    assert store.version('new_posts') == after_insert + 2
+    # Bảng khác không đổi version
+    store.insert('anomalies', listings(1))
+    assert store.version('new_posts') == after_insert + 2
+
+    table = StoreTable(store, 'new_posts')
+    assert table.version() == store.version('new_posts')
+    assert len(table.load()) == 2
+
+
+def test_import_and_export_csv(store, tmp_path):
+    csv_path = tmp_path / "posts.csv"
+    listings().to_csv(csv_path, index=False)
+    assert store.import_csv('new_posts', csv_path) == 3
+    # Đã có bảng -> bỏ qua, trừ khi replace
+    assert store.import_csv('new_posts', csv_path) == 0
+    store.delete('new_posts', 1)
+    assert store.import_csv('new_posts', csv_path, replace=True) == 3
+
+    out = tmp_path / "export.csv"
+    store.export_csv('new_posts', out)
+    pd.testing.assert_frame_equal(pd.read_csv(out), pd.read_csv(csv_path))
+
+
+def test_connections_are_per_thread(store):
+    store.insert('new_posts', listings(1))
+    errors = []
+
+    def worker(i):
+        try:
+            store.insert('new_posts', pd.DataFrame({'thuong_hieu': [f'Hang {i}'], 'nam_dang_ky': [2020], 'gia': [1.0]}))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    assert len(store.read('new_posts')) == 9
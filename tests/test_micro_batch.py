@@ -0,0 +1,148 @@
+import threading
+
+import pytest
+
+from src.utils.micro_batch import BatcherClosed, MicroBatcher # type: ignore
+
+
+def squares(items):
+    return [x * x for x in items]
+
+
+# ============================================================
+# MỖI ITEM NHẬN ĐÚNG KẾT QUẢ CỦA MÌNH
+# ============================================================
+def test_results_are_routed_to_their_items():
+    batcher = MicroBatcher(squares, max_batch=8, max_wait_ms=5.0)
+    try:
+        assert batcher.predict_many(range(50), timeout=5) == [x * x for x in range(50)]
+        stats = batcher.stats()
+        assert stats['items'] == 50
+        assert stats['max_batch'] <= 8
+        assert stats['batches'] >= 7
+    finally:
+        batcher.close()
+
+
+def test_concurrent_submitters_get_their_own_results():
+    batcher = MicroBatcher(squares, max_batch=32, max_wait_ms=2.0)
+    results = {}
+
+    def worker(start):
+        for x in range(start, start + 100):
+            results[x] = batcher.predict(x, timeout=5)
+
+    threads = [threading.Thread(target=worker, args=(i * 100,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    batcher.close()
+
+    assert results == {x: x * x for x in range(800)}
+    assert batcher.stats()['items'] == 800
+
+
+def test_predict_fn_error_fails_only_the_bad_item():
+    calls = []
+
+    def flaky(items):
+        calls.append(list(items))
+        if -1 in items:
+            raise ValueError("bad item")
+        return squares(items)
+
+    batcher = MicroBatcher(flaky, max_batch=4, max_wait_ms=50.0)
+    try:
+        futures = [batcher.submit(x) for x in (1, -1, 2)]
+        assert futures[0].result(5) == 1
+        with pytest.raises(ValueError):
+            futures[1].result(5)
+        assert futures[2].result(5) == 4
+        # Cả lô lỗi 1 lần, sau đó chạy lại từng item
+        assert calls == [[1, -1, 2], [1], [-1], [2]]
+        # Lô sau vẫn chạy bình thường
+        assert batcher.predict(3, timeout=5) == 9
+    finally:
+        batcher.close()
+
+
+def test_wrong_result_count_raises():
+    batcher = MicroBatcher(lambda items: [], max_wait_ms=0.0)
+    try:
+        with pytest.raises(RuntimeError):
+            batcher.predict(1, timeout=5)
+    finally:
+        batcher.close()
+
+
+# ============================================================
+# ĐÓNG BATCHER
+# ============================================================
+def test_close_drains_queued_items_then_rejects_submit():
+    release = threading.Event()
+
+    def slow(items):
+        release.wait(5)
+        return squares(items)
+
+    batcher = MicroBatcher(slow, max_batch=2, max_wait_ms=0.0)
+    futures = [batcher.submit(x) for x in range(6)]
+    closer = threading.Thread(target=batcher.close)
+    closer.start()
+    release.set()
+    closer.join(5)
+
+    assert not closer.is_alive()
+    assert [f.result(0) for f in futures] == [x * x for x in range(6)]
+    with pytest.raises(BatcherClosed):
+        batcher.submit(7)
+    # Gọi lại close không lỗi, không chặn
+    batcher.close()
+
+
+def test_close_before_first_submit():
+    batcher = MicroBatcher(squares)
+    batcher.close()
+    with pytest.raises(BatcherClosed):
+        batcher.submit(1)
+
+
+def test_close_from_predict_fn_does_not_deadlock():
+    holder = {}
+
+    def close_inside(items):
+        holder['batcher'].close()
+        return squares(items)
+
+    batcher = holder['batcher'] = MicroBatcher(close_inside, max_wait_ms=0.0)
+    assert batcher.predict(4, timeout=5) == 16
+    with pytest.raises(BatcherClosed):
+        batcher.submit(5)
+
+
+def test_submit_racing_close_never_strands_a_future():
+    # Mỗi submit đồng thời với close: hoặc bị từ chối, hoặc nhận kết quả (không treo)
+    for _ in range(20):
+        batcher = MicroBatcher(squares, max_batch=16, max_wait_ms=0.5)
+        accepted, rejected = [], []
+        start = threading.Event()
+
+        def worker():
+            start.wait()
+            for x in range(50):
+                try:
+                    accepted.append((x, batcher.submit(x)))
+                except BatcherClosed:
+                    rejected.append(x)
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for t in threads:
+            t.start()
+        start.set()
+        batcher.close()
+        for t in threads:
+            t.join()
+
+        assert len(accepted) + len(rejected) == 200
+        assert all(future.result(5) == x * x for x, future in accepted)
@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+from sklearn.base import clone
+from sklearn.ensemble import ExtraTreesRegressor, GradientBoostingRegressor
+
+from src.utils import model_arrays # type: ignore
+from src.utils.model_arrays import ArrayForestModel, export_model_arrays, flatten_trees, forget_engine_models # type: ignore
+from src.utils.model_arrays import load_model_arrays, model_for_engine, split_pipeline # type: ignore
+from src.utils.prediction import FEATURES # type: ignore
+
+
+def as_array_model(model, engine):
+    preprocessor, estimator = split_pipeline(model)
+    arrays, meta = flatten_trees(estimator)
+    return ArrayForestModel(arrays, meta, preprocessor, engine)
+
+
+def with_estimator(model, estimator, listings):
+    # Cùng tiền xử lý, đổi estimator cuối của Pipeline
+    return clone(model).set_params(model=estimator).fit(listings[FEATURES], np.log1p(listings['gia']))
+
+
+# ============================================================
+# MẢNG PHẲNG CHO CÙNG KẾT QUẢ VỚI model.predict
+# ============================================================
+@pytest.mark.parametrize("engine", ["per_tree", "levelwise"])
+def test_forest_matches_sklearn(forest_model, engine, make_listings):
+    X = make_listings(200, seed=1)[FEATURES]
+    expected = forest_model.predict(X)
+    np.testing.assert_allclose(as_array_model(forest_model, engine).predict(X), expected, rtol=1e-12, atol=0)
+
+
+@pytest.mark.parametrize("estimator", [
+    ExtraTreesRegressor(n_estimators=8, max_depth=6, random_state=0),
+    GradientBoostingRegressor(n_estimators=20, max_depth=3, random_state=0),
+])
+@pytest.mark.parametrize("engine", ["per_tree", "levelwise"])
+def test_other_ensembles_match_sklearn(forest_model, listings, estimator, engine, make_listings):
+    model = with_estimator(forest_model, estimator, listings)
+    X = make_listings(100, seed=2)[FEATURES]
+    np.testing.assert_allclose(as_array_model(model, engine).predict(X), model.predict(X), rtol=1e-12, atol=1e-12)
+
+
+def test_levelwise_chunks_rows(forest_model, monkeypatch, make_listings):
+    # Ít ô mỗi khúc -> nhiều khúc dòng, kết quả không đổi
+    monkeypatch.setattr(model_arrays, "LEVELWISE_MAX_CELLS", 30)
+    X = make_listings(50, seed=3)[FEATURES]
+    np.testing.assert_allclose(as_array_model(forest_model, "levelwise").predict(X), forest_model.predict(X), rtol=1e-12)
+
+
+def test_leaves_point_to_themselves(forest_model):
+    arrays, meta = flatten_trees(split_pipeline(forest_model)[1])
+    leaves = arrays['feature'] == -1
+    nodes = np.flatnonzero(leaves)
+    assert meta['n_trees'] == 12 and meta['kind'] == "forest"
+    assert (arrays['left'][leaves] == nodes).all() and (arrays['right'][leaves] == nodes).all()
+    assert arrays['tree_offsets'][-1] == meta['n_nodes'] == len(arrays['feature'])
+
+
+def test_unsupported_estimator_raises():
+    with pytest.raises(ValueError):
+        flatten_trees(object())
+
+
+# ============================================================
+# EXPORT / LOAD
+# ============================================================
+@pytest.mark.parametrize("layout,mmap", [("npz", False), ("npy", False), ("npy", True)])
+def test_export_roundtrip(forest_model, tmp_path, layout, mmap, make_listings):
+    out_dir = export_model_arrays(forest_model, str(tmp_path / "model_arrays"), layout)
+    loaded = load_model_arrays(out_dir, mmap=mmap)
+    X = make_listings(60, seed=4)[FEATURES]
+    np.testing.assert_allclose(loaded.predict(X), forest_model.predict(X), rtol=1e-12)
+    if mmap:
+        assert isinstance(loaded.value, np.memmap)
+
+
+# ============================================================
+# CHỌN ENGINE
+# ============================================================
+def test_model_for_engine_reuses_flattened_model(forest_model):
+    assert model_for_engine(forest_model, "sklearn") is forest_model
+    levelwise = model_for_engine(forest_model, "levelwise")
+    assert isinstance(levelwise, ArrayForestModel) and levelwise.engine == "levelwise"
+    assert model_for_engine(forest_model, "levelwise") is levelwise
+
+    # Bản export đổi engine dùng chung mảng, không copy
+    per_tree = model_for_engine(levelwise, "per_tree")
+    assert per_tree.engine == "per_tree" and per_tree.value is levelwise.value
+
+    assert levelwise in forget_engine_models(forest_model)
+    assert model_for_engine(forest_model, "levelwise") is not levelwise
+    forget_engine_models(forest_model)
+    forget_engine_models(levelwise)
+
+
+def test_model_for_engine_rejects_unknown_engine(forest_model):
+    with pytest.raises(ValueError):
+        model_for_engine(forest_model, "gpu")
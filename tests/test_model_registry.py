@@ -0,0 +1,170 @@
+import copy
+import threading
+
+import pytest
+
+from src.utils import prediction_cache # type: ignore
+from src.utils.micro_batch import BatcherClosed # type: ignore
+from src.utils.model_registry import ModelHandle, current_version, list_versions, promote, register_model # type: ignore
+from src.utils.model_warmup import LOADING, READY, FAILED # type: ignore
+from src.utils.prediction import FEATURES, predict_price_batch # type: ignore
+
+
+class FakeWarmup:
+    """Giống ModelWarmup: auto -> ready ngay khi start, ngược lại chờ finish()"""
+
+    def __init__(self, model_path, lattice_path=None, cascade_path=None, auto=True):
+        self.model_path = model_path
+        self.auto = auto
+        self.state = LOADING
+        self.model = None
+        self.lattice = None
+        self.error = None
+        self.seconds = None
+        self._done = threading.Event()
+
+    @property
+    def ready(self):
+        return self.state == READY
+
+    def start(self):
+        if self.auto:
+            self.finish()
+        return self
+
+    def finish(self, error=None):
+        if error is None:
+            self.model, self.state = object(), READY
+        else:
+            self.error, self.state = error, FAILED
+        self.seconds = 0.0
+        self._done.set()
+
+    def wait(self, timeout=None):
+        self._done.wait(timeout)
+        return self.model
+
+
+@pytest.fixture
+def registry(tmp_path):
+    model_file = tmp_path / "model.pkl"
+    model_file.write_bytes(b"model")
+    registry_dir = tmp_path / "registry"
+    for version in ("v1", "v2"):
+        register_model(str(model_file), registry_dir, version=version)
+    return registry_dir
+
+
+def make_handle(registry_dir, warmups, released, auto=True):
+    def make_warmup(model_path, lattice_path, cascade_path):
+        warmup = FakeWarmup(model_path, lattice_path, cascade_path, auto=auto)
+        warmups.append(warmup)
+        return warmup
+    return ModelHandle(make_warmup, "fallback.pkl", registry_dir, check_seconds=0, on_release=released.append)
+
+
+# ============================================================
+# REGISTRY
+# ============================================================
+def test_register_and_promote(registry):
+    assert [m['version'] for m in list_versions(registry)] == ["v1", "v2"]
+    assert current_version(registry) is None
+    promote("v2", registry)
+    assert current_version(registry) == "v2"
+
+
+def test_promote_rejects_tampered_model(registry):
+    (registry / "v1" / "model.pkl").write_bytes(b"other model")
+    with pytest.raises(ValueError):
+        promote("v1", registry)
+    assert current_version(registry) is None
+
+
+# ============================================================
+# HOT-SWAP
+# ============================================================
+def test_uses_fallback_without_registry(tmp_path):
+    warmups, released = [], []
+    handle = make_handle(tmp_path / "empty", warmups, released).start()
+    assert handle.version is None
+    assert handle.ready
+    assert warmups[0].model_path == "fallback.pkl"
+
+
+def test_swaps_only_after_new_version_is_ready(registry):
+    warmups, released = [], []
+    promote("v1", registry)
+    handle = make_handle(registry, warmups, released, auto=False).start()
+    warmups[0].finish()
+    old_model = handle.model
+    assert handle.version == "v1"
+
+    promote("v2", registry)
+    # v2 đang load: vẫn phục vụ bằng v1
+    assert handle.model is old_model
+    assert handle.version == "v1"
+    assert warmups[1].model_path.endswith("v2/model.pkl")
+
+    warmups[1].finish()
+    assert handle.model is warmups[1].model
+    assert handle.version == "v2"
+    assert released == [old_model]
+    assert warmups[0].model is None
+
+
+def test_failed_load_keeps_current_version(registry):
+    warmups, released = [], []
+    promote("v1", registry)
+    handle = make_handle(registry, warmups, released, auto=False).start()
+    warmups[0].finish()
+    old_model = handle.model
+
+    promote("v2", registry)
+    handle.refresh()
+    warmups[1].finish(error=RuntimeError("broken"))
+    handle.refresh()
+    assert handle.model is old_model
+    assert handle.version == "v1"
+    assert released == []
+
+
+def test_retired_model_released_after_in_flight_predictions(registry):
+    warmups, released = [], []
+    promote("v1", registry)
+    handle = make_handle(registry, warmups, released, auto=False).start()
+    warmups[0].finish()
+
+    with handle.acquire() as (model, lattice):
+        promote("v2", registry)
+        handle.refresh()
+        warmups[1].finish()
+        handle.refresh()
+        # Đã đổi sang v2 nhưng v1 còn đang được dùng -> chưa giải phóng
+        assert handle.version == "v2"
+        assert released == []
+        assert warmups[0].model is model
+    assert released == [model]
+    assert warmups[0].model is None
+
+
+# ============================================================
+# GIẢI PHÓNG MODEL CŨ TRONG CACHE / BATCHER
+# ============================================================
+def test_released_model_gets_no_new_batcher(forest_model, make_listings, monkeypatch):
+    monkeypatch.setattr(prediction_cache, "COALESCE_PREDICTIONS", True)
+    # Bản sao: không đánh dấu model dùng chung của các test khác là đã release
+    model = copy.deepcopy(forest_model)
+    row = make_listings(1, seed=5)[FEATURES].iloc[0].to_dict()
+    normalized = prediction_cache.normalize_features(row)
+    expected = float(predict_price_batch([normalized], model, inverse_log=False)[0])
+
+    batcher = prediction_cache.model_batcher(model)
+    assert prediction_cache.model_batcher(model) is batcher
+    assert prediction_cache.raw_prediction(normalized, model) == pytest.approx(expected)
+
+    prediction_cache.release_model(model)
+    with pytest.raises(BatcherClosed):
+        batcher.submit(normalized)
+    assert prediction_cache.model_batcher(model) is None
+    # Model đã bị thay vẫn dự đoán được (trực tiếp, không qua batcher)
+    assert prediction_cache.raw_prediction(normalized, model) == pytest.approx(expected)
@@ -0,0 +1,186 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.utils.listing_store import ListingStore, StoreTable # type: ignore
+from src.utils.moderation_log import ACTIONS, RECORD, STATUS_VALUES, ModeratedTable, ModerationLog, apply_events, latest_values # type: ignore
+from src.utils.moderation_log import read_records, store_fold # type: ignore
+
+
+@pytest.fixture
+def log(tmp_path):
+    return ModerationLog(tmp_path / "moderation" / "anomalies.log", fsync=False)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ListingStore(tmp_path / "listings.db")
+    store.insert('anomalies', pd.DataFrame({
+        'thuong_hieu': ['Honda', 'Yamaha', 'Suzuki', 'Honda'],
+        'anomaly_flag': [1, 1, 1, 0],
+        'trang_thai': [1, 1, 1, 1],
+    }))
+    return store
+
+
+def snapshot(store):
+    return store.read('anomalies', categorical=False)
+
+
+# ============================================================
+# GHI / ĐỌC LOG
+# ============================================================
+def test_append_writes_fixed_size_records(log):
+    assert log.append(1, 'approve') == 1
+    assert log.append(2, 'reject') == 2
+    assert os.path.getsize(log.path) == 2 * RECORD.size
+
+    records = read_records(log.path)
+    assert records['row_id'].tolist() == [1, 2]
+    assert records['status'].tolist() == [0, 3]
+    with pytest.raises(ValueError):
+        log.append(3, 'delete')
+
+
+def test_torn_record_is_ignored_then_truncated(log):
+    log.append(1, 'approve')
+    # Crash giữa lần ghi thứ 2: chỉ có nửa bản ghi
+    with open(log.path, 'ab') as f:
+        f.write(RECORD.pack(0.0, 2, 3)[:10])
+
+    assert read_records(log.path)['row_id'].tolist() == [1]
+    assert log.pending() == 1
+
+    assert log.append(3, 'request_edit') == 2
+    assert os.path.getsize(log.path) == 2 * RECORD.size
+    assert read_records(log.path)['row_id'].tolist() == [1, 3]
+
+
+def as_lists(latest):
+    return latest['rejected'].tolist(), {key: ids.tolist() for key, ids in latest['values'].items()}
+
+
+def test_latest_values_keep_last_value_per_column(log):
+    log.append(1, 'request_edit')
+    log.append(2, 'approve')
+    log.append(1, 'approve')
+    log.append(3, 'approve')
+    log.append(3, 'request_edit')
+    log.append(2, 'reject')
+    log.append(2, 'approve')
+
+    rejected, values = as_lists(log.latest())
+    # Từ chối là trạng thái cuối, kể cả khi có sự kiện sau đó
+    assert rejected == [2]
+    assert values == {
+        ('anomaly_flag', 0): [1, 2, 3],
+        ('trang_thai', 0): [1, 2],
+        ('trang_thai', 4): [3],
+    }
+    assert as_lists(latest_values(read_records(log.path + ".missing"))) == ([], {})
+
+
+def test_apply_events(store):
+    df = snapshot(store)
+    out = apply_events(df, {'rejected': np.array([3, 99]),
+                            'values': {('anomaly_flag', 0): np.array([1]), ('trang_thai', 0): np.array([1]),
+                                       ('trang_thai', 4): np.array([2])}})
+
+    assert list(out.index) == [1, 2, 4]
+    assert out.loc[1, ['anomaly_flag', 'trang_thai']].tolist() == [0, 0]
+    assert out.loc[2, 'trang_thai'] == 4
+    # Snapshot gốc không bị đổi
+    assert list(df.index) == [1, 2, 3, 4] and df.loc[1, 'trang_thai'] == 1
+
+
+# ============================================================
+# GỘP VÀO SNAPSHOT
+# ============================================================
+def test_moderated_table_equals_snapshot_after_compaction(log, store):
+    table = ModeratedTable(StoreTable(store, 'anomalies'), log)
+    log.append(1, 'approve')
+    log.append(2, 'request_edit')
+    log.append(3, 'reject')
+    replayed = table.load()
+    version = table.version()
+
+    assert log.compact(store_fold(store, 'anomalies')) == 3
+    assert log.pending() == 0 and not os.path.exists(log.compacting_path)
+    assert table.version() != version
+    # Replay giữ danh sách category của tin đã xóa: chỉ so giá trị
+    pd.testing.assert_frame_equal(store.read('anomalies'), replayed, check_dtype=False, check_categorical=False)
+    pd.testing.assert_frame_equal(table.load(), replayed, check_dtype=False, check_categorical=False)
+
+
+def test_compaction_replays_leftover_file_after_crash(log, store):
+    log.append(1, 'approve')
+    log.append(3, 'reject')
+
+    def crash(latest):
+        raise RuntimeError("crash giữa lúc gộp")
+
+    with pytest.raises(RuntimeError):
+        log.compact(crash)
+    # Log đã đổi tên sang .compacting, sự kiện vẫn được replay khi đọc
+    assert os.path.exists(log.compacting_path)
+    log.append(2, 'request_edit')
+    assert log.pending() == 3
+    assert as_lists(log.latest()) == ([3], {('anomaly_flag', 0): [1], ('trang_thai', 0): [1], ('trang_thai', 4): [2]})
+
+    fold = store_fold(store, 'anomalies')
+    # Lần gộp sau xử lý nốt file .compacting trước, rồi mới đến log mới
+    assert log.compact(fold) == 2
+    assert log.compact(fold) == 1
+    assert log.compact(fold) == 0
+
+    df = snapshot(store)
+    assert list(df.index) == [1, 2, 4]
+    assert df.loc[1, 'trang_thai'] == 0 and df.loc[2, 'trang_thai'] == 4
+
+
+def test_folding_twice_gives_same_snapshot(log, store):
+    log.append(1, 'approve')
+    log.append(2, 'reject')
+    latest = log.latest()
+    fold = store_fold(store, 'anomalies')
+    fold(latest)
+    once = snapshot(store)
+    fold(latest)
+    pd.testing.assert_frame_equal(snapshot(store), once)
+
+
+def test_maybe_compact_runs_in_background_above_threshold(log, store):
+    fold = store_fold(store, 'anomalies')
+    log.append(1, 'approve')
+    assert log.maybe_compact(fold, max_records=2) is False
+
+    log.append(2, 'approve')
+    assert log.maybe_compact(fold, max_records=2) is True
+    log._thread.join(5)
+    assert log.pending() == 0
+    assert snapshot(store)['trang_thai'].tolist() == [0, 0, 1, 1]
+
+
+@pytest.mark.parametrize("actions", [
+    [(1, 'approve'), (1, 'request_edit')],
+    [(1, 'request_edit'), (1, 'approve'), (2, 'approve'), (2, 'request_edit'), (2, 'approve')],
+    [(1, 'approve'), (1, 'reject'), (1, 'request_edit'), (4, 'request_edit')],
+])
+def test_replay_equals_direct_store_updates(log, store, tmp_path, actions):
+    # Cùng các thao tác áp dụng trực tiếp bằng UPDATE / DELETE (không qua log)
+    direct = ListingStore(tmp_path / "direct.db")
+    direct.insert('anomalies', snapshot(store))
+    for row_id, action in actions:
+        log.append(row_id, action)
+        if ACTIONS[action] in STATUS_VALUES:
+            direct.update('anomalies', row_id, **STATUS_VALUES[ACTIONS[action]])
+        else:
+            direct.delete('anomalies', row_id)
+    expected = direct.read('anomalies', categorical=False)
+
+    replayed = ModeratedTable(StoreTable(store, 'anomalies'), log).load()
+    pd.testing.assert_frame_equal(replayed.astype(expected.dtypes.to_dict()), expected, check_categorical=False)
+    log.compact(store_fold(store, 'anomalies'))
+    pd.testing.assert_frame_equal(snapshot(store), expected)
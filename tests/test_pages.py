@@ -0,0 +1,84 @@
+import pickle
+
+import pytest
+from streamlit.testing.v1 import AppTest
+
+from src.utils.data_processor import load_model_table # type: ignore
+from src.utils.explanations import build_explanations # type: ignore
+from src.utils.model_artifacts import save_arrays # type: ignore
+from src.utils.quantile_forest import build_quantile_index # type: ignore
+
+
+def anomaly_page(table_dir):
+    # Chạy như 1 script Streamlit (AppTest): trang phát hiện bất thường với model / bảng của test
+    import pickle
+    from contextlib import contextmanager
+
+    import pandas as pd
+
+    from src.pages import phat_hien_bat_thuong as page
+    from src.utils.explanations import load_explanations
+    from src.utils.quantile_forest import load_quantile_index
+
+    with open(f"{table_dir}/model.pkl", "rb") as f:
+        model = pickle.load(f)
+    tables = {
+        "explanations": load_explanations(f"{table_dir}/explanations.npz"),
+        "quantiles": load_quantile_index(f"{table_dir}/quantile_index.npz"),
+    }
+    page.load_model_table = lambda kind, table_path, version=None, model=None: tables.get(kind)
+
+    class Handle:
+        ready, state, version = True, "ready", None
+
+        @contextmanager
+        def acquire(self):
+            yield model, None
+
+    page.phat_hien_xe_bat_thuong(pd.read_csv(f"{table_dir}/listings.csv"), Handle())
+
+
+@pytest.fixture
+def table_dir(tmp_path, forest_model, listings):
+    with open(tmp_path / "model.pkl", "wb") as f:
+        pickle.dump(forest_model, f)
+    save_arrays(build_explanations(listings, forest_model, min_rows=10), str(tmp_path / "explanations.npz"))
+    save_arrays(build_quantile_index(listings, forest_model), str(tmp_path / "quantile_index.npz"))
+    listings.to_csv(tmp_path / "listings.csv", index=False)
+    return str(tmp_path)
+
+
+def result_markers(at):
+    return ([m.value for m in at.markdown if 'P10 / P50 / P90' in m.value],
+            [e.label for e in at.expander if 'Vì sao' in e.label])
+
+
+# ============================================================
+# KẾT QUẢ ĐÃ KIỂM TRA VẪN HIỂN THỊ KHI TRANG CHẠY LẠI
+# ============================================================
+def test_anomaly_result_survives_rerun(table_dir):
+    at = AppTest.from_function(anomaly_page, args=(table_dir,), default_timeout=60).run()
+    assert not at.exception
+
+    at.button[0].click().run()
+    assert not at.exception
+    percentiles, explanation = result_markers(at)
+    assert len(percentiles) == 1 and len(explanation) == 1
+
+    # Đổi input (không bấm kiểm tra lại): trang chạy lại và vẫn hiện kết quả cũ
+    at.slider[0].set_value(at.slider[0].value + 1).run()
+    assert not at.exception
+    assert result_markers(at) == (percentiles, explanation)
+
+
+# ============================================================
+# BẢNG TÍNH SẴN BUILD SAU KHI APP ĐÃ CHẠY
+# ============================================================
+def test_model_table_built_after_a_miss_is_loaded(tmp_path, forest_model, listings):
+    table_path = str(tmp_path / "explanations.npz")
+    assert load_model_table("explanations", table_path, None, forest_model) is None
+
+    save_arrays(build_explanations(listings, forest_model, min_rows=10), table_path)
+    table = load_model_table("explanations", table_path, None, forest_model)
+    assert table is not None
+    assert load_model_table("explanations", table_path, None, forest_model) is table
@@ -0,0 +1,21 @@
+import numpy as np
+
+from src.utils.prediction import predict_price, predict_price_sweep, sweep_grid # type: ignore
+
+
+# ============================================================
+# WHAT-IF: GIÁ THEO SỐ KM x NĂM ĐĂNG KÝ
+# ============================================================
+def test_sweep_current_cell_matches_headline_price(listings, forest_model):
+    info = listings.iloc[0].drop('gia').to_dict()
+    km_now, year_now = int(info['so_km_da_di']), int(info['nam_dang_ky'])
+    km_values, year_values = sweep_grid(info)
+
+    plain = predict_price_sweep(info, forest_model, km_values, year_values)
+    np.testing.assert_allclose(plain.loc[year_now, km_now], np.ravel(predict_price(info, forest_model))[0])
+
+    # Giá hiển thị lấy từ đường khác (bảng giá / cascade): ô hiện tại bằng đúng giá đó, tỉ lệ giữa các ô giữ nguyên
+    headline = plain.loc[year_now, km_now] * 1.05
+    shifted = predict_price_sweep(info, forest_model, km_values, year_values, current_price=headline)
+    assert shifted.loc[year_now, km_now] == headline
+    np.testing.assert_allclose(shifted / plain, 1.05)
@@ -0,0 +1,80 @@
+import pytest
+
+from src.utils.prediction_cache import LRUCache, bucket_km, normalize_features # type: ignore
+
+
+# ============================================================
+# LRU CACHE
+# ============================================================
+def test_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    # Đọc 'a' -> 'b' thành cũ nhất
+    assert cache.get('a') == (True, 1)
+    cache.put('c', 3)
+
+    assert cache.get('b') == (False, None)
+    assert cache.get('a') == (True, 1)
+    assert cache.get('c') == (True, 3)
+    assert cache.evictions == 1
+
+
+def test_put_existing_key_refreshes_without_evicting():
+    cache = LRUCache(maxsize=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.put('a', 10)
+    cache.put('c', 3)
+
+    assert cache.get('a') == (True, 10)
+    assert cache.get('b') == (False, None)
+    assert cache.evictions == 1
+
+
+def test_counters_and_hit_rate():
+    cache = LRUCache(maxsize=4)
+    calls = []
+    compute = lambda: calls.append(1) or 42
+
+    assert cache.get_or_compute('k', compute) == 42
+    assert cache.get_or_compute('k', compute) == 42
+    assert cache.get_or_compute('k', compute) == 42
+    assert len(calls) == 1
+
+    stats = cache.stats()
+    assert (stats['size'], stats['maxsize'], stats['hits'], stats['misses'], stats['evictions']) == (1, 4, 2, 1, 0)
+    assert stats['hit_rate'] == pytest.approx(2 / 3)
+    assert LRUCache().stats()['hit_rate'] == 0.0
+
+
+def test_discard_where_and_clear():
+    cache = LRUCache(maxsize=8)
+    for model_id in (1, 2):
+        for x in range(3):
+            cache.put((model_id, x), x)
+
+    cache.discard_where(lambda key: key[0] == 1)
+    assert cache.stats()['size'] == 3
+    assert cache.get((1, 0)) == (False, None)
+    assert cache.get((2, 0)) == (True, 0)
+
+    cache.clear()
+    assert cache.stats()['size'] == 0
+
+
+# ============================================================
+# KEY CỦA CACHE
+# ============================================================
+def test_normalize_features_matches_prepare_input_rules():
+    normalized = normalize_features({'thuong_hieu': 'Honda', 'nam_dang_ky': '2019', 'so_km_da_di': None}, km_bucket=0)
+    assert normalized['thuong_hieu'] == 'Honda'
+    assert normalized['dong_xe'] == 'unknown'
+    assert normalized['nam_dang_ky'] == 2019.0
+    assert normalized['so_km_da_di'] == 0.0
+
+
+def test_bucket_km():
+    assert bucket_km(12_345, 0) == 12_345
+    assert bucket_km(12_345, 1000) == 12_000.0
+    assert normalize_features({'so_km_da_di': 12_600}, km_bucket=1000)['so_km_da_di'] == 13_000.0